@@ -0,0 +1,10 @@
+'''
+Host benchmarks for KMK.
+
+Benchmarks run on CPython against the same CircuitPython mocks as the unit
+tests. Execute them as modules from the repository root, e.g.:
+`python -m benchmarks.bench_coord_lookup`
+'''
+from tests.mocks import init_circuit_python_modules_mocks
+
+init_circuit_python_modules_mocks()
@@ -0,0 +1,86 @@
+'''
+Worst-case latency of a 6-key chord, by `max_events_per_cycle`.
+
+All six key presses are reported by the scanner at once. Latency is measured
+from the first main loop cycle until the HID report containing all six keys
+has been sent, both in cycles and in host time.
+'''
+import time
+from keypad import Event as KeyEvent
+from unittest.mock import patch
+
+from benchmarks.harness import report
+from kmk import scheduler
+from kmk.hid import HIDModes
+from kmk.keys import KC
+from kmk.kmk_keyboard import KMKKeyboard
+from kmk.scanners import Scanner
+
+CHORD = (KC.A, KC.S, KC.D, KC.F, KC.J, KC.K)
+BUDGETS = (1, 2, 3, 6)
+REPEAT = 500
+
+
+class ChordScanner(Scanner):
+    def __init__(self, key_count):
+        self._key_count = key_count
+        self.events = []
+
+    @property
+    def key_count(self):
+        return self._key_count
+
+    def scan_for_changes(self):
+        if self.events:
+            return self.events.pop(0)
+
+
+def make_keyboard(budget):
+    keyboard = KMKKeyboard()
+    keyboard.keymap = [list(CHORD)]
+    keyboard.matrix = ChordScanner(len(CHORD))
+    keyboard.max_events_per_cycle = budget
+    keyboard.modules = []
+    keyboard.extensions = []
+    keyboard.keys_pressed = set()
+    scheduler._task_queue = scheduler.TaskQueue()
+    keyboard._init(hid_type=HIDModes.NOOP)
+    return keyboard
+
+
+def chord(keyboard, pressed):
+    scanner = keyboard.matrix[0]
+    scanner.events.extend(KeyEvent(i, pressed) for i in range(len(CHORD)))
+
+    reports = []
+    with patch.object(keyboard._hid_helper, 'hid_send', reports.append):
+        start = time.perf_counter_ns()
+        cycles = 0
+        while scanner.events or keyboard.matrix_update_queue:
+            keyboard._main_loop()
+            cycles += 1
+        elapsed = time.perf_counter_ns() - start
+
+    return cycles, elapsed, len(reports)
+
+
+def main():
+    rows = []
+    for budget in BUDGETS:
+        keyboard = make_keyboard(budget)
+        total = 0
+        for _ in range(REPEAT):
+            cycles, elapsed, reports = chord(keyboard, True)
+            total += elapsed
+            chord(keyboard, False)
+        rows.append((budget, cycles, reports, total / REPEAT / 1000))
+
+    report(
+        '6-key chord, press until last report',
+        ('max_events_per_cycle', 'cycles', 'reports', 'latency [us]'),
+        rows,
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+'''
+Cost of combo matching, by number of combos.
+
+A keymap of 30 letter keys carries 10, 100 or 1000 distinct chords of 2 to 4
+keys each, like a steno-style layout, matched by key or by coordinate. Key
+events are queued as if they were scanned and processed by one main loop cycle
+each, with the virtual clock advancing by `STEP_MS` per event. Workloads:
+- `type`: keys pressed and released one at a time, which start matches that
+  are abandoned again,
+- `strokes`: 2 to 4 keys pressed together and released together, which
+  either trigger a chord or are flushed on timeout.
+
+Pass `--json` for one JSON object per row instead of a table.
+'''
+import random
+import sys
+import time
+from keypad import Event as KeyEvent
+
+from benchmarks.harness import emit_json, make_keyboard, report
+from kmk.keys import KC
+from kmk.modules.combos import Chord, Combos
+from tests.mocks import clock
+
+COMBOS = (10, 100, 1000)
+KEYS = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ1234'
+STEP_MS = 5
+EVENTS = 2000
+
+
+def make_combos(count, match_coord):
+    rng = random.Random(count)
+    matches = set()
+    while len(matches) < count:
+        matches.add(tuple(sorted(rng.sample(range(len(KEYS)), rng.randint(2, 4)))))
+    if match_coord:
+        return [Chord(match, KC.X, match_coord=True) for match in sorted(matches)]
+    return [Chord(tuple(KC[KEYS[i]] for i in match), KC.X) for match in sorted(matches)]
+
+
+def type_keys(rng):
+    events = []
+    while len(events) < EVENTS:
+        key_number = rng.randrange(len(KEYS))
+        events.append((key_number, True))
+        events.append((key_number, False))
+    return events
+
+
+def strokes(rng):
+    events = []
+    while len(events) < EVENTS:
+        stroke = rng.sample(range(len(KEYS)), rng.randint(2, 4))
+        events.extend((key_number, True) for key_number in stroke)
+        events.extend((key_number, False) for key_number in stroke)
+    return events
+
+
+WORKLOADS = (('type', type_keys), ('strokes', strokes))
+
+
+def run(count, match_coord, make_events):
+    KC.clear()
+    combos = Combos(make_combos(count, match_coord))
+    keyboard = make_keyboard([[KC[c] for c in KEYS]], [combos])
+    sent = []
+    keyboard._hid_helper.hid_send = lambda evt: sent.append(bytes(evt))
+    events = make_events(random.Random(0))
+
+    start = time.perf_counter_ns()
+    for key_number, pressed in events:
+        keyboard.matrix_update_queue.append(KeyEvent(key_number, pressed))
+        keyboard._main_loop()
+        clock.advance(STEP_MS)
+    elapsed = time.perf_counter_ns() - start
+
+    # Let pending combos time out.
+    for _ in range(100):
+        keyboard._main_loop()
+        clock.advance(STEP_MS)
+
+    return len(events), sent, elapsed / len(events) / 1000
+
+
+def main():
+    rows = []
+    for count in COMBOS:
+        for match_coord in (False, True):
+            for name, make_events in WORKLOADS:
+                events, sent, us = run(count, match_coord, make_events)
+                match = 'coord' if match_coord else 'key'
+                rows.append((count, match, name, events, len(sent), us))
+
+    if '--json' in sys.argv:
+        emit_json(
+            'combos',
+            ('combos', 'match', 'workload', 'events', 'reports', 'us_per_event'),
+            rows,
+        )
+    else:
+        report(
+            'Combo matching [us/event]',
+            ('combos', 'match', 'workload', 'events', 'reports', 'us/event'),
+            rows,
+        )
+
+
+if __name__ == '__main__':
+    main()
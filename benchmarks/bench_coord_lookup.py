@@ -0,0 +1,47 @@
+'''
+Cost of resolving an int_coord to a keymap index, by number of keys.
+
+The `index()` column is the linear scan over `coord_mapping` that
+`KMKKeyboard._find_key_in_map` used before the reverse lookup table.
+'''
+from benchmarks.harness import measure, report
+from kmk.keys import KC
+from kmk.kmk_keyboard import KMKKeyboard
+
+KEY_COUNTS = (16, 64, 256, 1024)
+
+
+def make_keyboard(key_count):
+    keyboard = KMKKeyboard()
+    keyboard.coord_mapping = tuple(range(key_count))
+    keyboard.keymap = [[KC.A] * key_count]
+    keyboard.active_layers = [0]
+    keyboard._init_coord_mapping()
+    return keyboard
+
+
+def main():
+    rows = []
+    for key_count in KEY_COUNTS:
+        keyboard = make_keyboard(key_count)
+        coord_mapping = keyboard.coord_mapping
+        # Worst case for the linear scan: the last key in the mapping.
+        int_coord = coord_mapping[-1]
+
+        rows.append(
+            (
+                key_count,
+                measure(lambda: coord_mapping.index(int_coord)),
+                measure(lambda: keyboard._find_key_in_map(int_coord)),
+            )
+        )
+
+    report(
+        'int_coord lookup [ns/call]',
+        ('keys', 'index()', '_find_key_in_map'),
+        rows,
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+'''
+Pointer report rate and cost of mouse motion, by HID poll interval.
+
+A simulated sensor moves the pointer by a fractional amount every main loop
+cycle, like a scaled optical sensor or trackball polled at 1 kHz, while the
+virtual clock advances by 1 ms per cycle. For every poll interval, this
+prints the number of pointer reports sent, the main loop cost per cycle, and
+the motion that's still pending at the end (`left`), which is below one count
+per axis if no motion is lost.
+'''
+import random
+import sys
+import time
+
+from benchmarks.harness import emit_json, make_keyboard, report
+from kmk.keys import AX, KC
+from kmk.modules import Module
+from tests.mocks import clock
+
+CYCLES = 5000
+INTERVALS = (0, 1, 8)
+
+
+class Sensor(Module):
+    def __init__(self, seed=0):
+        self.rng = random.Random(seed)
+        self.active = True
+        self.total_x = 0
+        self.total_y = 0
+
+    def during_bootup(self, keyboard):
+        return
+
+    def before_matrix_scan(self, keyboard):
+        if not self.active:
+            return
+        x = self.rng.uniform(-2, 10)
+        y = self.rng.uniform(-4, 4)
+        self.total_x += x
+        self.total_y += y
+        AX.X.move(keyboard, x)
+        AX.Y.move(keyboard, y)
+
+
+def signed(byte):
+    return byte - 256 if byte & 0x80 else byte
+
+
+def run(interval):
+    KC.clear()
+    AX.X.delta = AX.Y.delta = 0
+    sensor = Sensor()
+    keyboard = make_keyboard([[KC.A]], [sensor])
+    hid = keyboard._hid_helper
+    hid.poll_interval_ms = interval
+
+    sent = [0, 0, 0]
+
+    def hid_send(evt):
+        if evt[0] == 2:
+            sent[0] += 1
+            sent[1] += signed(evt[2])
+            sent[2] += signed(evt[3])
+
+    hid.hid_send = hid_send
+
+    start = time.perf_counter_ns()
+    for _ in range(CYCLES):
+        keyboard._main_loop()
+        clock.advance(1)
+    elapsed = (time.perf_counter_ns() - start) / CYCLES
+
+    # Send what's left.
+    sensor.active = False
+    for _ in range(100):
+        keyboard._main_loop()
+        clock.advance(1)
+    left = max(abs(sensor.total_x - sent[1]), abs(sensor.total_y - sent[2]))
+
+    return (interval, CYCLES, sent[0], elapsed / 1000, round(left, 3))
+
+
+def main():
+    rows = [run(interval) for interval in INTERVALS]
+    header = ('interval_ms', 'cycles', 'reports', 'us/cycle', 'left')
+    if '--json' in sys.argv:
+        emit_json(
+            'mouse',
+            ('interval_ms', 'cycles', 'reports', 'us_per_cycle', 'left'),
+            rows,
+        )
+    else:
+        report('Pointer motion reports by poll interval', header, rows)
+
+
+if __name__ == '__main__':
+    main()
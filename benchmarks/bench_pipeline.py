@@ -0,0 +1,211 @@
+'''
+Throughput of the key processing pipeline, by module stack.
+
+Key events are queued as if they were scanned and processed by one main loop
+cycle each, that is `pre_process_key` and the `process_key` of every module,
+the resume buffer, timeouts, and module hooks. The virtual clock advances by
+`STEP_MS` per event, so that holdtap and tapdance decisions and combo
+timeouts resolve as they would when typing.
+
+Allocations are traced over one pass of the workload, after a warm-up pass,
+with the garbage collector disabled: `blocks/event` counts memory blocks that
+are still allocated at the end of the pass, including garbage that only the
+collector would free, and `peak [B]` is the peak of traced memory.
+
+Pass `--json` for one JSON object per stack instead of a table.
+'''
+import random
+import sys
+import time
+from keypad import Event as KeyEvent
+
+from benchmarks.harness import allocations, emit_json, make_keyboard, report
+from kmk.keys import KC
+from kmk.modules.combos import Chord, Combos
+from kmk.modules.holdtap import HoldTap
+from kmk.modules.layers import Layers
+from kmk.modules.oneshot import OneShot
+from kmk.modules.string_substitution import StringSubstitution
+from kmk.modules.tapdance import TapDance
+from tests.mocks import clock
+
+# Passes over the workload per stack, unless they take longer than MAX_NS.
+REPEAT = 20
+MAX_NS = 1_000_000_000
+STEP_MS = 10
+FLUSH_CYCLES = 10
+TEXT = 'the quick brown fox jumps over the lazy dog 0123456789'
+
+ALPHANUMERIC = 'abcdefghijklmnopqrstuvwxyz0123456789'
+
+
+def alphanumeric_keymap(extra=()):
+    layer = [KC[c] for c in ALPHANUMERIC] + [KC.SPC, KC.LSFT, KC.MO(1)] + list(extra)
+    return [layer, [KC.TRNS] * len(layer)]
+
+
+def type_text(keymap, text=TEXT):
+    '''Press and release the key of each character of `text`.'''
+    events = []
+    for char in text:
+        key = KC.SPC if char == ' ' else KC[char]
+        key_number = keymap[0].index(key)
+        events.append((key_number, True))
+        events.append((key_number, False))
+    return events
+
+
+def stack_layers():
+    modules = [Layers()]
+    keymap = alphanumeric_keymap()
+    return modules, keymap, type_text(keymap)
+
+
+def stack_holdtap():
+    modules = [Layers(), HoldTap()]
+    keymap = alphanumeric_keymap()
+    # Home row mods.
+    for char, mod in zip('asdfjkl', (KC.LGUI, KC.LALT, KC.LCTL, KC.LSFT) * 2):
+        idx = keymap[0].index(KC[char])
+        keymap[0][idx] = KC.HT(KC[char], mod)
+    events = []
+    for char in TEXT:
+        key = KC.SPC if char == ' ' else KC[char]
+        key_number = [getattr(k.meta, 'tap', k) for k in keymap[0]].index(key)
+        events.append((key_number, True))
+        events.append((key_number, False))
+    return modules, keymap, events
+
+
+def stack_combos(count):
+    def make():
+        rng = random.Random(count)
+        keymap = alphanumeric_keymap()
+        combos = set()
+        while len(combos) < count:
+            combos.add(tuple(sorted(rng.sample(ALPHANUMERIC, rng.choice((2, 3))))))
+        modules = [
+            Layers(),
+            Combos([Chord(tuple(KC[c] for c in match), KC.X) for match in combos]),
+        ]
+        return modules, keymap, type_text(keymap)
+
+    return make
+
+
+def stack_tapdance():
+    modules = [Layers(), HoldTap(), TapDance()]
+    keymap = alphanumeric_keymap([KC.TD(KC.A, KC.B), KC.TD(KC.HT(KC.C, KC.LCTL), KC.D)])
+    td_1, td_2 = len(keymap[0]) - 2, len(keymap[0]) - 1
+    events = type_text(keymap)
+    for key_number in (td_1, td_1, td_2, td_2, td_2):
+        events.append((key_number, True))
+        events.append((key_number, False))
+    return modules, keymap, events
+
+
+def stack_string_substitution():
+    rng = random.Random(0)
+    letters = 'abcdefghijklmnopqrstuvwxyz'
+    dictionary = {}
+    while len(dictionary) < 1000:
+        word = ''.join(rng.choice(letters) for _ in range(rng.randint(3, 8)))
+        dictionary[word] = word.upper()
+    # Make sure that something is substituted.
+    dictionary['fox'] = 'cat'
+    modules = [Layers(), StringSubstitution(dictionary)]
+    keymap = alphanumeric_keymap()
+    return modules, keymap, type_text(keymap)
+
+
+def stack_oneshot():
+    modules = [Layers(), OneShot()]
+    keymap = alphanumeric_keymap([KC.OS(KC.LSFT)])
+    os_shift = len(keymap[0]) - 1
+    events = []
+    for word in TEXT.split(' '):
+        # Capitalize every word.
+        events.append((os_shift, True))
+        events.append((os_shift, False))
+        events.extend(type_text(keymap, word + ' '))
+    return modules, keymap, events
+
+
+STACKS = (
+    ('layers', stack_layers),
+    ('layers+holdtap', stack_holdtap),
+    ('combos-50', stack_combos(50)),
+    ('combos-200', stack_combos(200)),
+    ('combos-1000', stack_combos(1000)),
+    ('tapdance', stack_tapdance),
+    ('string_substitution-1000', stack_string_substitution),
+    ('oneshot', stack_oneshot),
+)
+
+
+def run(keyboard, events):
+    for key_number, pressed in events:
+        keyboard.matrix_update_queue.append(KeyEvent(key_number, pressed))
+        keyboard._main_loop()
+        clock.advance(STEP_MS)
+
+    # Let everything time out and settle before the next pass.
+    clock.advance(1000)
+    for _ in range(FLUSH_CYCLES):
+        keyboard._main_loop()
+
+
+def main():
+    rows = []
+    for name, make in STACKS:
+        # Module keys are bound to the module instance that created them.
+        KC.clear()
+        modules, keymap, events = make()
+        keyboard = make_keyboard(keymap, modules)
+
+        run(keyboard, events)
+        blocks, peak = allocations(lambda: run(keyboard, events))
+
+        passes = 0
+        start = time.perf_counter_ns()
+        while passes < REPEAT:
+            run(keyboard, events)
+            passes += 1
+            if time.perf_counter_ns() - start > MAX_NS:
+                break
+        elapsed = (time.perf_counter_ns() - start) / (passes * len(events))
+
+        rows.append(
+            (
+                name,
+                len(events),
+                1e9 / elapsed,
+                elapsed / 1000,
+                blocks / len(events),
+                peak,
+            )
+        )
+
+    if '--json' in sys.argv:
+        emit_json(
+            'pipeline',
+            (
+                'stack',
+                'events',
+                'events_per_s',
+                'us_per_event',
+                'blocks_per_event',
+                'peak_bytes',
+            ),
+            rows,
+        )
+    else:
+        report(
+            'Key processing pipeline throughput',
+            ('stack', 'events', 'events/s', 'us/event', 'blocks/event', 'peak [B]'),
+            rows,
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+'''
+Cost of the scheduler task queues, by number of concurrent timers.
+
+`heap` is the pairing heap `TaskQueue` of `_asyncio`, `wheel` the hashed
+timing wheel of `kmk.timer_wheel`. For each number of pending timers, with
+`short` timeouts spread over 1 to 300 ms, or `long` ones over 1 to 5000 ms,
+most of which are more than one revolution of the wheel ahead:
+- `churn`: scheduling and cancelling one more timer, like a combo or holdtap
+  timeout that is resolved before it expires, or a long timeout halfway
+  through the spread.
+- `expire`: running all timers to expiry, stepping the virtual clock by 1 ms,
+  per timer.
+
+On the host both queues are Python; on CircuitPython the heap is implemented
+in C, so compare the ratios of these numbers, not the numbers themselves.
+'''
+import random
+import sys
+import time
+
+from benchmarks.harness import emit_json, measure, report
+from kmk import scheduler
+from kmk.timer_wheel import TimerWheel
+from tests.mocks import clock
+
+TIMERS = (10, 100, 1000)
+QUEUES = (('heap', scheduler.TaskQueue), ('wheel', TimerWheel))
+# Name, maximum timeout and timeout of the churned timer, in ms.
+TIMEOUTS = (('short', 300, 50), ('long', 5000, 2500))
+
+
+def noop():
+    pass
+
+
+def fill(rng, count, timeout_max):
+    for _ in range(count):
+        scheduler.create_task(noop, after_ms=rng.randint(1, timeout_max))
+
+
+def churn(make_queue, count, timeout_max, after_ms):
+    scheduler._task_queue = make_queue()
+    fill(random.Random(0), count, timeout_max)
+
+    def schedule_cancel():
+        scheduler.cancel_task(scheduler.create_task(noop, after_ms=after_ms))
+
+    return measure(schedule_cancel, number=2000)
+
+
+def expire(make_queue, count, timeout_max):
+    best = None
+    for seed in range(5):
+        scheduler._task_queue = make_queue()
+        fill(random.Random(seed), count, timeout_max)
+
+        start = time.perf_counter_ns()
+        for _ in range(timeout_max):
+            clock.advance(1)
+            for task in scheduler.get_due_task():
+                task()
+        elapsed = (time.perf_counter_ns() - start) / count
+        assert scheduler._task_queue.peek() is None
+
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def main():
+    rows = []
+    for timeouts, timeout_max, after_ms in TIMEOUTS:
+        for count in TIMERS:
+            for name, make_queue in QUEUES:
+                rows.append(
+                    (
+                        name,
+                        timeouts,
+                        count,
+                        churn(make_queue, count, timeout_max, after_ms),
+                        expire(make_queue, count, timeout_max),
+                    )
+                )
+    scheduler._task_queue = scheduler.TaskQueue()
+
+    if '--json' in sys.argv:
+        emit_json(
+            'scheduler',
+            ('queue', 'timeouts', 'timers', 'churn_ns', 'expire_ns'),
+            rows,
+        )
+    else:
+        report(
+            'Scheduler task queues [ns/timer]',
+            ('queue', 'timeouts', 'timers', 'churn', 'expire'),
+            rows,
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+import gc
+
+import json
+import sys
+import time
+import tracemalloc
+
+from kmk import scheduler
+from kmk.hid import HIDModes
+from kmk.kmk_keyboard import KMKKeyboard
+from kmk.scanners import Scanner
+
+
+class NullScanner(Scanner):
+    '''A scanner without events, providing the key count of the keymap.'''
+
+    def __init__(self, key_count):
+        self._key_count = key_count
+
+    @property
+    def key_count(self):
+        return self._key_count
+
+    def scan_for_changes(self):
+        return None
+
+
+def make_keyboard(keymap, modules=(), extensions=()):
+    '''
+    Boot a keyboard for benchmarking, with fresh per-keyboard state and
+    without HID.
+    '''
+    keyboard = KMKKeyboard()
+    keyboard.keymap = keymap
+    keyboard.matrix = NullScanner(len(keymap[0]))
+    keyboard.modules = list(modules)
+    keyboard.extensions = list(extensions)
+    keyboard.active_layers = [0]
+    keyboard.keys_pressed = set()
+    keyboard._coordkeys_pressed = {}
+    scheduler._task_queue = scheduler.TaskQueue()
+    keyboard._init(hid_type=HIDModes.NOOP)
+    return keyboard
+
+
+def measure(func, number=10000, repeat=5):
+    '''
+    Call `func` `number` times, `repeat` times over, and return the best
+    per-call duration in nanoseconds.
+    '''
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter_ns()
+        for _ in range(number):
+            func()
+        elapsed = (time.perf_counter_ns() - start) / number
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def allocations(func):
+    '''
+    Call `func` once under tracemalloc, with the garbage collector disabled,
+    and return the number of memory blocks it left allocated, and the peak of
+    traced memory in bytes.
+    '''
+    gc.disable()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        tracemalloc.reset_peak()
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+        gc.enable()
+
+    ignore = (tracemalloc.Filter(False, tracemalloc.__file__),)
+    before = before.filter_traces(ignore)
+    after = after.filter_traces(ignore)
+    blocks = sum(stat.count_diff for stat in after.compare_to(before, 'filename'))
+    return blocks, peak
+
+
+def emit_json(benchmark, header, rows, file=sys.stdout):
+    '''Print one JSON object per row, keyed by `header`.'''
+    for row in rows:
+        print(json.dumps({'benchmark': benchmark, **dict(zip(header, row))}), file=file)
+
+
+def report(title, header, rows):
+    '''Print a plain text table.'''
+    widths = [len(h) for h in header]
+    rows = [[f'{c:.1f}' if isinstance(c, float) else str(c) for c in r] for r in rows]
+    for row in rows:
+        widths = [max(w, len(c)) for w, c in zip(widths, row)]
+
+    print(title)
+    print('  '.join(h.rjust(w) for h, w in zip(header, widths)))
+    for row in rows:
+        print('  '.join(c.rjust(w) for c, w in zip(row, widths)))
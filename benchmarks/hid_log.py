@@ -0,0 +1,194 @@
+'''
+Capture HID reports to a binary log, and compare logs.
+
+`RecordingHID` is a HID backend that appends every report sent to the host to
+a log, stamped with the virtual clock. Driving two versions of KMK with the
+same input trace and comparing their logs shows changes in behaviour, i.e.
+which reports are sent, and in timing, i.e. when they're sent.
+
+Record the pipeline benchmark stacks, one log per stack, to a directory:
+`python -m benchmarks.hid_log record DIR [STACK ...]`
+Only the built-in stacks and their input of `benchmarks.bench_pipeline` can be
+recorded; for other scenarios, use `record_keyboard` from a script.
+
+Compare the logs of two directories, or two single logs:
+`python -m benchmarks.hid_log diff OLD NEW`
+
+Print a log:
+`python -m benchmarks.hid_log dump LOG`
+
+Log format: the magic `KMKHID`, a version byte, and one record per report.
+A record is the virtual time in ms since the start of recording (uint32, little
+endian), the report type, the payload length (one byte each), and the payload.
+'''
+import os
+import struct
+import sys
+
+from kmk.hid import AbstractHID
+from tests.mocks import clock
+
+MAGIC = b'KMKHID'
+VERSION = 1
+RECORD = struct.Struct('<IBB')
+
+
+class RecordingHID(AbstractHID):
+    def __init__(self, stream, **kwargs):
+        self._stream = None
+        # Report size autodetection sends reports; don't record those.
+        super().__init__(**kwargs)
+        self._stream = stream
+        self._start = clock.now
+        stream.write(MAGIC + bytes((VERSION,)))
+
+    def hid_send(self, evt):
+        if self._stream is None:
+            return
+        payload = bytes(evt[1:])
+        self._stream.write(
+            RECORD.pack(clock.now - self._start, evt[0], len(payload)) + payload
+        )
+
+
+def record_keyboard(keyboard, stream):
+    '''Replace the HID backend of a booted keyboard with a recording one.'''
+    keyboard._hid_helper = RecordingHID(stream)
+    return keyboard._hid_helper
+
+
+def read_log(stream):
+    '''Yield `(time_ms, report_type, payload)` for each record of a log.'''
+    header = stream.read(len(MAGIC) + 1)
+    if header[: len(MAGIC)] != MAGIC:
+        raise ValueError('not a HID report log')
+    if header[len(MAGIC)] != VERSION:
+        raise ValueError(f'unsupported log version {header[len(MAGIC)]}')
+
+    while True:
+        data = stream.read(RECORD.size)
+        if not data:
+            return
+        time_ms, report_type, length = RECORD.unpack(data)
+        yield time_ms, report_type, stream.read(length)
+
+
+def load(path):
+    with open(path, 'rb') as stream:
+        return list(read_log(stream))
+
+
+def summarize(records):
+    '''Report count, per report type count, and inter-report delays in ms.'''
+    counts = {}
+    for _, report_type, _ in records:
+        counts[report_type] = counts.get(report_type, 0) + 1
+    delays = [b[0] - a[0] for a, b in zip(records, records[1:])]
+    return {
+        'reports': len(records),
+        'types': counts,
+        'duration': records[-1][0] if records else 0,
+        'delay_avg': sum(delays) / len(delays) if delays else 0,
+        'delay_max': max(delays) if delays else 0,
+    }
+
+
+def diff(old, new):
+    '''
+    Return lines describing the differences between two lists of records:
+    summary changes, the first diverging report, and the largest timing shift
+    of matching reports. Empty if the logs are identical.
+    '''
+    if old == new:
+        return []
+
+    lines = []
+    summary_old = summarize(old)
+    summary_new = summarize(new)
+    for key in summary_old:
+        if summary_old[key] != summary_new[key]:
+            lines.append(f'{key}: {summary_old[key]} -> {summary_new[key]}')
+
+    shift = 0
+    shift_idx = None
+    for idx, (a, b) in enumerate(zip(old, new)):
+        if a[1:] != b[1:]:
+            lines.append(
+                f'report {idx} differs: '
+                f'{a[0]}ms {a[1]}:{a[2].hex()} -> {b[0]}ms {b[1]}:{b[2].hex()}'
+            )
+            break
+        if abs(b[0] - a[0]) > abs(shift):
+            shift = b[0] - a[0]
+            shift_idx = idx
+    else:
+        if len(old) != len(new):
+            lines.append(f'report {min(len(old), len(new))} missing')
+
+    if shift_idx is not None:
+        lines.append(f'max timing shift: {shift:+}ms at report {shift_idx}')
+
+    return lines
+
+
+def record(directory, names=()):
+    from benchmarks.bench_pipeline import STACKS, run
+    from benchmarks.harness import make_keyboard
+    from kmk.keys import KC
+
+    os.makedirs(directory, exist_ok=True)
+    for name, make in STACKS:
+        if names and name not in names:
+            continue
+        KC.clear()
+        modules, keymap, events = make()
+        keyboard = make_keyboard(keymap, modules)
+        with open(os.path.join(directory, name + '.log'), 'wb') as stream:
+            record_keyboard(keyboard, stream)
+            run(keyboard, events)
+        print(f'{name}: {summarize(load(stream.name))["reports"]} reports')
+
+
+def compare(old, new):
+    if os.path.isdir(old):
+        names = sorted(set(os.listdir(old)) | set(os.listdir(new)))
+        pairs = [
+            (name, os.path.join(old, name), os.path.join(new, name)) for name in names
+        ]
+    else:
+        pairs = [(os.path.basename(new), old, new)]
+
+    changed = False
+    for name, path_old, path_new in pairs:
+        if not (os.path.exists(path_old) and os.path.exists(path_new)):
+            print(f'{name}: only in one of the logs')
+            changed = True
+            continue
+        lines = diff(load(path_old), load(path_new))
+        print(f'{name}: ' + ('changed' if lines else 'identical'))
+        for line in lines:
+            print('  ' + line)
+        changed = changed or bool(lines)
+    return changed
+
+
+def dump(path):
+    for time_ms, report_type, payload in load(path):
+        print(f'{time_ms:8}  {report_type}  {payload.hex(" ")}')
+
+
+def main(argv):
+    if len(argv) >= 2 and argv[0] == 'record':
+        record(argv[1], argv[2:])
+    elif len(argv) == 3 and argv[0] == 'diff':
+        return 1 if compare(argv[1], argv[2]) else 0
+    elif len(argv) == 2 and argv[0] == 'dump':
+        dump(argv[1])
+    else:
+        print(__doc__)
+        return 2
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -5,6 +5,10 @@ class InvalidExtensionEnvironment(Exception):
 class Extension:
     _enabled = True
 
+    # Extensions that poll in their main loop hooks set this to the longest
+    # time in ms the keyboard may idle between two main loop cycles.
+    wake_interval = None
+
     def enable(self, keyboard):
         self._enabled = True
 
@@ -15,7 +19,8 @@ class Extension:
 
         self.on_runtime_disable(keyboard)
 
-    # The below methods should be implemented by subclasses
+    # The below methods should be implemented by subclasses. Main loop hooks
+    # that aren't overridden are skipped by the keyboard.
 
     def on_runtime_enable(self, keyboard):
         raise NotImplementedError
@@ -30,25 +35,25 @@ class Extension:
         '''
         Return value will be injected as an extra matrix update
         '''
-        raise NotImplementedError
+        return
 
     def after_matrix_scan(self, keyboard):
         '''
         Return value will be replace matrix update if supplied
         '''
-        raise NotImplementedError
+        return
 
     def before_hid_send(self, keyboard):
-        raise NotImplementedError
+        return
 
     def after_hid_send(self, keyboard):
-        raise NotImplementedError
+        return
 
     def on_powersave_enable(self, keyboard):
-        raise NotImplementedError
+        return
 
     def on_powersave_disable(self, keyboard):
-        raise NotImplementedError
+        return
 
     def deinit(self, keyboard):
         pass
@@ -8,8 +8,9 @@ from adafruit_display_text import label
 from kmk.extensions import Extension
 from kmk.handlers.stock import passthrough as handler_passthrough
 from kmk.keys import make_key
-from kmk.kmktime import PeriodicTimer, ticks_diff
+from kmk.kmktime import ticks_diff
 from kmk.modules.split import Split, SplitSide
+from kmk.scheduler import cancel_task, create_task
 from kmk.utils import clamp
 
 displayio.release_displays()
@@ -237,7 +238,8 @@ class Display(Extension):
         self.powersavedim_time_ms = powersave_dim_time * 1000
         self.powersave_dim_target = powersave_dim_target
         self.powersave_off_time_ms = powersave_off_time * 1000
-        self.dim_period = PeriodicTimer(50)
+        self.refresh_period = 50
+        self._task = None
         self.split_side = None
 
         make_key(
@@ -289,6 +291,8 @@ class Display(Extension):
         return
 
     def during_bootup(self, keyboard):
+        self._keyboard = keyboard
+
         for module in keyboard.modules:
             if isinstance(module, Split):
                 self.split_side = module.split_side
@@ -305,23 +309,19 @@ class Display(Extension):
         self.display.during_bootup(self.width, self.height, 180 if self.flip else 0)
         self.display.brightness = self.brightness
 
-    def before_matrix_scan(self, sandbox):
-        if self.dim_period.tick():
-            self.dim()
-        if sandbox.active_layers[0] != self.prev_layer:
-            self.prev_layer = sandbox.active_layers[0]
-            self.render(sandbox.active_layers[0])
+        self._task = create_task(self.refresh, period_ms=self.refresh_period)
+
+    def refresh(self):
+        self.dim()
+        layer = self._keyboard.active_layers[0]
+        if layer != self.prev_layer:
+            self.prev_layer = layer
+            self.render(layer)
 
     def after_matrix_scan(self, sandbox):
         if sandbox.matrix_update or sandbox.secondary_matrix_update:
             self.timer_start = ticks_ms()
 
-    def before_hid_send(self, sandbox):
-        return
-
-    def after_hid_send(self, sandbox):
-        return
-
     def on_powersave_enable(self, sandbox):
         self.powersave = True
 
@@ -329,6 +329,8 @@ class Display(Extension):
         self.powersave = False
 
     def deinit(self, sandbox):
+        if self._task is not None:
+            cancel_task(self._task)
         displayio.release_displays()
         self.display.deinit()
 
@@ -3,6 +3,7 @@ from math import e, exp, pi, sin
 
 from kmk.extensions import Extension, InvalidExtensionEnvironment
 from kmk.keys import make_argumented_key, make_key
+from kmk.scheduler import Timer, cancel_task, create_task
 from kmk.utils import clamp
 
 
@@ -32,6 +33,7 @@ class LED(Extension):
         animation_speed=1,
         user_animation=None,
         val=100,
+        refresh_rate=60,
     ):
         try:
             pins_iter = iter(led_pin)
@@ -53,10 +55,13 @@ class LED(Extension):
 
         self.brightness_step = brightness_step
         self.brightness_limit = brightness_limit
-        self.animation_mode = animation_mode
+        self._animation_mode = animation_mode
         self.animation_speed = animation_speed
         self.breathe_center = breathe_center
         self.val = val
+        self.refresh_rate = refresh_rate
+        self._task = None
+        self._update = None
 
         if user_animation is not None:
             self.user_animation = user_animation
@@ -112,25 +117,45 @@ class LED(Extension):
         return
 
     def during_bootup(self, sandbox):
-        return
-
-    def before_matrix_scan(self, sandbox):
-        return
-
-    def after_matrix_scan(self, sandbox):
-        return
-
-    def before_hid_send(self, sandbox):
-        return
-
-    def after_hid_send(self, sandbox):
-        self.animate()
-
-    def on_powersave_enable(self, sandbox):
-        return
-
-    def on_powersave_disable(self, sandbox):
-        return
+        self._update = Timer(self.animate)
+        self._schedule()
+
+    def deinit(self, sandbox):
+        if self._task is not None:
+            cancel_task(self._task)
+            self._task = None
+        if self._update is not None:
+            self._update.cancel()
+
+    @property
+    def animation_mode(self):
+        return self._animation_mode
+
+    @animation_mode.setter
+    def animation_mode(self, mode):
+        self._animation_mode = mode
+        self._schedule()
+
+    def _schedule(self):
+        # Only animations run periodically; other modes are applied once.
+        if self._update is None:
+            return
+        if self._enabled and self._animation_mode in (
+            AnimationModes.BREATHING,
+            AnimationModes.USER,
+        ):
+            if self._task is None:
+                # A period of 0 would only run once; refresh rates of 0 or
+                # above 1 kHz animate every millisecond.
+                period_ms = 1
+                if self.refresh_rate > 0:
+                    period_ms = max(1, 1000 // self.refresh_rate)
+                self._task = create_task(self.animate, period_ms=period_ms)
+        else:
+            if self._task is not None:
+                cancel_task(self._task)
+                self._task = None
+            self._update.rearm(0)
 
     def _init_effect(self):
         self._pos = 0
@@ -195,7 +220,7 @@ class LED(Extension):
     def effect_static(self):
         self.set_brightness(self._brightness)
         # Set animation mode to standby to prevent cycles from being wasted
-        self.animation_mode = AnimationModes.STATIC_STANDBY
+        self._animation_mode = AnimationModes.STATIC_STANDBY
 
     def animate(self):
         '''
@@ -234,6 +259,7 @@ class LED(Extension):
         if self._enabled:
             self.off()
         self._enabled = not self._enabled
+        self._schedule()
 
     def _key_led_inc(self, key, *args, **kwargs):
         self.increase_brightness(leds=key.meta.leds)
@@ -143,19 +143,3 @@ class Oled(Extension):
             self._prevLayers = sandbox.active_layers[0]
             self.updateOLED(sandbox)
         return
-
-    def after_matrix_scan(self, sandbox):
-
-        return
-
-    def before_hid_send(self, sandbox):
-        return
-
-    def after_hid_send(self, sandbox):
-        return
-
-    def on_powersave_enable(self, sandbox):
-        return
-
-    def on_powersave_disable(self, sandbox):
-        return
@@ -85,19 +85,10 @@ class statusLED(Extension):
             led.duty_cycle = int(0)
         return
 
-    def before_matrix_scan(self, sandbox):
-        return
-
     def after_matrix_scan(self, sandbox):
         self._layer_indicator(sandbox.active_layers[0])
         return
 
-    def before_hid_send(self, sandbox):
-        return
-
-    def after_hid_send(self, sandbox):
-        return
-
     def on_powersave_enable(self, sandbox):
         self.set_brightness(0)
         return
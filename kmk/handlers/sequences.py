@@ -16,6 +16,7 @@ def get_wide_ordinal(char):
 def sequence_press_handler(key, keyboard, KC, *args, **kwargs):
     oldkeys_pressed = keyboard.keys_pressed
     keyboard.keys_pressed = set()
+    keyboard.invalidate_report()
 
     for ikey in key.meta.seq:
         if not getattr(ikey, 'no_press', None):
@@ -29,6 +30,7 @@ def sequence_press_handler(key, keyboard, KC, *args, **kwargs):
             keyboard._send_hid()
 
     keyboard.keys_pressed = oldkeys_pressed
+    keyboard.invalidate_report()
 
     return keyboard
 
@@ -8,14 +8,14 @@ def passthrough(key, keyboard, *args, **kwargs):
 def default_pressed(key, keyboard, KC, coord_int=None, *args, **kwargs):
     keyboard.hid_pending = True
 
-    keyboard.keys_pressed.add(key)
+    keyboard.report_key(key, True)
 
     return keyboard
 
 
 def default_released(key, keyboard, KC, coord_int=None, *args, **kwargs):  # NOQA
     keyboard.hid_pending = True
-    keyboard.keys_pressed.discard(key)
+    keyboard.report_key(key, False)
 
     return keyboard
 
@@ -57,20 +57,20 @@ def gesc_pressed(key, keyboard, KC, *args, **kwargs):
         # First, release GUI if already pressed
         keyboard._send_hid()
         # if Shift is held, KC_GRAVE will become KC_TILDE on OS level
-        keyboard.keys_pressed.add(KC.GRAVE)
+        keyboard.report_key(KC.GRAVE, True)
         keyboard.hid_pending = True
         return keyboard
 
     # else return KC_ESC
-    keyboard.keys_pressed.add(KC.ESCAPE)
+    keyboard.report_key(KC.ESCAPE, True)
     keyboard.hid_pending = True
 
     return keyboard
 
 
 def gesc_released(key, keyboard, KC, *args, **kwargs):
-    keyboard.keys_pressed.discard(KC.ESCAPE)
-    keyboard.keys_pressed.discard(KC.GRAVE)
+    keyboard.report_key(KC.ESCAPE, False)
+    keyboard.report_key(KC.GRAVE, False)
     keyboard.hid_pending = True
     return keyboard
 
@@ -80,20 +80,20 @@ def bkdl_pressed(key, keyboard, KC, *args, **kwargs):
 
     if BKDL_TRIGGERS.intersection(keyboard.keys_pressed):
         keyboard._send_hid()
-        keyboard.keys_pressed.add(KC.DEL)
+        keyboard.report_key(KC.DEL, True)
         keyboard.hid_pending = True
         return keyboard
 
     # else return KC_ESC
-    keyboard.keys_pressed.add(KC.BKSP)
+    keyboard.report_key(KC.BKSP, True)
     keyboard.hid_pending = True
 
     return keyboard
 
 
 def bkdl_released(key, keyboard, KC, *args, **kwargs):
-    keyboard.keys_pressed.discard(KC.BKSP)
-    keyboard.keys_pressed.discard(KC.DEL)
+    keyboard.report_key(KC.BKSP, False)
+    keyboard.report_key(KC.DEL, False)
     keyboard.hid_pending = True
     return keyboard
 
@@ -1,11 +1,12 @@
 import supervisor
 import usb_hid
 from micropython import const
+from supervisor import ticks_ms
 
 from storage import getmount
 
-from kmk.keys import FIRST_KMK_INTERNAL_KEY, ConsumerKey, ModifierKey, MouseKey
-from kmk.utils import Debug, clamp
+from kmk.kmktime import ticks_diff
+from kmk.utils import Debug, RingBuffer, clamp
 
 try:
     from adafruit_ble import BLERadio
@@ -18,6 +19,8 @@ except ImportError:
 
 debug = Debug(__name__)
 
+_REPORT_QUEUE_SIZE = const(16)
+
 
 class HIDModes:
     NOOP = 0  # currently unused; for testing?
@@ -54,10 +57,27 @@ HID_REPORT_SIZES = {
 }
 
 
+def _signed(byte):
+    return byte - 256 if byte & 0x80 else byte
+
+
+def _has_code(report, code, start):
+    for idx in range(start, len(report)):
+        if report[idx] == code:
+            return True
+    return False
+
+
 class AbstractHID:
     REPORT_BYTES = 8
 
-    def __init__(self, **kwargs):
+    # Minimum time in ms between two reports of the same type; changes within
+    # one interval are coalesced. 0 sends reports immediately.
+    poll_interval_ms = 0
+
+    def __init__(self, poll_interval_ms=None, **kwargs):
+        if poll_interval_ms is not None:
+            self.poll_interval_ms = poll_interval_ms
 
         self._evt = bytearray(self.REPORT_BYTES)
         self._evt[0] = HIDReportTypes.KEYBOARD
@@ -89,11 +109,9 @@ class AbstractHID:
 
         self._cc_report = bytearray(HID_REPORT_SIZES[HIDReportTypes.CONSUMER] + 1)
         self._cc_report[0] = HIDReportTypes.CONSUMER
-        self._cc_pending = False
 
         self._pd_report = bytearray(HID_REPORT_SIZES[HIDReportTypes.MOUSE] + 1)
         self._pd_report[0] = HIDReportTypes.MOUSE
-        self._pd_pending = False
 
         # bodgy pointing device panning autodetect
         try:
@@ -109,28 +127,113 @@ class AbstractHID:
             if debug.enabled:
                 debug('mouse disabled')
 
+        # Reports are built in the buffers above, staged until the next poll
+        # interval, and compared to the last report sent per type.
+        self._staged_evt = bytearray(self._evt)
+        self._staged_cc = bytearray(self._cc_report)
+        self._prev_cc = bytearray(self._cc_report)
+        self._staged_pd = bytearray(self._pd_report)
+        self._prev_pd = bytearray(self._pd_report)
+        self._queue = RingBuffer(_REPORT_QUEUE_SIZE)
+        self._last_send = None
+        self.dirty = False
+
+        # Number of pressed keys per key code and modifier bit, for incremental
+        # updates.
+        self._zeros = bytes(256)
+        self._key_counts = bytearray(256)
+        self._modifier_counts = bytearray(8)
+
+        # Keys that didn't fit into a 6KRO report, in the order they were
+        # pressed, and the number of times that happened.
+        self._overflow_keys = []
+        self.overflow = 0
+
+        # Report updates and lookups, indexed by `Key.report_type`, i.e.
+        # `KeyType`.
+        self._reporters = (
+            self._report_keyboard,
+            self._report_modifier,
+            self._report_consumer,
+            self._report_mouse,
+            self._report_internal,
+        )
+        self._has_keys = (
+            self._has_keyboard_key,
+            self._has_modifier,
+            self._has_consumer_key,
+            self._has_mouse_key,
+            self._has_internal_key,
+        )
+
     def __repr__(self):
         return f'{self.__class__.__name__}(REPORT_BYTES={self.REPORT_BYTES})'
 
     def create_report(self, keys_pressed, axes):
+        '''Rebuild the reports from scratch.'''
         self.clear_all()
 
         for key in keys_pressed:
-            if key.code >= FIRST_KMK_INTERNAL_KEY:
-                continue
-
-            if isinstance(key, ModifierKey):
-                self.add_modifier(key)
-            elif isinstance(key, ConsumerKey):
-                self.add_cc(key)
-            elif isinstance(key, MouseKey):
-                self.add_pd(key)
-            else:
+            self.report_key(key, True)
+
+        self.report_axes(axes)
+
+    def report_key(self, key, is_pressed):
+        '''
+        Apply a single key press or release to the reports, without rebuilding
+        them. Key codes and modifiers are reference counted: keys that share
+        either are reported until the last of them is released.
+        '''
+        self._reporters[key.report_type](key, is_pressed)
+
+    def _report_keyboard(self, key, is_pressed):
+        code = key.code
+        counts = self._key_counts
+        if is_pressed:
+            counts[code] += 1
+            if counts[code] == 1:
                 self.add_key(key)
-                if key.has_modifiers:
-                    for mod in key.has_modifiers:
-                        self.add_modifier(mod)
+        elif counts[code]:
+            counts[code] -= 1
+            if not counts[code]:
+                self.remove_key(key)
+
+        if key.modifier_mask:
+            self._count_modifiers(key.modifier_mask, is_pressed)
+
+    def _report_modifier(self, key, is_pressed):
+        self._count_modifiers(key.modifier_mask, is_pressed)
+
+    def _report_consumer(self, key, is_pressed):
+        if is_pressed:
+            self.add_cc(key)
+        elif self._cc_report[1] | self._cc_report[2] << 8 == key.code:
+            self.remove_cc()
+
+    def _report_mouse(self, key, is_pressed):
+        if is_pressed:
+            self.add_pd(key)
+        else:
+            self._pd_report[1] &= ~key.code
 
+    def _report_internal(self, key, is_pressed):
+        pass
+
+    def _count_modifiers(self, mods, is_pressed):
+        counts = self._modifier_counts
+        for bit in range(8):
+            if not mods & (1 << bit):
+                continue
+            if is_pressed:
+                counts[bit] += 1
+                self.report_mods[0] |= 1 << bit
+            elif counts[bit]:
+                counts[bit] -= 1
+                if not counts[bit]:
+                    self.report_mods[0] &= ~(1 << bit)
+
+    def report_axes(self, axes):
+        self.clear_axis()
         for axis in axes:
             self.move_axis(axis)
 
@@ -143,23 +246,163 @@ class AbstractHID:
         pass
 
     def send(self):
-        if self._evt != self._prev_evt:
-            self._prev_evt[:] = self._evt
-            self.hid_send(self._evt)
+        '''
+        Stage the current reports and send them when the poll interval allows.
+
+        Changes within one interval are coalesced into a single report per
+        type. A change that undoes a staged but unsent change, like the release
+        of a key whose press hasn't been sent yet, queues the staged report
+        first: presses and releases reach the host in order, and none is lost.
+        '''
+        evt = self._evt
+        staged = self._staged_evt
+        if evt != staged:
+            if staged != self._prev_evt and self._reverts(self._prev_evt, staged, evt):
+                self._commit(staged, self._prev_evt)
+            staged[:] = evt
+            self.dirty = True
+
+        cc = self._cc_report
+        staged = self._staged_cc
+        if cc != staged:
+            if staged != self._prev_cc:
+                self._commit(staged, self._prev_cc)
+            staged[:] = cc
+            self.dirty = True
+
+        self._stage_pd()
+
+        self.poll()
 
-        if self._cc_pending:
-            self.hid_send(self._cc_report)
-            self._cc_pending = False
+        return self
 
-        if self._pd_pending:
-            self.hid_send(self._pd_report)
-            self._pd_pending = False
+    def _reverts(self, prev, staged, evt):
+        # Modifiers, and the whole report in NKRO mode, are bitmaps: a bit
+        # changed twice is a lost press or release.
+        end = len(evt) if self._nkro else 2
+        for idx in range(1, end):
+            if (prev[idx] ^ staged[idx]) & (staged[idx] ^ evt[idx]):
+                return True
+        if self._nkro:
+            return False
+
+        # 6KRO key slots: a staged press that is gone again, or a staged
+        # release that is pressed again.
+        for idx in range(3, len(staged)):
+            code = staged[idx]
+            if code and not _has_code(prev, code, 3) and not _has_code(evt, code, 3):
+                return True
+            code = prev[idx]
+            if code and not _has_code(staged, code, 3) and _has_code(evt, code, 3):
+                return True
+        return False
+
+    def _stage_pd(self):
+        pd = self._pd_report
+        staged = self._staged_pd
+        prev = self._prev_pd
+
+        if pd[1] != staged[1]:
+            if (prev[1] ^ staged[1]) & (staged[1] ^ pd[1]):
+                self._commit(staged, prev)
+            staged[1] = pd[1]
+            self.dirty = True
+
+        # Axes are relative and accumulate until sent.
+        for idx in range(2, len(pd)):
+            if not pd[idx]:
+                continue
+            delta = _signed(staged[idx]) + _signed(pd[idx])
+            if not -127 <= delta <= 127:
+                self._commit(staged, prev)
+                delta = _signed(pd[idx])
+            staged[idx] = 0xFF & delta
+            pd[idx] = 0x00
+            self.dirty = True
+
+    def _commit(self, staged, prev):
+        # Queue a staged report that mustn't be coalesced with the next one.
+        if len(self._queue) >= _REPORT_QUEUE_SIZE:
+            if debug.enabled:
+                debug('report queue full')
+            self.flush()
+            return
+
+        self._queue.append(bytearray(staged))
+        prev[:] = staged
+        if staged[0] == HIDReportTypes.MOUSE:
+            for idx in range(2, len(staged)):
+                staged[idx] = prev[idx] = 0x00
+
+    def poll_interval(self):
+        return self.poll_interval_ms
+
+    def due_ms(self):
+        '''
+        Return the time in ms until staged reports can be sent, or `None` if
+        there are none.
+        '''
+        if not self.dirty:
+            return None
+        interval = self.poll_interval()
+        if not interval or self._last_send is None:
+            return 0
+        elapsed = ticks_diff(ticks_ms(), self._last_send)
+        if 0 <= elapsed < interval:
+            return interval - elapsed
+        return 0
+
+    def poll(self):
+        '''
+        Send the next queued report, or else all staged reports that changed,
+        if the poll interval has passed. Return whether anything was sent.
+        '''
+        if self.due_ms() != 0:
+            return False
+
+        self._last_send = ticks_ms()
+
+        if self._queue:
+            self.hid_send(self._queue.popleft())
+            return True
+
+        self._send_staged()
+        return True
+
+    def flush(self):
+        '''Send all queued and staged reports now, regardless of the interval.'''
+        while self._queue:
+            self.hid_send(self._queue.popleft())
+        if self.dirty:
+            self._send_staged()
+        self._last_send = ticks_ms()
 
         return self
 
+    def _send_staged(self):
+        if self._staged_evt != self._prev_evt:
+            self._prev_evt[:] = self._staged_evt
+            self.hid_send(self._staged_evt)
+
+        if self._staged_cc != self._prev_cc:
+            self._prev_cc[:] = self._staged_cc
+            self.hid_send(self._staged_cc)
+
+        staged = self._staged_pd
+        prev = self._prev_pd
+        if staged != prev:
+            prev[:] = staged
+            self.hid_send(staged)
+            for idx in range(2, len(staged)):
+                staged[idx] = prev[idx] = 0x00
+
+        self.dirty = False
+
     def clear_all(self):
-        for idx, _ in enumerate(self.report_keys):
-            self.report_keys[idx] = 0x00
+        self.report_keys[:] = self._zeros[: len(self.report_keys)]
+        self._key_counts[:] = self._zeros
+        self._modifier_counts[:] = self._zeros[:8]
+        self._overflow_keys.clear()
 
         self.remove_cc()
         self.remove_pd()
@@ -168,32 +411,23 @@ class AbstractHID:
         return self
 
     def clear_non_modifiers(self):
-        for idx, _ in enumerate(self.report_non_mods):
-            self.report_non_mods[idx] = 0x00
+        self.report_non_mods[:] = self._zeros[: len(self.report_non_mods)]
+        self._key_counts[:] = self._zeros
+        self._overflow_keys.clear()
 
         return self
 
     def add_modifier(self, modifier):
-        if isinstance(modifier, ModifierKey):
-            if modifier.code == ModifierKey.FAKE_CODE:
-                for mod in modifier.has_modifiers:
-                    self.report_mods[0] |= mod
-            else:
-                self.report_mods[0] |= modifier.code
-        else:
-            self.report_mods[0] |= modifier
+        if not isinstance(modifier, int):
+            modifier = modifier.modifier_mask
+        self.report_mods[0] |= modifier
 
         return self
 
     def remove_modifier(self, modifier):
-        if isinstance(modifier, ModifierKey):
-            if modifier.code == ModifierKey.FAKE_CODE:
-                for mod in modifier.has_modifiers:
-                    self.report_mods[0] ^= mod
-            else:
-                self.report_mods[0] ^= modifier.code
-        else:
-            self.report_mods[0] ^= modifier
+        if not isinstance(modifier, int):
+            modifier = modifier.modifier_mask
+        self.report_mods[0] &= ~modifier
 
         return self
 
@@ -202,11 +436,14 @@ class AbstractHID:
             # Try to find the first empty slot in the key report, and fill it
             idx = self._evt.find(b'\x00', 3)
 
-            if idx < len(self._evt):
+            if 0 < idx < len(self._evt):
                 self._evt[idx] = key.code
             else:
-                # TODO what do we do here?......
-                pass
+                # All slots are taken: hold the key back until one is freed.
+                self.overflow += 1
+                self._overflow_keys.append(key.code)
+                if debug.enabled:
+                    debug('6KRO overflow: ', key.code)
         else:
             self.report_keys[(key.code >> 3) + 1] |= 1 << (key.code & 0x07)
 
@@ -214,7 +451,13 @@ class AbstractHID:
         if not self._nkro:
             code = key.code.to_bytes(1, 'little')
             idx = self._evt.find(code, 3)
-            self._evt[idx] = 0x00
+            if idx > 0:
+                if self._overflow_keys:
+                    self._evt[idx] = self._overflow_keys.pop(0)
+                else:
+                    self._evt[idx] = 0x00
+            elif key.code in self._overflow_keys:
+                self._overflow_keys.remove(key.code)
         else:
             self.report_keys[(key.code >> 3) + 1] &= ~(1 << (key.code & 0x07))
 
@@ -222,54 +465,66 @@ class AbstractHID:
         # Add (or write over) consumer control report. There can only be one CC
         # active at any time.
         memoryview(self._cc_report)[1:3] = cc.code.to_bytes(2, 'little')
-        self._cc_pending = True
 
     def remove_cc(self):
         # Remove consumer control report.
-        report = memoryview(self._cc_report)[1:3]
-        if report != b'\x00\x00':
-            report[:] = b'\x00\x00'
-            self._cc_pending = True
+        self._cc_report[1] = 0x00
+        self._cc_report[2] = 0x00
 
     def add_pd(self, key):
         self._pd_report[1] |= key.code
-        self._pd_pending = True
 
     def remove_pd(self):
-        if self._pd_report[1]:
-            self._pd_pending = True
-            self._pd_report[1] = 0x00
+        self._pd_report[1] = 0x00
 
     def move_axis(self, axis):
-        delta = clamp(axis.delta, -127, 127)
-        axis.delta -= delta
-        try:
-            self._pd_report[axis.code + 2] = 0xFF & delta
-            self._pd_pending = True
-        except IndexError:
+        idx = axis.code + 2
+        if idx >= len(self._pd_report):
+            axis.delta = 0
             if debug.enabled:
                 debug('Axis(', axis.code, ') not supported')
+            return
+
+        # Take whole counts only, no more than fit into the staged report on
+        # top of motion that hasn't been sent yet. The rest, including
+        # fractions, stays with the axis for the next report.
+        staged = _signed(self._staged_pd[idx])
+        delta = clamp(int(axis.delta), -127 - staged, 127 - staged)
+        axis.delta -= delta
+        self._pd_report[idx] = 0xFF & delta
 
     def clear_axis(self):
-        for idx in range(2, len(self._pd_report)):
-            self._pd_report[idx] = 0x00
+        self._pd_report[2:] = self._zeros[: len(self._pd_report) - 2]
 
     def has_key(self, key):
-        if isinstance(key, ModifierKey):
-            return bool(self.report_mods[0] & key.code)
-        else:
-            if not self._nkro:
-                code = key.code.to_bytes(1, 'little')
-                return self.report_non_mods.find(code) > 0
-            else:
-                part = self.report_keys[(key.code >> 3) + 1]
-                return bool(part & (1 << (key.code & 0x07)))
+        return self._has_keys[key.report_type](key)
+
+    def _has_keyboard_key(self, key):
+        if not self._nkro:
+            return _has_code(self._evt, key.code, 3)
+        part = self.report_keys[(key.code >> 3) + 1]
+        return bool(part & (1 << (key.code & 0x07)))
+
+    def _has_modifier(self, key):
+        return bool(self.report_mods[0] & key.modifier_mask)
+
+    def _has_consumer_key(self, key):
+        return self._cc_report[1] | self._cc_report[2] << 8 == key.code
+
+    def _has_mouse_key(self, key):
+        return bool(self._pd_report[1] & key.code)
+
+    def _has_internal_key(self, key):
         return False
 
 
 class USBHID(AbstractHID):
     REPORT_BYTES = 9
 
+    # Full speed USB hosts poll at most once per ms; some poll keyboards every
+    # 8 ms only.
+    poll_interval_ms = 1
+
     def __init__(self, **kwargs):
 
         self.devices = {}
@@ -304,6 +559,9 @@ class BLEHID(AbstractHID):
     # Hardcoded in CPy
     MAX_CONNECTIONS = const(2)
 
+    # `None` follows the connection interval negotiated with the host.
+    poll_interval_ms = None
+
     def __init__(self, ble_name=str(getmount('/').label), **kwargs):
 
         self.ble_name = ble_name
@@ -311,6 +569,13 @@ class BLEHID(AbstractHID):
         self.ble.name = self.ble_name
         self.hid = HIDService()
         self.hid.protocol_mode = 0  # Boot protocol
+
+        # Devices and report buffers by report type; refreshed when the
+        # connection state changes.
+        self._connected = False
+        self._devices = {}
+        self._reports = {}
+
         super().__init__(**kwargs)
 
         # Security-wise this is not right. While you're away someone turns
@@ -325,10 +590,21 @@ class BLEHID(AbstractHID):
     def devices(self):
         '''Search through the provided list of devices to find the ones with the
         send_report attribute.'''
-        if not self.ble.connected:
+        if not self._check_connection():
             return {}
+        return self._devices
 
-        result = {}
+    def _check_connection(self):
+        connected = self.ble.connected
+        if connected != self._connected:
+            self._connected = connected
+            if connected:
+                self._update_devices()
+        return connected
+
+    def _update_devices(self):
+        self._devices = {}
+        self._reports = {}
 
         for device in self.hid.devices:
             if not hasattr(device, 'send_report'):
@@ -337,37 +613,51 @@ class BLEHID(AbstractHID):
             up = device.usage_page
 
             if up == HIDUsagePage.CONSUMER and us == HIDUsage.CONSUMER:
-                result[HIDReportTypes.CONSUMER] = device
-                continue
-
-            if up == HIDUsagePage.KEYBOARD and us == HIDUsage.KEYBOARD:
-                result[HIDReportTypes.KEYBOARD] = device
-                continue
-
-            if up == HIDUsagePage.MOUSE and us == HIDUsage.MOUSE:
-                result[HIDReportTypes.MOUSE] = device
+                report_type = HIDReportTypes.CONSUMER
+            elif up == HIDUsagePage.KEYBOARD and us == HIDUsage.KEYBOARD:
+                report_type = HIDReportTypes.KEYBOARD
+            elif up == HIDUsagePage.MOUSE and us == HIDUsage.MOUSE:
+                report_type = HIDReportTypes.MOUSE
+            elif up == HIDUsagePage.SYSCONTROL and us == HIDUsage.SYSCONTROL:
+                report_type = HIDReportTypes.SYSCONTROL
+            else:
                 continue
 
-            if up == HIDUsagePage.SYSCONTROL and us == HIDUsage.SYSCONTROL:
-                result[HIDReportTypes.SYSCONTROL] = device
-                continue
+            self._devices[report_type] = device
+            self._reports[report_type] = bytearray(len(device._characteristic.value))
 
-        return result
+        if debug.enabled:
+            debug('devices=', self._devices)
 
     def hid_send(self, evt):
-        if not self.ble.connected:
+        if not self._check_connection():
             return
 
         # int, can be looked up in HIDReportTypes
         reporting_device_const = evt[0]
 
-        device = self.devices[reporting_device_const]
+        device = self._devices[reporting_device_const]
 
-        report_size = len(device._characteristic.value)
-        while len(evt) < report_size + 1:
-            evt.append(0)
+        # Copy into the preallocated report of the device's size, truncating
+        # or zero padding.
+        report = self._reports[reporting_device_const]
+        size = min(len(evt) - 1, len(report))
+        for idx in range(size):
+            report[idx] = evt[idx + 1]
+        for idx in range(size, len(report)):
+            report[idx] = 0x00
 
-        return device.send_report(evt[1 : report_size + 1])
+        return device.send_report(report)
+
+    def poll_interval(self):
+        if self.poll_interval_ms is not None:
+            return self.poll_interval_ms
+        # The host may renegotiate the interval at any time, so don't cache it.
+        # This is only queried while reports are staged.
+        try:
+            return int(self.ble.connections[0].connection_interval)
+        except (AttributeError, IndexError):
+            return 0
 
     def clear_bonds(self):
         import _bleio
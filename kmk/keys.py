@@ -21,6 +21,8 @@ class KeyType:
     MODIFIER = const(1)
     CONSUMER = const(2)
     MOUSE = const(3)
+    # Keys handled by KMK itself that never show up in a HID report.
+    INTERNAL = const(4)
 
 
 FIRST_KMK_INTERNAL_KEY = const(1000)
@@ -43,6 +45,10 @@ class Axis:
         return f'Axis(code={self.code}, delta={self.delta})'
 
     def move(self, keyboard: Keyboard, delta: int):
+        '''
+        Accumulate motion until the next report. Deltas can be fractional, e.g.
+        from scaled sensor readings: fractions are kept until they add up.
+        '''
         self.delta += delta
         if self.delta:
             keyboard.axes.add(self)
@@ -493,6 +499,11 @@ KC = KeyAttrDict()
 
 
 class Key:
+    # The report class of a key, used to dispatch report updates, and all
+    # modifier bits it adds to the keyboard report.
+    report_type = KeyType.SIMPLE
+    modifier_mask = 0
+
     def __init__(
         self,
         code: int,
@@ -517,6 +528,18 @@ class Key:
         self._handle_release = on_release
         self.meta = meta
 
+        if code >= FIRST_KMK_INTERNAL_KEY:
+            self.report_type = KeyType.INTERNAL
+
+        mask = 0
+        if has_modifiers:
+            for mod in has_modifiers:
+                mask |= mod
+        if self.report_type == KeyType.MODIFIER and code != ModifierKey.FAKE_CODE:
+            mask |= code
+        if mask:
+            self.modifier_mask = mask
+
     def __call__(
         self, no_press: Optional[bool] = None, no_release: Optional[bool] = None
     ) -> Key:
@@ -674,6 +697,7 @@ class Key:
 
 class ModifierKey(Key):
     FAKE_CODE = const(-1)
+    report_type = KeyType.MODIFIER
 
     def __call__(
         self,
@@ -714,11 +738,11 @@ class ModifierKey(Key):
 
 
 class ConsumerKey(Key):
-    pass
+    report_type = KeyType.CONSUMER
 
 
 class MouseKey(Key):
-    pass
+    report_type = KeyType.MOUSE
 
 
 def make_key(
@@ -3,21 +3,66 @@ try:
 except ImportError:
     pass
 
+from micropython import const
+from supervisor import ticks_ms
+
+from array import array
 from collections import namedtuple
 from keypad import Event as KeyEvent
+from time import sleep
 
 from kmk.consts import UnicodeMode
+from kmk.extensions import Extension
 from kmk.hid import BLEHID, USBHID, AbstractHID, HIDModes
 from kmk.keys import KC, Key
+from kmk.kmktime import ticks_add, ticks_diff
 from kmk.modules import Module
 from kmk.scanners.keypad import MatrixScanner
-from kmk.scheduler import Task, cancel_task, create_task, get_due_task
-from kmk.utils import Debug
+from kmk.scheduler import (
+    Task,
+    Timer,
+    cancel_task,
+    create_task,
+    get_due_ms,
+    get_due_task,
+)
+from kmk.utils import Debug, RingBuffer
 
 debug = Debug('kmk.keyboard')
 
+# Capacity of the key event queues. Matches the default `max_events` of the
+# keypad scanners.
+_QUEUE_SIZE = const(64)
+
+_HOOKS = (
+    'before_matrix_scan',
+    'after_matrix_scan',
+    'before_hid_send',
+    'after_hid_send',
+    'on_powersave_enable',
+    'on_powersave_disable',
+)
+
+# Main loop phases that can be timed, see `KMKKeyboard.enable_phase_timing`.
+_PHASES = (
+    '_main_loop',
+    'before_matrix_scan',
+    '_process_resume_buffer',
+    '_scan_matrix',
+    'after_matrix_scan',
+    '_handle_matrix_report',
+    'before_hid_send',
+    '_send_hid',
+    '_process_timeouts',
+    '_poll_hid',
+    'after_hid_send',
+    '_idle',
+)
+
+_UNRESOLVED = object()
+
 KeyBufferFrame = namedtuple(
-    'KeyBufferFrame', ('key', 'is_pressed', 'int_coord', 'index')
+    'KeyBufferFrame', ('key', 'is_pressed', 'int_coord', 'index', 'origin')
 )
 
 
@@ -28,6 +73,10 @@ def debug_error(module, message: str, error: Exception):
         )
 
 
+def _overrides(obj, base, hook: str) -> bool:
+    return getattr(obj.__class__, hook, None) is not getattr(base, hook)
+
+
 class Sandbox:
     matrix_update = None
     secondary_matrix_update = None
@@ -47,6 +96,14 @@ class KMKKeyboard:
 
     unicode_mode = UnicodeMode.NOOP
 
+    # Upper limit of key events that are scanned and processed per main loop
+    # cycle. The default of 1 disables batching.
+    max_events_per_cycle = 1
+
+    # Longest time in ms the main loop sleeps while idle, waiting for input or
+    # the next scheduled task. The default of 0 disables idle sleep.
+    max_idle_ms = 0
+
     modules = []
     extensions = []
     sandbox = Sandbox()
@@ -56,20 +113,39 @@ class KMKKeyboard:
     keys_pressed = set()
     axes = set()
     _coordkeys_pressed = {}
+    _coord_index = None
+    _coord_index_none = None
+    _effective_keymap = None
+    _effective_keymaps = {}
+    _effective_keymaps_max = 4
+    _effective_layers = None
     hid_type = HIDModes.USB
     secondary_hid_type = None
     _hid_helper = None
     _hid_send_enabled = False
+    _report_valid = False
+    _keys_reported = None
     hid_pending = False
     matrix_update = None
     secondary_matrix_update = None
-    matrix_update_queue = []
+    matrix_update_queue = None
     _trigger_powersave_enable = False
     _trigger_powersave_disable = False
     _go_args = None
     _processing_timeouts = False
-    _resume_buffer = []
-    _resume_buffer_x = []
+    _tap_timer = None
+    _resume_buffer = None
+    _resume_buffer_x = None
+    _resuming = False
+    _hooks = {}
+    _input_modules = []
+    _wake_sources = []
+    phase_timing = None
+    _phase_timing_dump = None
+    profiler = None
+    _profiler_dump = None
+    tracer = None
+    _tracer_dump = None
 
     # this should almost always be PREpended to, replaces
     # former use of reversed_active_layers which had pointless
@@ -90,17 +166,64 @@ class KMKKeyboard:
                 debug('keys_pressed=', self.keys_pressed)
             if self.axes:
                 debug('axes=', self.axes)
+            self._check_report()
+
+        # Keys are applied to the report incrementally by `report_key`; rebuild
+        # it only if it's been invalidated, which is up to whoever modifies or
+        # replaces `keys_pressed` directly.
+        if not self._report_valid:
+            self._hid_helper.create_report(self.keys_pressed, self.axes)
+            self._report_valid = True
+        else:
+            self._hid_helper.report_axes(self.axes)
 
-        self._hid_helper.create_report(self.keys_pressed, self.axes)
         try:
             self._hid_helper.send()
         except Exception as err:
             debug_error(self._hid_helper, 'send', err)
 
+        if self.tracer and not self._hid_helper.dirty:
+            self.tracer.sent()
+
         self.hid_pending = False
 
-        for axis in self.axes:
-            axis.move(self, 0)
+        # Motion that didn't fit into the report is sent with the next one;
+        # fractions of a count are kept by the axes until the next move.
+        if self.axes:
+            for axis in self.axes:
+                if axis.delta >= 1 or axis.delta <= -1:
+                    self.hid_pending = True
+                    break
+            else:
+                self.axes.clear()
+
+    def _check_report(self) -> None:
+        # Catch `keys_pressed` being modified directly without a call to
+        # `invalidate_report`, and rebuild the report. Only in debug mode:
+        # this keeps a copy of the reported keys.
+        reported = self._keys_reported
+        if (
+            self._report_valid
+            and reported is not None
+            and reported != self.keys_pressed
+        ):
+            debug(
+                'keys_pressed modified without invalidate_report(): ',
+                reported ^ self.keys_pressed,
+            )
+            self._report_valid = False
+        if not self._report_valid or reported is None:
+            self._keys_reported = set(self.keys_pressed)
+
+    def _poll_hid(self) -> None:
+        # Send reports that were held back by the HID poll interval.
+        try:
+            self._hid_helper.poll()
+        except Exception as err:
+            debug_error(self._hid_helper, 'poll', err)
+
+        if self.tracer and not self._hid_helper.dirty:
+            self.tracer.sent()
 
     def _handle_matrix_report(self, kevent: KeyEvent) -> None:
         if kevent is not None:
@@ -108,12 +231,25 @@ class KMKKeyboard:
 
     def _find_key_in_map(self, int_coord: int) -> Key:
         try:
-            idx = self.coord_mapping.index(int_coord)
-        except ValueError:
+            idx = self._coord_index[int_coord]
+        except IndexError:
+            idx = self._coord_index_none
+
+        if idx == self._coord_index_none:
             if debug.enabled:
                 debug('no such int_coord: ', int_coord)
             return None
 
+        if self.active_layers != self._effective_layers:
+            self._update_effective_keymap()
+
+        key = self._effective_keymap[idx]
+        if key is _UNRESOLVED:
+            key = self._effective_keymap[idx] = self._resolve_key(idx)
+
+        return key
+
+    def _resolve_key(self, idx: int) -> Key:
         key = None
         for layer in self.active_layers:
             try:
@@ -127,10 +263,49 @@ class KMKKeyboard:
 
         return key
 
+    def _update_effective_keymap(self) -> None:
+        '''
+        Select the effective keymap for the current layer stack.
+
+        Effective keymaps are cached per layer stack and filled in lazily, one
+        key at a time, as keys are looked up. Toggling between a small number
+        of layer stacks, as MO/LT/TG do, will reuse already resolved keys.
+        '''
+        layers = tuple(self.active_layers)
+        try:
+            self._effective_keymap = self._effective_keymaps[layers]
+        except KeyError:
+            if len(self._effective_keymaps) >= self._effective_keymaps_max:
+                self._effective_keymaps.clear()
+            self._effective_keymap = [_UNRESOLVED] * len(self.coord_mapping)
+            self._effective_keymaps[layers] = self._effective_keymap
+        self._effective_layers = self.active_layers.copy()
+
+    def invalidate_keymap(self) -> None:
+        '''
+        Drop all resolved keys. Must be called after `keymap` is modified at
+        runtime. Changes to `active_layers` are picked up automatically.
+        '''
+        self._effective_keymaps = {}
+        self._effective_keymap = None
+        self._effective_layers = None
+
+    def invalidate_report(self) -> None:
+        '''
+        Rebuild the HID report from `keys_pressed` on the next send. Must be
+        called if `keys_pressed` is modified or replaced other than through
+        `report_key`, `add_key` or `remove_key`; in debug mode, missing calls
+        are reported.
+        '''
+        self._report_valid = False
+
     def _on_matrix_changed(self, kevent: KeyEvent) -> None:
         int_coord = kevent.key_number
         is_pressed = kevent.pressed
 
+        if self.tracer:
+            self.tracer.begin(kevent, int_coord)
+
         key = None
         if not is_pressed:
             try:
@@ -150,6 +325,9 @@ class KMKKeyboard:
 
         self.pre_process_key(key, is_pressed, int_coord)
 
+        if self.tracer:
+            self.tracer.current = None
+
     def _process_resume_buffer(self):
         '''
         Resume the processing of buffered, delayed, deferred, etc. key events
@@ -160,20 +338,32 @@ class KMKKeyboard:
         during processing new events are pushed to the `_resume_buffer`, they
         are prepended to the working buffer (which may not be emptied), in
         order to preserve key event order.
-        We also double-buffer `_resume_buffer` with `_resume_buffer_x`, only
-        copying the reference to hopefully safe some time on allocations.
+        We also double-buffer `_resume_buffer` with `_resume_buffer_x`; both
+        are preallocated ring buffers, so none of this allocates unless the
+        working buffer overflows.
         '''
 
         buffer, self._resume_buffer = self._resume_buffer, self._resume_buffer_x
+        self._resuming = True
+        self._resume(buffer)
+        self._resuming = False
+        self._resume_buffer_x = buffer
+
+        if self.tracer:
+            self.tracer.current = None
 
+    def _resume(self, buffer):
         while buffer:
-            ksf = buffer.pop(0)
+            ksf = buffer.popleft()
             key = ksf.key
 
             # Handle any unaccounted-for layer shifts by looking up the key resolution again.
             if ksf.int_coord is not None:
                 key = self._find_key_in_map(ksf.int_coord)
 
+            if self.tracer:
+                self.tracer.current = ksf.origin
+
             # Resume the processing of the key event and update the HID report
             # when applicable.
             self.pre_process_key(key, ksf.is_pressed, ksf.int_coord, ksf.index)
@@ -183,13 +373,17 @@ class KMKKeyboard:
                 self.hid_pending = False
 
             # Any newly buffered key events must be prepended to the working
-            # buffer.
-            if self._resume_buffer:
-                self._resume_buffer.extend(buffer)
-                buffer.clear()
-                buffer, self._resume_buffer = self._resume_buffer, buffer
-
-        self._resume_buffer_x = buffer
+            # buffer. If it can't hold them, they're resumed right away, which
+            # puts them first as well, with a buffer of their own for the
+            # events they cause in turn.
+            if len(buffer) + len(self._resume_buffer) > _QUEUE_SIZE:
+                pending = self._resume_buffer
+                self._resume_buffer = RingBuffer(_QUEUE_SIZE)
+                self._resume(pending)
+                self._resume_buffer = pending
+
+            while self._resume_buffer:
+                buffer.appendleft(self._resume_buffer.pop())
 
     @property
     def debug_enabled(self) -> bool:
@@ -237,6 +431,9 @@ class KMKKeyboard:
         else:
             key.on_release(self, int_coord)
 
+        if self.tracer:
+            self.tracer.processed(self.hid_pending)
+
     def resume_process_key(
         self,
         module: Module,
@@ -246,28 +443,80 @@ class KMKKeyboard:
         reprocess: Optional[bool] = False,
     ) -> None:
         index = self.modules.index(module) + (0 if reprocess else 1)
+        origin = self.tracer.resume(module, int_coord) if self.tracer else None
         ksf = KeyBufferFrame(
-            key=key, is_pressed=is_pressed, int_coord=int_coord, index=index
+            key=key,
+            is_pressed=is_pressed,
+            int_coord=int_coord,
+            index=index,
+            origin=origin,
         )
-        self._resume_buffer.append(ksf)
+        if self._resume_buffer.append(ksf):
+            return
+
+        # The resume buffer is full: resume the buffered events first, unless
+        # that's what's happening already and the event has to be dropped.
+        if not self._resuming:
+            self._process_resume_buffer()
+            if self._resume_buffer.append(ksf):
+                return
+        debug_error(module, 'resume_process_key', OverflowError(ksf))
+
+    def report_key(self, key: Key, is_pressed: bool) -> None:
+        '''
+        Add `key` to, or remove it from, `keys_pressed` and update the HID
+        report in place.
+        '''
+        if is_pressed:
+            if key in self.keys_pressed:
+                return
+            self.keys_pressed.add(key)
+        else:
+            if key not in self.keys_pressed:
+                return
+            self.keys_pressed.discard(key)
+
+        if self._report_valid:
+            self._hid_helper.report_key(key, is_pressed)
+            if self._keys_reported is not None:
+                if is_pressed:
+                    self._keys_reported.add(key)
+                else:
+                    self._keys_reported.discard(key)
 
     def remove_key(self, keycode: Key) -> None:
-        self.keys_pressed.discard(keycode)
+        self.report_key(keycode, False)
         self.process_key(keycode, False)
 
     def add_key(self, keycode: Key) -> None:
-        self.keys_pressed.add(keycode)
+        self.report_key(keycode, True)
         self.process_key(keycode, True)
 
     def tap_key(self, keycode: Key) -> None:
         self.add_key(keycode)
         # On the next cycle, we'll remove the key.
-        self.set_timeout(0, lambda: self.remove_key(keycode))
-
-    def set_timeout(self, after_ticks: int, callback: Callable[[None], None]) -> [Task]:
+        if self._tap_timer is None:
+            self._tapped_keys = []
+            self._tap_timer = Timer(self._release_tapped_keys)
+        self._tapped_keys.append(keycode)
+        if not self._tap_timer.armed:
+            self._tap_timer.rearm(0)
+
+    def _release_tapped_keys(self) -> None:
+        tapped_keys = self._tapped_keys
+        while tapped_keys:
+            self.remove_key(tapped_keys.pop(0))
+
+    def set_timeout(
+        self, after_ticks: int, callback: [Callable[[None], None], Timer]
+    ) -> [Task, Timer]:
+        '''
+        Call `callback` after `after_ticks` ms. `callback` may be a `Timer`,
+        which is re-armed instead of allocating a new task.
+        '''
         return create_task(callback, after_ms=after_ticks)
 
-    def cancel_timeout(self, timeout_key: int) -> None:
+    def cancel_timeout(self, timeout_key: [Task, Timer]) -> None:
         cancel_task(timeout_key)
 
     def _process_timeouts(self) -> None:
@@ -291,22 +540,37 @@ class KMKKeyboard:
 
     def _init_coord_mapping(self) -> None:
         '''
-        Attempt to sanely guess a coord_mapping if one is not provided. No-op
-        if `kmk.extensions.split.Split` is used, it provides equivalent
-        functionality in `on_bootup`
+        Attempt to sanely guess a coord_mapping if one is not provided, and
+        build the reverse lookup table from int_coord to keymap index.
 
-        To save RAM on boards that don't use Split, we don't import Split
-        and do an isinstance check, but instead do string detection
-        '''
-        if any(x.__class__.__module__ == 'kmk.modules.split' for x in self.modules):
-            return
+        This runs after `during_bootup`, so that `kmk.modules.split.Split` can
+        provide its own guess first.
 
+        The lookup table is a bytearray for up to 255 keys and an array of
+        unsigned shorts otherwise. Unmapped int_coords hold the largest value
+        the table can store.
+        '''
         if not self.coord_mapping:
             cm = []
             for m in self.matrix:
                 cm.extend(m.coord_mapping)
             self.coord_mapping = tuple(cm)
 
+        size = max(self.coord_mapping) + 1
+        if len(self.coord_mapping) < 0xFF:
+            self._coord_index_none = 0xFF
+            self._coord_index = bytearray(b'\xFF') * size
+        else:
+            self._coord_index_none = 0xFFFF
+            self._coord_index = array('H', (0xFFFF for _ in range(size)))
+
+        # Iterate backwards, such that the first occurence of an int_coord
+        # wins, like `coord_mapping.index()` used to do.
+        for idx in range(len(self.coord_mapping) - 1, -1, -1):
+            self._coord_index[self.coord_mapping[idx]] = idx
+
+        self.invalidate_keymap()
+
     def _init_hid(self) -> None:
         if self.hid_type == HIDModes.NOOP:
             self._hid_helper = AbstractHID
@@ -324,7 +588,7 @@ class KMKKeyboard:
 
     def _deinit_hid(self) -> None:
         self._hid_helper.clear_all()
-        self._hid_helper.send()
+        self._hid_helper.send().flush()
 
     def _init_matrix(self) -> None:
         if self.matrix is None:
@@ -370,84 +634,146 @@ class KMKKeyboard:
                 debug_error(ext, 'during_bootup', err)
                 self.extensions[idx] = None
 
-        self.modules[:] = [_ for _ in self.modules if _]
+        self.extensions = [_ for _ in self.extensions if _]
 
         if debug.enabled:
             debug('extensions=', [_.__class__.__name__ for _ in self.extensions])
 
-    def before_matrix_scan(self) -> None:
+        self._init_hooks()
+
+    def _init_hooks(self) -> None:
+        '''
+        Build per-hook lists of modules and extensions that actually override
+        the respective main loop hook, so that inherited no-ops cost nothing.
+        Has to be called again if modules or extensions are added after boot.
+        '''
+        self._hooks = {}
+        for hook in _HOOKS:
+            self._hooks[hook] = (
+                [_ for _ in self.modules if _overrides(_, Module, hook)],
+                [_ for _ in self.extensions if _overrides(_, Extension, hook)],
+            )
+
+        self._input_modules = [
+            _ for _ in self.modules if _overrides(_, Module, 'has_pending_input')
+        ]
+        self._wake_sources = [
+            _
+            for _ in (*self.matrix, *self.modules, *self.extensions)
+            if getattr(_.__class__, 'wake_interval', None) is not None
+        ]
+
+        if debug.enabled:
+            for hook, (modules, extensions) in self._hooks.items():
+                debug(
+                    hook,
+                    '=',
+                    [_.__class__.__name__ for _ in modules],
+                    [_.__class__.__name__ for _ in extensions],
+                )
+            debug('wake_sources=', [_.__class__.__name__ for _ in self._wake_sources])
+
+        if self.profiler is not None:
+            self._init_profiler()
+
+    def _init_profiler(self) -> None:
+        self.profiler.unwrap()
+
         for module in self.modules:
+            if _overrides(module, Module, 'process_key'):
+                self.profiler.wrap(module, 'process_key')
+
+        for hook, (modules, extensions) in self._hooks.items():
+            for _ in modules:
+                self.profiler.wrap(_, hook)
+            for _ in extensions:
+                self.profiler.wrap(_, hook)
+
+    def before_matrix_scan(self) -> None:
+        modules, extensions = self._hooks['before_matrix_scan']
+
+        for module in modules:
             try:
                 module.before_matrix_scan(self)
             except Exception as err:
                 debug_error(module, 'before_matrix_scan', err)
 
-        for ext in self.extensions:
+        for ext in extensions:
             try:
                 ext.before_matrix_scan(self.sandbox)
             except Exception as err:
                 debug_error(ext, 'before_matrix_scan', err)
 
     def after_matrix_scan(self) -> None:
-        for module in self.modules:
+        modules, extensions = self._hooks['after_matrix_scan']
+
+        for module in modules:
             try:
                 module.after_matrix_scan(self)
             except Exception as err:
                 debug_error(module, 'after_matrix_scan', err)
 
-        for ext in self.extensions:
+        for ext in extensions:
             try:
                 ext.after_matrix_scan(self.sandbox)
             except Exception as err:
                 debug_error(ext, 'after_matrix_scan', err)
 
     def before_hid_send(self) -> None:
-        for module in self.modules:
+        modules, extensions = self._hooks['before_hid_send']
+
+        for module in modules:
             try:
                 module.before_hid_send(self)
             except Exception as err:
                 debug_error(module, 'before_hid_send', err)
 
-        for ext in self.extensions:
+        for ext in extensions:
             try:
                 ext.before_hid_send(self.sandbox)
             except Exception as err:
                 debug_error(ext, 'before_hid_send', err)
 
     def after_hid_send(self) -> None:
-        for module in self.modules:
+        modules, extensions = self._hooks['after_hid_send']
+
+        for module in modules:
             try:
                 module.after_hid_send(self)
             except Exception as err:
                 debug_error(module, 'after_hid_send', err)
 
-        for ext in self.extensions:
+        for ext in extensions:
             try:
                 ext.after_hid_send(self.sandbox)
             except Exception as err:
                 debug_error(ext, 'after_hid_send', err)
 
     def powersave_enable(self) -> None:
-        for module in self.modules:
+        modules, extensions = self._hooks['on_powersave_enable']
+
+        for module in modules:
             try:
                 module.on_powersave_enable(self)
             except Exception as err:
                 debug_error(module, 'powersave_enable', err)
 
-        for ext in self.extensions:
+        for ext in extensions:
             try:
                 ext.on_powersave_enable(self.sandbox)
             except Exception as err:
                 debug_error(ext, 'powersave_enable', err)
 
     def powersave_disable(self) -> None:
-        for module in self.modules:
+        modules, extensions = self._hooks['on_powersave_disable']
+
+        for module in modules:
             try:
                 module.on_powersave_disable(self)
             except Exception as err:
                 debug_error(module, 'powersave_disable', err)
 
-        for ext in self.extensions:
+        for ext in extensions:
             try:
                 ext.on_powersave_disable(self.sandbox)
             except Exception as err:
@@ -466,6 +792,137 @@ class KMKKeyboard:
             except Exception as err:
                 debug_error(ext, 'deinit', err)
 
+    def enable_phase_timing(
+        self, enabled: bool = True, dump_period_ms: int = 0
+    ) -> None:
+        '''
+        Record the duration of each main loop phase in us into a
+        `kmk.profiler.Histogram`, accessible by phase name in `phase_timing`.
+        Phases nest: `main_loop` covers the complete cycle, `scan_matrix`
+        includes `after_matrix_scan`, and so on.
+        With `dump_period_ms`, the histograms are periodically written to the
+        debug output.
+
+        Phases are timed by wrapping the respective methods on the instance;
+        disabled, not even a check remains in the main loop.
+        '''
+        for phase in _PHASES:
+            try:
+                delattr(self, phase)
+            except AttributeError:
+                pass
+
+        if self._phase_timing_dump is not None:
+            cancel_task(self._phase_timing_dump)
+            self._phase_timing_dump = None
+
+        if not enabled:
+            self.phase_timing = None
+            return
+
+        from kmk.profiler import Histogram, timed
+
+        self.phase_timing = {}
+        for phase in _PHASES:
+            histogram = self.phase_timing[phase.lstrip('_')] = Histogram()
+            setattr(self, phase, timed(getattr(self, phase), histogram))
+
+        if dump_period_ms:
+            self._phase_timing_dump = create_task(
+                self.dump_phase_timing,
+                after_ms=dump_period_ms,
+                period_ms=dump_period_ms,
+            )
+
+    def dump_phase_timing(self) -> None:
+        if not (self.phase_timing and debug.enabled):
+            return
+        for phase, histogram in self.phase_timing.items():
+            if histogram.count:
+                debug(phase, ': ', histogram)
+
+    def enable_profiler(self, enabled: bool = True, dump_period_ms: int = 0) -> None:
+        '''
+        Count calls and elapsed time in us of `process_key` and the main loop
+        hooks per module and extension in a `kmk.profiler.Profiler`, available
+        as `profiler`.
+        With `dump_period_ms`, a report is periodically written to the debug
+        output.
+
+        Hooks are profiled by wrapping the bound methods of the modules and
+        extensions at the same points where errors are caught and reported
+        with `debug_error`. Disabled, nothing is wrapped.
+        '''
+        if self.profiler is not None:
+            self.profiler.unwrap()
+            self.profiler = None
+
+        if self._profiler_dump is not None:
+            cancel_task(self._profiler_dump)
+            self._profiler_dump = None
+
+        if not enabled:
+            return
+
+        from kmk.profiler import Profiler
+
+        self.profiler = Profiler()
+        # Before boot, hooks are wrapped once modules and extensions are
+        # initialized.
+        if self._hooks:
+            self._init_profiler()
+
+        if dump_period_ms:
+            self._profiler_dump = create_task(
+                self.dump_profiler,
+                after_ms=dump_period_ms,
+                period_ms=dump_period_ms,
+            )
+
+    def dump_profiler(self) -> None:
+        if not (self.profiler and debug.enabled):
+            return
+        for line in self.profiler.report().split('\n'):
+            if line:
+                debug(line)
+
+    def enable_latency_tracer(
+        self, enabled: bool = True, dump_period_ms: int = 0
+    ) -> None:
+        '''
+        Trace the latency from key events entering the keyboard to the HID
+        reports reflecting them, in a `kmk.profiler.LatencyTracer` available
+        as `tracer`. Latencies are recorded per module path, i.e. the modules
+        that buffered an event on its way.
+        With `dump_period_ms`, the histograms are periodically written to the
+        debug output.
+        '''
+        self.tracer = None
+
+        if self._tracer_dump is not None:
+            cancel_task(self._tracer_dump)
+            self._tracer_dump = None
+
+        if not enabled:
+            return
+
+        from kmk.profiler import LatencyTracer
+
+        self.tracer = LatencyTracer()
+
+        if dump_period_ms:
+            self._tracer_dump = create_task(
+                self.dump_latency_tracer,
+                after_ms=dump_period_ms,
+                period_ms=dump_period_ms,
+            )
+
+    def dump_latency_tracer(self) -> None:
+        if not (self.tracer and debug.enabled):
+            return
+        for path, histogram in self.tracer.latency.items():
+            debug('latency ', path, ': ', histogram)
+
     def go(self, hid_type=HIDModes.USB, secondary_hid_type=None, **kwargs) -> None:
         self._init(hid_type=hid_type, secondary_hid_type=secondary_hid_type, **kwargs)
         try:
@@ -489,14 +946,18 @@ class KMKKeyboard:
         self.hid_type = hid_type
         self.secondary_hid_type = secondary_hid_type
 
+        self.matrix_update_queue = RingBuffer(_QUEUE_SIZE)
+        self._resume_buffer = RingBuffer(_QUEUE_SIZE)
+        self._resume_buffer_x = RingBuffer(_QUEUE_SIZE)
+
         if debug.enabled:
             debug('Initialising ', self)
             debug('unicode_mode=', self.unicode_mode)
 
         self._init_hid()
         self._init_matrix()
-        self._init_coord_mapping()
         self.during_bootup()
+        self._init_coord_mapping()
 
         if debug.enabled:
             import gc
@@ -504,34 +965,69 @@ class KMKKeyboard:
             gc.collect()
             debug('mem_info used:', gc.mem_alloc(), ' free:', gc.mem_free())
 
-    def _main_loop(self) -> None:
-        self.sandbox.active_layers = self.active_layers.copy()
+    def _scan_matrix(self) -> None:
+        '''
+        Poll scanners for key events and queue them for processing.
 
-        self.before_matrix_scan()
+        Without batching, there's a single scan per cycle and the first scanner
+        with an event wins. With batching, scanning repeats until no scanner
+        (or split transport) reports new events, or `max_events_per_cycle`
+        events are queued. Modules see every event in `after_matrix_scan`
+        either way.
+        '''
+        while True:
+            for matrix in self.matrix:
+                update = matrix.scan_for_changes()
+                if update:
+                    self.matrix_update = update
+                    break
+            self.sandbox.matrix_update = self.matrix_update
+            self.sandbox.secondary_matrix_update = self.secondary_matrix_update
 
-        self._process_resume_buffer()
+            self.after_matrix_scan()
 
-        for matrix in self.matrix:
-            update = matrix.scan_for_changes()
-            if update:
-                self.matrix_update = update
+            if not (self.secondary_matrix_update or self.matrix_update):
                 break
-        self.sandbox.matrix_update = self.matrix_update
-        self.sandbox.secondary_matrix_update = self.secondary_matrix_update
 
-        self.after_matrix_scan()
+            if self.secondary_matrix_update:
+                self.matrix_update_queue.append(self.secondary_matrix_update)
+                self.secondary_matrix_update = None
 
-        if self.secondary_matrix_update:
-            self.matrix_update_queue.append(self.secondary_matrix_update)
-            self.secondary_matrix_update = None
+            if self.matrix_update:
+                self.matrix_update_queue.append(self.matrix_update)
+                self.matrix_update = None
 
-        if self.matrix_update:
-            self.matrix_update_queue.append(self.matrix_update)
-            self.matrix_update = None
+            if len(self.matrix_update_queue) >= self.max_events_per_cycle:
+                break
+
+    def _main_loop(self) -> None:
+        self.sandbox.active_layers = self.active_layers.copy()
+
+        self.before_matrix_scan()
 
-        # only handle one key per cycle.
+        self._process_resume_buffer()
+
+        self._scan_matrix()
+
+        # Handle queued key events; only one per cycle unless batching is
+        # enabled.
         if self.matrix_update_queue:
-            self._handle_matrix_report(self.matrix_update_queue.pop(0))
+            self._handle_matrix_report(self.matrix_update_queue.popleft())
+
+        for _ in range(1, self.max_events_per_cycle):
+            if not self.matrix_update_queue:
+                break
+            # Resolve and report the previous event like a full cycle would,
+            # including the HID send hooks, which may e.g. hold back reports.
+            self.before_hid_send()
+            if self.hid_pending:
+                self._send_hid()
+            self._process_timeouts()
+            if self.hid_pending:
+                self._send_hid()
+            self.after_hid_send()
+            self._process_resume_buffer()
+            self._handle_matrix_report(self.matrix_update_queue.popleft())
 
         self.before_hid_send()
 
@@ -542,6 +1038,8 @@ class KMKKeyboard:
 
         if self.hid_pending:
             self._send_hid()
+        elif self._hid_helper.dirty:
+            self._poll_hid()
 
         self.after_hid_send()
 
@@ -550,3 +1048,53 @@ class KMKKeyboard:
 
         if self._trigger_powersave_disable:
             self.powersave_disable()
+
+        if self.max_idle_ms:
+            self._idle()
+
+    def _has_pending_input(self) -> bool:
+        for matrix in self.matrix:
+            if matrix.has_pending_events():
+                return True
+
+        for module in self._input_modules:
+            try:
+                if module.has_pending_input(self):
+                    return True
+            except Exception as err:
+                debug_error(module, 'has_pending_input', err)
+
+        return False
+
+    def _idle(self) -> None:
+        '''
+        Sleep until the next scheduled task or held back HID report is due,
+        input is pending, or the shortest `wake_interval` of scanners, modules
+        and extensions has passed, but at most `max_idle_ms`.
+        Input is checked every ms, which is the resolution of the scheduler: no
+        event is delayed by more than one tick.
+        '''
+        if self.hid_pending or self.matrix_update_queue or self._resume_buffer:
+            return
+
+        timeout = self.max_idle_ms
+
+        due = get_due_ms()
+        if due is not None and due < timeout:
+            timeout = due
+
+        due = self._hid_helper.due_ms()
+        if due is not None and due < timeout:
+            timeout = due
+
+        for source in self._wake_sources:
+            interval = source.wake_interval
+            if interval is not None and interval < timeout:
+                timeout = interval
+
+        if timeout <= 0:
+            return
+
+        until = ticks_add(ticks_ms(), timeout)
+        while not self._has_pending_input() and ticks_diff(until, ticks_ms()) > 0:
+            sleep(0.001)
@@ -10,7 +10,12 @@ class Module:
     consistant manner.
     '''
 
-    # The below methods should be implemented by subclasses
+    # Modules that poll in their main loop hooks set this to the longest time
+    # in ms the keyboard may idle between two main loop cycles.
+    wake_interval = None
+
+    # The below methods should be implemented by subclasses. Main loop hooks
+    # that aren't overridden are skipped by the keyboard.
 
     def during_bootup(self, keyboard):
         raise NotImplementedError
@@ -19,28 +24,35 @@ class Module:
         '''
         Return value will be injected as an extra matrix update
         '''
-        raise NotImplementedError
+        return
 
     def after_matrix_scan(self, keyboard):
         '''
         Return value will be replace matrix update if supplied
         '''
-        raise NotImplementedError
+        return
 
     def process_key(self, keyboard, key, is_pressed, int_coord):
         return key
 
     def before_hid_send(self, keyboard):
-        raise NotImplementedError
+        return
 
     def after_hid_send(self, keyboard):
-        raise NotImplementedError
+        return
+
+    def has_pending_input(self, keyboard):
+        '''
+        Return True to wake the keyboard from idle, e.g. when data was received
+        that is processed in a main loop hook.
+        '''
+        return False
 
     def on_powersave_enable(self, keyboard):
-        raise NotImplementedError
+        return
 
     def on_powersave_disable(self, keyboard):
-        raise NotImplementedError
+        return
 
     def deinit(self, keyboard):
         pass
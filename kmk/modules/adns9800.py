@@ -68,6 +68,8 @@ class ADNS9800(Module):
     cpha = 1
     DIR_WRITE = 0x80
     DIR_READ = 0x7F
+    # The motion registers are polled.
+    wake_interval = 1
 
     def __init__(self, cs, sclk, miso, mosi, invert_x=False, invert_y=False):
         self.cs = digitalio.DigitalInOut(cs)
@@ -210,18 +212,3 @@ class ADNS9800(Module):
 
             if keyboard.debug_enabled:
                 print('Delta: ', delta_x, ' ', delta_y)
-
-    def after_matrix_scan(self, keyboard):
-        return
-
-    def before_hid_send(self, keyboard):
-        return
-
-    def after_hid_send(self, keyboard):
-        return
-
-    def on_powersave_enable(self, keyboard):
-        return
-
-    def on_powersave_disable(self, keyboard):
-        return
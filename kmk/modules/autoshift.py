@@ -17,12 +17,6 @@ class Autoshift(Module):
     def during_bootup(self, keyboard):
         self._task = create_task(lambda: self._shift(keyboard), after_ms=-1)
 
-    def before_matrix_scan(self, keyboard):
-        pass
-
-    def after_matrix_scan(self, keyboard):
-        pass
-
     def process_key(self, keyboard, key, is_pressed, int_coord):
         # Unshift on any key event
         if self._active:
@@ -56,23 +50,11 @@ class Autoshift(Module):
                 keyboard.resume_process_key(self, key, True)
             self._key = None
 
-    def before_hid_send(self, keyboard):
-        pass
-
-    def after_hid_send(self, keyboard):
-        pass
-
-    def on_powersave_enable(self, keyboard):
-        pass
-
-    def on_powersave_disable(self, keyboard):
-        pass
-
     def _shift(self, keyboard):
         if debug.enabled:
             debug('activate')
         self._active = True
-        keyboard.keys_pressed.add(KC.LSFT)
+        keyboard.report_key(KC.LSFT, True)
         keyboard.resume_process_key(self, self._key, True)
 
     def _unshift(self, keyboard):
@@ -80,4 +62,4 @@ class Autoshift(Module):
             debug('deactivate')
         self._active = False
         self._key = None
-        keyboard.keys_pressed.remove(KC.LSFT)
+        keyboard.report_key(KC.LSFT, False)
@@ -27,9 +27,6 @@ class CapsWord(Module):
     def during_bootup(self, keyboard):
         return
 
-    def before_matrix_scan(self, keyboard):
-        return
-
     def process_key(self, keyboard, key, is_pressed, int_coord):
         if self._cw_active and key != KC.CW:
             continue_cw = False
@@ -55,21 +52,6 @@ class CapsWord(Module):
 
         return key
 
-    def before_hid_send(self, keyboard):
-        return
-
-    def after_hid_send(self, keyboard):
-        return
-
-    def on_powersave_enable(self, keyboard):
-        return
-
-    def on_powersave_disable(self, keyboard):
-        return
-
-    def after_matrix_scan(self, keyboard):
-        return
-
     def process_timeout(self):
         self._cw_active = False
         self._timeout_key = False
@@ -3,15 +3,20 @@ try:
 except ImportError:
     pass
 from micropython import const
+from supervisor import ticks_ms
 
 import kmk.handlers.stock as handlers
 from kmk.keys import Key, make_key
-from kmk.kmk_keyboard import KMKKeyboard
+from kmk.kmk_keyboard import KMKKeyboard, debug_error
+from kmk.kmktime import ticks_add, ticks_diff
 from kmk.modules import Module
-from kmk.utils import Debug
+from kmk.scheduler import Timer
+from kmk.utils import Debug, RingBuffer
 
 debug = Debug(__name__)
 
+_KEY_BUFFER_SIZE = const(32)
+
 
 class _ComboState:
     RESET = const(0)
@@ -20,14 +25,73 @@ class _ComboState:
     IDLE = const(3)
 
 
+class _IdleGroup:
+    '''
+    Idle periods of combos with the same timeout.
+
+    Every time matching starts over, all combos that are reset but don't
+    contain the key that was pressed stop matching, and stay idle until their
+    timeout expires. Instead of arming a timer per combo, every such refill
+    starts one idle period per group, and combos work out lazily whether
+    they're still idle: a combo that became reset after refill `since` took
+    part in the idle period of refill `since + 1`, was reset again when that
+    expired, and so on.
+    '''
+
+    def __init__(self, timeout: int) -> None:
+        self.timeout = timeout
+        self.timer = None
+        # Refill that started the first period that's kept track of.
+        self._first = 1
+        # Per period: the refill count when it expired, `None` if pending.
+        self._expired = []
+        # Per period: when it started.
+        self._started = []
+        self._head = 0
+
+    def start(self) -> None:
+        self._expired.append(None)
+        self._started.append(ticks_ms())
+        if not self.timer.armed:
+            self.timer.rearm(self.timeout)
+
+    def expire(self, refills: int) -> None:
+        self._expired[self._head] = refills
+        self._head += 1
+        if self._head < len(self._started):
+            due = ticks_add(self._started[self._head], self.timeout)
+            self.timer.rearm(ticks_diff(due, ticks_ms()))
+        else:
+            # All periods are over: every chain ends at the last refill.
+            self.reset(refills)
+
+    def reset(self, refills: int) -> None:
+        self.timer.cancel()
+        self._first = refills + 1
+        self._expired.clear()
+        self._started.clear()
+        self._head = 0
+
+    def is_idle(self, since: int, refills: int) -> bool:
+        since = max(since, self._first - 1)
+        while since < refills:
+            since = self._expired[since + 1 - self._first]
+            if since is None:
+                return True
+        return False
+
+
 class Combo:
     fast_reset = False
     per_key_timeout = False
     timeout = 50
-    _remaining = []
-    _timeout = None
+    _timer = None
     _state = _ComboState.IDLE
     _match_coord = False
+    _order = 0
+    _idle = None
+    # Refill count when the combo was reset last.
+    _since = 0
 
     def __init__(
         self,
@@ -44,6 +108,7 @@ class Combo:
         '''
         self.match = match
         self.result = result
+        self._remaining = []
         if fast_reset is not None:
             self.fast_reset = fast_reset
         if per_key_timeout is not None:
@@ -72,12 +137,47 @@ class Combo:
             self._remaining.insert(0, key)
 
     def reset(self):
-        self._remaining = list(self.match)
+        # In place: combos are reset on every key event.
+        self._remaining[:] = self.match
+
+    def is_complete(self) -> bool:
+        return not self._remaining
+
+    def matched(self) -> int:
+        '''Number of keys matched so far.'''
+        return len(self.match) - len(self._remaining)
 
 
 class Chord(Combo):
+    '''
+    Chords that match coordinates are matched as bitmasks once they're booted:
+    `_bits` maps coordinates to bits, and `_remaining` is the mask of the
+    coordinates that are still missing.
+    '''
+
+    _bits = None
+    _mask = 0
+
+    def use_bits(self, bits: dict) -> None:
+        '''Match by bitmask, assigning bits to new coordinates in `bits`.'''
+        mask = 0
+        for int_coord in self.match:
+            bit = bits.get(int_coord)
+            if bit is None:
+                bit = bits[int_coord] = 1 << len(bits)
+            mask |= bit
+        self._bits = bits
+        self._mask = mask
+        self._remaining = mask
+
     def matches(self, key: Key, int_coord: int):
-        if not self._match_coord and key in self._remaining:
+        if self._bits is not None:
+            bit = self._bits.get(int_coord, 0)
+            if self._remaining & bit:
+                self._remaining ^= bit
+                return True
+            return False
+        elif not self._match_coord and key in self._remaining:
             self._remaining.remove(key)
             return True
         elif self._match_coord and int_coord in self._remaining:
@@ -86,6 +186,33 @@ class Chord(Combo):
         else:
             return False
 
+    def has_match(self, key: Key, int_coord: int):
+        if self._bits is not None:
+            return bool(self._mask & self._bits.get(int_coord, 0))
+        return super().has_match(key, int_coord)
+
+    def insert(self, key: Key, int_coord: int):
+        if self._bits is not None:
+            self._remaining |= self._bits[int_coord]
+        else:
+            super().insert(key, int_coord)
+
+    def reset(self):
+        if self._bits is not None:
+            self._remaining = self._mask
+        else:
+            super().reset()
+
+    def matched(self) -> int:
+        if self._bits is None:
+            return super().matched()
+        count = 0
+        matched = self._mask ^ self._remaining
+        while matched:
+            matched &= matched - 1
+            count += 1
+        return count
+
 
 class Sequence(Combo):
     fast_reset = True
@@ -107,7 +234,15 @@ class Sequence(Combo):
 class Combos(Module):
     def __init__(self, combos=[]):
         self.combos = combos
-        self._key_buffer = []
+        self._key_buffer = RingBuffer(_KEY_BUFFER_SIZE)
+        # Key or coordinate -> combos containing it, built at boot.
+        self._index = {}
+        self._idle_groups = {}
+        # Combos that aren't reset, in order, and possibly some that were
+        # reset since the last refill.
+        self._pending = []
+        self._match_count = 0
+        self._refills = 0
 
         make_key(
             names=('LEADER', 'LDR'),
@@ -116,25 +251,35 @@ class Combos(Module):
         )
 
     def during_bootup(self, keyboard):
-        self.reset(keyboard)
-
-    def before_matrix_scan(self, keyboard):
-        return
-
-    def after_matrix_scan(self, keyboard):
-        return
-
-    def before_hid_send(self, keyboard):
-        return
-
-    def after_hid_send(self, keyboard):
-        return
-
-    def on_powersave_enable(self, keyboard):
-        return
-
-    def on_powersave_disable(self, keyboard):
-        return
+        self._index.clear()
+        self._idle_groups.clear()
+        self._pending.clear()
+        self._match_count = 0
+        self._refills = 0
+        # Coordinate -> bit, for chords that match coordinates. Only
+        # coordinates that are part of such chords get bits, keeping masks
+        # small integers.
+        coord_bits = {}
+        for index, combo in enumerate(self.combos):
+            combo._order = index
+            combo._timer = Timer(self.on_timer, keyboard, combo)
+
+            group = self._idle_groups.get(combo.timeout)
+            if group is None:
+                group = self._idle_groups[combo.timeout] = _IdleGroup(combo.timeout)
+                group.timer = Timer(self.on_idle_timeout, group)
+            combo._idle = group
+
+            for match in combo.match:
+                candidates = self._index.setdefault(match, [])
+                if combo not in candidates:
+                    candidates.append(combo)
+
+            if isinstance(combo, Chord) and combo._match_coord:
+                combo.use_bits(coord_bits)
+            combo.reset()
+            combo._state = _ComboState.RESET
+            combo._since = 0
 
     def process_key(self, keyboard, key: Key, is_pressed, int_coord):
         if is_pressed:
@@ -143,70 +288,58 @@ class Combos(Module):
             return self.on_release(keyboard, key, int_coord)
 
     def on_press(self, keyboard: KMKKeyboard, key: Key, int_coord: Optional[int]):
-        # refill potential matches from timed-out matches
-        if self.count_matching() == 0:
-            for combo in self.combos:
-                if combo._state == _ComboState.RESET:
-                    combo._state = _ComboState.MATCHING
-
-        # filter potential matches
-        for combo in self.combos:
-            if combo._state != _ComboState.MATCHING:
-                continue
-            if combo.matches(key, int_coord):
-                continue
-            combo._state = _ComboState.IDLE
-            if combo._timeout:
-                keyboard.cancel_timeout(combo._timeout)
-            combo._timeout = keyboard.set_timeout(
-                combo.timeout, lambda c=combo: self.reset_combo(keyboard, c)
-            )
+        if self._match_count == 0:
+            # refill potential matches from timed-out matches
+            self.refill(key, int_coord)
+        else:
+            # filter potential matches
+            for combo in self._pending:
+                if combo._state != _ComboState.MATCHING:
+                    continue
+                if combo.matches(key, int_coord):
+                    continue
+                self._set_state(combo, _ComboState.IDLE)
+                combo._timer.rearm(combo.timeout)
 
-        match_count = self.count_matching()
+        match_count = self._match_count
 
         if match_count:
             # At least one combo matches current key: append key to buffer.
-            self._key_buffer.append((int_coord, key, True))
+            if not self._buffer(keyboard, int_coord, key, True):
+                return None
             key = None
 
-            for first_match in self.combos:
+            for first_match in self._pending:
                 if first_match._state == _ComboState.MATCHING:
                     break
 
             # Single match left: don't wait on timeout to activate
-            if match_count == 1 and not any(first_match._remaining):
+            if match_count == 1 and first_match.is_complete():
                 combo = first_match
                 self.activate(keyboard, combo)
-                if combo._timeout:
-                    keyboard.cancel_timeout(combo._timeout)
-                    combo._timeout = None
-                self._key_buffer = []
+                combo._timer.cancel()
+                self._key_buffer.clear()
                 self.reset(keyboard)
 
             # Start or reset individual combo timeouts.
-            for combo in self.combos:
+            for combo in self._pending:
                 if combo._state != _ComboState.MATCHING:
                     continue
-                if combo._timeout:
-                    if combo.per_key_timeout:
-                        keyboard.cancel_timeout(combo._timeout)
-                    else:
-                        continue
-                combo._timeout = keyboard.set_timeout(
-                    combo.timeout, lambda c=combo: self.on_timeout(keyboard, c)
-                )
+                if combo._timer.armed and not combo.per_key_timeout:
+                    continue
+                combo._timer.rearm(combo.timeout)
         else:
             # There's no matching combo: send and reset key buffer
             if self._key_buffer:
-                self._key_buffer.append((int_coord, key, True))
+                self._buffer(keyboard, int_coord, key, True)
                 self.send_key_buffer(keyboard)
-                self._key_buffer = []
+                self._key_buffer.clear()
                 key = None
 
         return key
 
     def on_release(self, keyboard: KMKKeyboard, key: Key, int_coord: Optional[int]):
-        for combo in self.combos:
+        for combo in self._pending:
             if combo._state != _ComboState.ACTIVE:
                 continue
             if combo.has_match(key, int_coord):
@@ -215,10 +348,10 @@ class Combos(Module):
 
                 if combo.fast_reset:
                     self.reset_combo(keyboard, combo)
-                    self._key_buffer = []
+                    self._key_buffer.clear()
                 else:
                     combo.insert(key, int_coord)
-                    combo._state = _ComboState.MATCHING
+                    self._set_state(combo, _ComboState.MATCHING)
 
                 key = None
                 break
@@ -227,27 +360,27 @@ class Combos(Module):
             # Non-active but matching combos can either activate on key release
             # if they're the only match, or "un-match" the released key but stay
             # matching if they're a repeatable combo.
-            for combo in self.combos:
+            for combo in self._pending:
                 if combo._state != _ComboState.MATCHING:
                     continue
                 if not combo.has_match(key, int_coord):
                     continue
 
                 # Combo matches, but first key released before timeout.
-                elif not any(combo._remaining) and self.count_matching() == 1:
-                    keyboard.cancel_timeout(combo._timeout)
+                elif combo.is_complete() and self.count_matching() == 1:
+                    combo._timer.cancel()
                     self.activate(keyboard, combo)
-                    self._key_buffer = []
+                    self._key_buffer.clear()
                     keyboard._send_hid()
                     self.deactivate(keyboard, combo)
                     if combo.fast_reset:
                         self.reset_combo(keyboard, combo)
                     else:
                         combo.insert(key, int_coord)
-                        combo._state = _ComboState.MATCHING
+                        self._set_state(combo, _ComboState.MATCHING)
                     self.reset(keyboard)
 
-                elif not any(combo._remaining):
+                elif combo.is_complete():
                     continue
 
                 # Skip combos that allow tapping.
@@ -255,12 +388,12 @@ class Combos(Module):
                     continue
 
                 # This was the last key released of a repeatable combo.
-                elif len(combo._remaining) == len(combo.match) - 1:
+                elif combo.matched() == 1:
                     self.reset_combo(keyboard, combo)
                     if not self.count_matching():
-                        self._key_buffer.append((int_coord, key, False))
+                        self._buffer(keyboard, int_coord, key, False)
                         self.send_key_buffer(keyboard)
-                        self._key_buffer = []
+                        self._key_buffer.clear()
                         key = None
 
                 # Anything between first and last key released.
@@ -270,10 +403,12 @@ class Combos(Module):
             # Don't propagate key-release events for keys that have been
             # buffered. Append release events only if corresponding press is in
             # buffer.
-            pressed = self._key_buffer.count((int_coord, key, True))
-            released = self._key_buffer.count((int_coord, key, False))
-            if (pressed - released) > 0:
-                self._key_buffer.append((int_coord, key, False))
+            pressed = 0
+            for _int_coord, _key, _is_pressed in self._key_buffer:
+                if _int_coord == int_coord and _key == key:
+                    pressed += 1 if _is_pressed else -1
+            if pressed > 0:
+                self._buffer(keyboard, int_coord, key, False)
                 key = None
 
         # Reset on non-combo key up
@@ -282,57 +417,127 @@ class Combos(Module):
 
         return key
 
+    def on_timer(self, keyboard, combo):
+        # Combos that stopped matching are reset on timeout, matching ones
+        # time out.
+        if combo._state == _ComboState.IDLE:
+            self.reset_combo(keyboard, combo)
+        else:
+            self.on_timeout(keyboard, combo)
+
+    def on_idle_timeout(self, group):
+        group.expire(self._refills)
+
     def on_timeout(self, keyboard, combo):
         # If combo reaches timeout and has no remaining keys, activate it;
         # else, drop it from the match list.
-        combo._timeout = None
-
-        if not any(combo._remaining):
+        if combo.is_complete():
             self.activate(keyboard, combo)
             # check if the last buffered key event was a 'release'
             if not self._key_buffer[-1][2]:
                 keyboard._send_hid()
                 self.deactivate(keyboard, combo)
-            self._key_buffer = []
+            self._key_buffer.clear()
             self.reset(keyboard)
         else:
             if self.count_matching() == 1:
                 # This was the last pending combo: flush key buffer.
                 self.send_key_buffer(keyboard)
-                self._key_buffer = []
+                self._key_buffer.clear()
             self.reset_combo(keyboard, combo)
 
     def send_key_buffer(self, keyboard):
         for (int_coord, key, is_pressed) in self._key_buffer:
             keyboard.resume_process_key(self, key, is_pressed, int_coord)
 
+    def _buffer(self, keyboard, int_coord, key, is_pressed):
+        '''
+        Append a key event to the key buffer and return `True`. If the buffer
+        is full, give up on pending matches instead: the buffered events are
+        resumed, followed by this one, and `False` is returned.
+        '''
+        if self._key_buffer.append((int_coord, key, is_pressed)):
+            return True
+
+        debug_error(self, 'key buffer', OverflowError(len(self._key_buffer)))
+        self.send_key_buffer(keyboard)
+        self._key_buffer.clear()
+        keyboard.resume_process_key(self, key, is_pressed, int_coord)
+        self.reset(keyboard)
+        return False
+
     def activate(self, keyboard, combo):
         if debug.enabled:
             debug('activate', combo)
         combo.result.on_press(keyboard)
-        combo._state = _ComboState.ACTIVE
+        self._set_state(combo, _ComboState.ACTIVE)
 
     def deactivate(self, keyboard, combo):
         if debug.enabled:
             debug('deactivate', combo)
         combo.result.on_release(keyboard)
-        combo._state = _ComboState.IDLE
+        self._set_state(combo, _ComboState.IDLE)
+
+    def refill(self, key: Key, int_coord: Optional[int]):
+        '''
+        Start matching over with the combos that are reset and contain the
+        pressed key; all other reset combos go idle.
+        '''
+        pending = self._pending
+        # Drop combos that were reset since the last refill, in place.
+        i = 0
+        for combo in pending:
+            if combo._state != _ComboState.RESET:
+                pending[i] = combo
+                i += 1
+        del pending[i:]
+
+        refills = self._refills
+        for candidates in (self._index.get(key), self._index.get(int_coord)):
+            if not candidates:
+                continue
+            for combo in candidates:
+                if combo._state != _ComboState.RESET:
+                    continue
+                if combo._idle.is_idle(combo._since, refills):
+                    continue
+
+                # Keep pending combos in order of definition.
+                i = len(pending)
+                while i and pending[i - 1]._order > combo._order:
+                    i -= 1
+                pending.insert(i, combo)
+
+                if combo.matches(key, int_coord):
+                    self._set_state(combo, _ComboState.MATCHING)
+                else:
+                    self._set_state(combo, _ComboState.IDLE)
+                    combo._timer.rearm(combo.timeout)
+
+        self._refills += 1
+        for group in self._idle_groups.values():
+            group.start()
 
     def reset_combo(self, keyboard, combo):
         combo.reset()
-        if combo._timeout is not None:
-            keyboard.cancel_timeout(combo._timeout)
-            combo._timeout = None
-        combo._state = _ComboState.RESET
+        combo._timer.cancel()
+        self._set_state(combo, _ComboState.RESET)
+        combo._since = self._refills
 
     def reset(self, keyboard):
-        for combo in self.combos:
+        for combo in self._pending:
             if combo._state != _ComboState.ACTIVE:
                 self.reset_combo(keyboard, combo)
+        # Combos that went idle on refills are reset, too.
+        for group in self._idle_groups.values():
+            group.reset(self._refills)
 
     def count_matching(self):
-        match_count = 0
-        for combo in self.combos:
-            if combo._state == _ComboState.MATCHING:
-                match_count += 1
-        return match_count
+        return self._match_count
+
+    def _set_state(self, combo, state):
+        if combo._state == _ComboState.MATCHING:
+            self._match_count -= 1
+        if state == _ComboState.MATCHING:
+            self._match_count += 1
+        combo._state = state
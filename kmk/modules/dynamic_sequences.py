@@ -226,11 +226,10 @@ class DynamicSequences(Module):
     def during_bootup(self, keyboard):
         return
 
-    def before_matrix_scan(self, keyboard):
-        return
-
-    def after_matrix_scan(self, keyboard):
-        return
+    @property
+    def wake_interval(self):
+        if self.status == SequenceStatus.PLAYING:
+            return 1
 
     def before_hid_send(self, keyboard):
 
@@ -248,12 +247,3 @@ class DynamicSequences(Module):
             or self.status == SequenceStatus.SET_INTERVAL
         ):
             self.config_mode(keyboard)
-
-    def after_hid_send(self, keyboard):
-        return
-
-    def on_powersave_enable(self, keyboard):
-        return
-
-    def on_powersave_disable(self, keyboard):
-        return
@@ -2,10 +2,9 @@
 Extension handles usage of AS5013 by AMS
 '''
 
-from supervisor import ticks_ms
-
 from kmk.keys import AX
 from kmk.modules import Module
+from kmk.scheduler import create_task
 
 I2C_ADDRESS = 0x40
 I2X_ALT_ADDRESS = 0x41
@@ -45,7 +44,6 @@ class Easypoint(Module):
 
         # HID parameters
         self.polling_interval = 20
-        self.last_tick = ticks_ms()
 
         # Offsets for poor soldering
         self.y_offset = y_offset
@@ -56,17 +54,10 @@ class Easypoint(Module):
         self.dead_y = DEAD_Y
 
     def during_bootup(self, keyboard):
-        return
-
-    def before_matrix_scan(self, keyboard):
-        '''
-        Return value will be injected as an extra matrix update
-        '''
-        now = ticks_ms()
-        if now - self.last_tick < self.polling_interval:
-            return
-        self.last_tick = now
+        self._keyboard = keyboard
+        self._task = create_task(self.poll, period_ms=self.polling_interval)
 
+    def poll(self):
         x, y = self._read_raw_state()
 
         # I'm a shit coder, so offset is handled in software side
@@ -81,23 +72,8 @@ class Easypoint(Module):
             return
         else:
             # Set the X/Y from easypoint
-            AX.X.move(keyboard, x)
-            AX.Y.move(keyboard, y)
-
-    def after_matrix_scan(self, keyboard):
-        return
-
-    def before_hid_send(self, keyboard):
-        return
-
-    def after_hid_send(self, keyboard):
-        return
-
-    def on_powersave_enable(self, keyboard):
-        return
-
-    def on_powersave_disable(self, keyboard):
-        return
+            AX.X.move(self._keyboard, x)
+            AX.Y.move(self._keyboard, y)
 
     def _read_raw_state(self):
         '''Read data from AS5013'''
@@ -243,6 +243,9 @@ class I2CEncoder(BaseEncoder):
 
 
 class EncoderHandler(Module):
+    # Encoder pins are polled.
+    wake_interval = 1
+
     def __init__(self):
         self.encoders = []
         self.pins = None
@@ -309,21 +312,3 @@ class EncoderHandler(Module):
             encoder.update_state()
 
         return keyboard
-
-    def after_matrix_scan(self, keyboard):
-        '''
-        Return value will be replace matrix update if supplied
-        '''
-        return
-
-    def before_hid_send(self, keyboard):
-        return
-
-    def after_hid_send(self, keyboard):
-        return
-
-    def on_powersave_enable(self, keyboard):
-        return
-
-    def on_powersave_disable(self, keyboard):
-        return
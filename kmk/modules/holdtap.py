@@ -1,11 +1,15 @@
 from micropython import const
 
 from kmk.keys import KC, make_argumented_key
+from kmk.kmk_keyboard import debug_error
 from kmk.modules import Module
-from kmk.utils import Debug
+from kmk.scheduler import Timer
+from kmk.utils import Debug, RingBuffer
 
 debug = Debug(__name__)
 
+_KEY_BUFFER_SIZE = const(32)
+
 
 class ActivationType:
     PRESSED = const(0)
@@ -28,6 +32,8 @@ class HoldTapKeyState:
         self.args = args
         self.kwargs = kwargs
         self.activated = ActivationType.PRESSED
+        # The timeout drops the state instead of resolving the tap time.
+        self.repeating = False
 
 
 class HoldTapKeyMeta:
@@ -52,8 +58,10 @@ class HoldTap(Module):
     tap_time = 300
 
     def __init__(self):
-        self.key_buffer = []
+        self.key_buffer = RingBuffer(_KEY_BUFFER_SIZE)
         self.key_states = {}
+        # Key states and their timers are allocated once per key, and reused.
+        self._states = {}
         if KC.get('HT') == KC.NO:
             make_argumented_key(
                 validator=HoldTapKeyMeta,
@@ -65,12 +73,6 @@ class HoldTap(Module):
     def during_bootup(self, keyboard):
         return
 
-    def before_matrix_scan(self, keyboard):
-        return
-
-    def after_matrix_scan(self, keyboard):
-        return
-
     def process_key(self, keyboard, key, is_pressed, int_coord):
         '''Handle holdtap being interrupted by another key press/release.'''
         current_key = key
@@ -109,7 +111,7 @@ class HoldTap(Module):
         # apply changes with 'side-effects' on key_states or the loop behaviour
         # outside the loop.
         if append_buffer:
-            self.key_buffer.append((int_coord, current_key, is_pressed))
+            self._buffer(keyboard, int_coord, current_key, is_pressed)
             current_key = None
 
         if send_buffer:
@@ -117,18 +119,6 @@ class HoldTap(Module):
 
         return current_key
 
-    def before_hid_send(self, keyboard):
-        return
-
-    def after_hid_send(self, keyboard):
-        return
-
-    def on_powersave_enable(self, keyboard):
-        return
-
-    def on_powersave_disable(self, keyboard):
-        return
-
     def ht_pressed(self, key, keyboard, *args, **kwargs):
         '''Unless in repeat mode, do nothing yet, action resolves when key is released, timer expires or other key is pressed.'''
         if key in self.key_states:
@@ -148,11 +138,18 @@ class HoldTap(Module):
             tap_time = self.tap_time
         else:
             tap_time = key.meta.tap_time
-        timeout_key = keyboard.set_timeout(
-            tap_time,
-            lambda: self.on_tap_time_expired(key, keyboard, *args, **kwargs),
-        )
-        self.key_states[key] = HoldTapKeyState(timeout_key, *args, **kwargs)
+
+        state = self._states.get(key)
+        if state is None:
+            timer = Timer(self.on_timeout, key, keyboard)
+            state = self._states[key] = HoldTapKeyState(timer)
+        state.args = args
+        state.kwargs = kwargs
+        state.activated = ActivationType.PRESSED
+        state.repeating = False
+
+        keyboard.set_timeout(tap_time, state.timeout_key)
+        self.key_states[key] = state
         return keyboard
 
     def ht_released(self, key, keyboard, *args, **kwargs):
@@ -190,14 +187,26 @@ class HoldTap(Module):
                 tap_time = self.tap_time
             else:
                 tap_time = key.meta.tap_time
-            state.timeout_key = keyboard.set_timeout(
-                tap_time, lambda: self.key_states.pop(key)
-            )
+            state.repeating = True
+            keyboard.set_timeout(tap_time, state.timeout_key)
         else:
             del self.key_states[key]
 
         return keyboard
 
+    def on_timeout(self, key, keyboard):
+        try:
+            state = self.key_states[key]
+        except KeyError:
+            if debug.enabled:
+                debug(f'on_timeout: no such key {key}')
+            return
+
+        if state.repeating:
+            del self.key_states[key]
+        else:
+            self.on_tap_time_expired(key, keyboard, *state.args, **state.kwargs)
+
     def on_tap_time_expired(self, key, keyboard, *args, **kwargs):
         '''When tap time expires activate hold if key is still being pressed.
         Remove key if ActivationType is RELEASED.'''
@@ -229,6 +238,30 @@ class HoldTap(Module):
 
         self.key_buffer.clear()
 
+    def _buffer(self, keyboard, int_coord, key, is_pressed):
+        '''
+        Append a key event to the key buffer. If the buffer is full, resolve
+        pending hold-taps as holds instead, as if their tap time had expired:
+        the buffered events are resumed, followed by this one.
+        '''
+        if self.key_buffer.append((int_coord, key, is_pressed)):
+            return
+
+        debug_error(self, 'key buffer', OverflowError(len(self.key_buffer)))
+        for ht_key, state in self.key_states.items():
+            if state.activated == ActivationType.PRESSED:
+                keyboard.cancel_timeout(state.timeout_key)
+                state.activated = ActivationType.HOLD_TIMEOUT
+                self.ht_activate_hold(ht_key, keyboard, *state.args, **state.kwargs)
+
+        reprocess = False
+        for (_, buffered, _) in self.key_buffer:
+            if isinstance(buffered.meta, HoldTapKeyMeta):
+                reprocess = True
+                break
+        self.send_key_buffer(keyboard)
+        keyboard.resume_process_key(self, key, is_pressed, int_coord, reprocess)
+
     def ht_activate_hold(self, key, keyboard, *args, **kwargs):
         if debug.enabled:
             debug('ht_activate_hold')
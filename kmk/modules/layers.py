@@ -99,7 +99,7 @@ class Layers(HoldTap):
         As MO(layer) but with mod active
         '''
         keyboard.hid_pending = True
-        keyboard.keys_pressed.add(key.meta.kc)
+        keyboard.report_key(key.meta.kc, True)
         self.activate_layer(keyboard, key.meta.layer)
 
     def _lm_released(self, key, keyboard, *args, **kwargs):
@@ -107,7 +107,7 @@ class Layers(HoldTap):
         As MO(layer) but with mod active
         '''
         keyboard.hid_pending = True
-        keyboard.keys_pressed.discard(key.meta.kc)
+        keyboard.report_key(key.meta.kc, False)
         self.deactivate_layer(keyboard, key.meta.layer)
 
     def _tg_pressed(self, key, keyboard, *args, **kwargs):
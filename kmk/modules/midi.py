@@ -68,27 +68,9 @@ class MidiKeys(Module):
     def during_bootup(self, keyboard):
         return None
 
-    def before_matrix_scan(self, keyboard):
-        return None
-
-    def after_matrix_scan(self, keyboard):
-        return None
-
     def process_key(self, keyboard, key, is_pressed, int_coord):
         return key
 
-    def before_hid_send(self, keyboard):
-        return None
-
-    def after_hid_send(self, keyboard):
-        return None
-
-    def on_powersave_enable(self, keyboard):
-        return None
-
-    def on_powersave_disable(self, keyboard):
-        return None
-
     def send(self, message):
         if self.midi:
             self.midi.send(message)
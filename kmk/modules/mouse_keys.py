@@ -101,24 +101,6 @@ class MouseKeys(Module):
         )
         cancel_task(self._task)
 
-    def before_matrix_scan(self, keyboard):
-        return
-
-    def after_matrix_scan(self, keyboard):
-        return
-
-    def before_hid_send(self, keyboard):
-        return
-
-    def after_hid_send(self, keyboard):
-        return
-
-    def on_powersave_enable(self, keyboard):
-        return
-
-    def on_powersave_disable(self, keyboard):
-        return
-
     def _move(self, keyboard):
         if self._movement & (_MR + _ML + _MD + _MU):
             if self.move_step < self.max_speed:
@@ -35,15 +35,11 @@ class OneShot(HoldTap):
             if (isinstance(current_key.meta, OneShotKeyMeta)) or (
                 isinstance(current_key.meta, LayerKeyMeta)
             ):
-                keyboard.cancel_timeout(state.timeout_key)
                 if key.meta.tap_time is None:
                     tap_time = self.tap_time
                 else:
                     tap_time = key.meta.tap_time
-                state.timeout_key = keyboard.set_timeout(
-                    tap_time,
-                    lambda k=key: self.on_tap_time_expired(k, keyboard),
-                )
+                keyboard.set_timeout(tap_time, state.timeout_key)
                 continue
 
             if state.activated == ActivationType.PRESSED and is_pressed:
@@ -53,10 +49,13 @@ class OneShot(HoldTap):
             elif state.activated == ActivationType.INTERRUPTED:
                 if is_pressed:
                     send_buffer = True
-                self.key_buffer.insert(0, (None, key, False))
+                if not self.key_buffer.appendleft((None, key, False)):
+                    # Make room by resuming the releases buffered so far.
+                    self.send_key_buffer(keyboard)
+                    self.key_buffer.append((None, key, False))
 
         if send_buffer:
-            self.key_buffer.append((int_coord, current_key, is_pressed))
+            self._buffer(keyboard, int_coord, current_key, is_pressed)
             current_key = None
 
         self.send_key_buffer(keyboard)
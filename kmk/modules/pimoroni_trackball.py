@@ -8,8 +8,8 @@ import struct
 from adafruit_pixelbuf import PixelBuf
 
 from kmk.keys import AX, KC, make_argumented_key, make_key
-from kmk.kmktime import PeriodicTimer
 from kmk.modules import Module
+from kmk.scheduler import create_task
 from kmk.utils import Debug
 
 _I2C_ADDRESS = const(0x0A)
@@ -176,24 +176,20 @@ class Trackball(Module):
         )
 
     def during_bootup(self, keyboard):
+        self._keyboard = keyboard
+
         chip_id = struct.unpack('<H', bytearray(self._i2c_rdwr([_REG_CHIP_ID_L], 2)))[0]
         if chip_id != _CHIP_ID:
             raise RuntimeError(
                 f'Invalid chip ID: 0x{chip_id:04X}, expected 0x{_CHIP_ID:04X}'
             )
 
-        self._timer = PeriodicTimer(self.polling_interval)
-
         a = math.pi * self.angle_offset / 180
         self.rot = [[math.cos(a), math.sin(a)], [-math.sin(a), math.cos(a)]]
 
-    def before_matrix_scan(self, keyboard):
-        '''
-        Return value will be injected as an extra matrix update
-        '''
-        if not self._timer.tick():
-            return
+        self._task = create_task(self.poll, period_ms=self.polling_interval)
 
+    def poll(self):
         if not (self._i2c_rdwr([_REG_INT], 1)[0] & _MSK_INT_TRIGGERED):
             return
 
@@ -201,22 +197,7 @@ class Trackball(Module):
 
         x, y = self._calculate_movement(right - left, down - up)
 
-        self.current_handler.handle(keyboard, self, x, y, switch, state)
-
-    def after_matrix_scan(self, keyboard):
-        return
-
-    def before_hid_send(self, keyboard):
-        return
-
-    def after_hid_send(self, keyboard):
-        return
-
-    def on_powersave_enable(self, keyboard):
-        return
-
-    def on_powersave_disable(self, keyboard):
-        return
+        self.current_handler.handle(self._keyboard, self, x, y, switch, state)
 
     def set_rgbw(self, r, g, b, w):
         '''Set all LED brightness as RGBW.'''
@@ -2,6 +2,7 @@ from analogio import AnalogIn
 from supervisor import ticks_ms
 
 from kmk.modules import Module
+from kmk.scheduler import create_task
 
 
 class PotentiometerState:
@@ -53,6 +54,7 @@ class PotentiometerHandler(Module):
     def __init__(self):
         self.potentiometers = []
         self.pins = None
+        self.polling_interval = 10
 
     def on_runtime_enable(self, keyboard):
         return
@@ -64,31 +66,10 @@ class PotentiometerHandler(Module):
         if self.pins:
             for args in self.pins:
                 self.potentiometers.append(Potentiometer(*args))
-        return
 
-    def before_matrix_scan(self, keyboard):
-        '''
-        Return value will be injected as an extra matrix update
-        '''
+        if self.potentiometers:
+            self._task = create_task(self.poll, period_ms=self.polling_interval)
+
+    def poll(self):
         for potentiometer in self.potentiometers:
             potentiometer.update_state()
-
-        return keyboard
-
-    def after_matrix_scan(self, keyboard):
-        '''
-        Return value will be replace matrix update if supplied
-        '''
-        return
-
-    def before_hid_send(self, keyboard):
-        return
-
-    def after_hid_send(self, keyboard):
-        return
-
-    def on_powersave_enable(self, keyboard):
-        return
-
-    def on_powersave_disable(self, keyboard):
-        return
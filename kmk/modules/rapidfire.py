@@ -2,6 +2,7 @@ from random import randint
 
 from kmk.keys import make_argumented_key
 from kmk.modules import Module
+from kmk.scheduler import Timer
 
 
 class RapidFireMeta:
@@ -28,6 +29,7 @@ class RapidFire(Module):
     _waiting_keys = []
 
     def __init__(self):
+        self._timers = {}
         make_argumented_key(
             validator=RapidFireMeta,
             names=('RF',),
@@ -42,6 +44,12 @@ class RapidFire(Module):
             )
         return key.meta.interval
 
+    def _get_timer(self, key, keyboard):
+        timer = self._timers.get(key)
+        if timer is None:
+            timer = self._timers[key] = Timer(self._on_timer_timeout, key, keyboard)
+        return timer
+
     def _on_timer_timeout(self, key, keyboard):
         keyboard.tap_key(key.meta.kc)
         if key in self._waiting_keys:
@@ -49,7 +57,7 @@ class RapidFire(Module):
         if key.meta.toggle and key not in self._toggled_keys:
             self._toggled_keys.append(key)
         self._active_keys[key] = keyboard.set_timeout(
-            self._get_repeat(key), lambda: self._on_timer_timeout(key, keyboard)
+            self._get_repeat(key), self._get_timer(key, keyboard)
         )
 
     def _rf_pressed(self, key, keyboard, *args, **kwargs):
@@ -61,7 +69,7 @@ class RapidFire(Module):
             keyboard.tap_key(key.meta.kc)
             self._waiting_keys.append(key)
             self._active_keys[key] = keyboard.set_timeout(
-                key.meta.timeout, lambda: self._on_timer_timeout(key, keyboard)
+                key.meta.timeout, self._get_timer(key, keyboard)
             )
         else:
             self._on_timer_timeout(key, keyboard)
@@ -83,21 +91,3 @@ class RapidFire(Module):
 
     def during_bootup(self, keyboard):
         return
-
-    def before_matrix_scan(self, keyboard):
-        return
-
-    def before_hid_send(self, keyboard):
-        return
-
-    def after_hid_send(self, keyboard):
-        return
-
-    def on_powersave_enable(self, keyboard):
-        return
-
-    def on_powersave_disable(self, keyboard):
-        return
-
-    def after_matrix_scan(self, keyboard):
-        return
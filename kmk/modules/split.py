@@ -9,6 +9,9 @@ from storage import getmount
 from kmk.hid import HIDModes
 from kmk.kmktime import check_deadline
 from kmk.modules import Module
+from kmk.utils import RingBuffer
+
+_UART_BUFFER_SIZE = const(32)
 
 
 class SplitSide:
@@ -40,7 +43,8 @@ class Split(Module):
         debug_enabled=False,
     ):
         self._is_target = True
-        self._uart_buffer = []
+        # Received key events, packed as `key_number << 1 | pressed`.
+        self._uart_buffer = RingBuffer(_UART_BUFFER_SIZE, 'H')
         self.split_flip = split_flip
         self.split_side = split_side
         self.split_type = split_type
@@ -164,6 +168,11 @@ class Split(Module):
                 matrix.offset = offset
                 offset += matrix.key_count
 
+    def has_pending_input(self, keyboard):
+        return bool(self._uart_buffer) or (
+            self._uart is not None and self._uart.in_waiting > 0
+        )
+
     def before_matrix_scan(self, keyboard):
         if self.split_type == SplitType.BLE:
             self._check_all_connections(keyboard)
@@ -176,6 +185,11 @@ class Split(Module):
         return
 
     def after_matrix_scan(self, keyboard):
+        # When batching is enabled, the keyboard keeps scanning until no more
+        # updates are reported: hand over the next received event.
+        if self._uart_buffer and not keyboard.secondary_matrix_update:
+            self._pop_update(keyboard)
+
         if keyboard.matrix_update:
             if self.split_type == SplitType.UART:
                 if not self._is_target or self.data_pin2:
@@ -197,9 +211,6 @@ class Split(Module):
 
         return
 
-    def after_hid_send(self, keyboard):
-        return
-
     def on_powersave_enable(self, keyboard):
         if self.split_type == SplitType.BLE:
             if self._uart_connection and not self._psave_enable:
@@ -322,9 +333,22 @@ class Split(Module):
         buffer[1] = update.pressed
         return buffer
 
-    def _deserialize_update(self, update):
-        kevent = KeyEvent(key_number=update[0], pressed=update[1])
-        return kevent
+    def _can_push(self):
+        # Received events are left to the UART while the buffer is full rather
+        # than dropped: a lost release would leave a key stuck.
+        return len(self._uart_buffer) < _UART_BUFFER_SIZE
+
+    def _push_update(self, update):
+        if not self._uart_buffer.append(update[0] << 1 | (update[1] & 1)):
+            if self._debug_enabled:
+                print('UART buffer overflow')
+
+    def _pop_update(self, keyboard):
+        update = self._uart_buffer.popleft()
+        kevent = KeyEvent(key_number=update >> 1, pressed=update & 1)
+        if keyboard.tracer:
+            keyboard.tracer.received(kevent)
+        keyboard.secondary_matrix_update = kevent
 
     def _send_ble(self, update):
         if self._uart:
@@ -344,11 +368,10 @@ class Split(Module):
 
     def _receive_ble(self, keyboard):
         if self._uart is not None and self._uart.in_waiting > 0 or self._uart_buffer:
-            while self._uart.in_waiting >= 2:
-                update = self._deserialize_update(self._uart.read(2))
-                self._uart_buffer.append(update)
+            while self._uart.in_waiting >= 2 and self._can_push():
+                self._push_update(self._uart.read(2))
             if self._uart_buffer:
-                keyboard.secondary_matrix_update = self._uart_buffer.pop(0)
+                self._pop_update(keyboard)
 
     def _checksum(self, update):
         checksum = bytes([sum(update) & 0xFF])
@@ -372,13 +395,13 @@ class Split(Module):
 
                 microcontroller.reset()
 
-            while self._uart.in_waiting >= 4:
+            while self._uart.in_waiting >= 4 and self._can_push():
                 # Check the header
                 if self._uart.read(1) == self.uart_header:
                     update = self._uart.read(2)
 
                     # check the checksum
                     if self._checksum(update) == self._uart.read(1):
-                        self._uart_buffer.append(self._deserialize_update(update))
+                        self._push_update(update)
             if self._uart_buffer:
-                keyboard.secondary_matrix_update = self._uart_buffer.pop(0)
+                self._pop_update(keyboard)
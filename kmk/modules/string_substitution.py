@@ -164,8 +164,11 @@ class StringSubstitution(Module):
     def during_bootup(self, keyboard):
         return
 
-    def before_matrix_scan(self, keyboard):
-        return
+    @property
+    def wake_interval(self):
+        # Substitutions are typed one character per main loop cycle.
+        if self._state != State.LISTENING:
+            return 0
 
     def before_hid_send(self, keyboard):
 
@@ -208,15 +211,3 @@ class StringSubstitution(Module):
                 self._matched_rule = None
                 for rule in self._rules:
                     rule.restart()
-
-    def after_hid_send(self, keyboard):
-        return
-
-    def on_powersave_enable(self, keyboard):
-        return
-
-    def on_powersave_disable(self, keyboard):
-        return
-
-    def after_matrix_scan(self, keyboard):
-        return
@@ -0,0 +1,354 @@
+'''
+Lightweight instrumentation for the main loop.
+
+Nothing in here is used unless profiling is enabled on the keyboard, which
+wraps the instrumented methods on the instance. Disabled, there is no cost.
+'''
+
+from micropython import const
+from supervisor import ticks_ms
+
+from array import array
+
+from kmk.kmktime import ticks_diff
+
+try:
+    from time import monotonic_ns
+
+    def ticks_us() -> int:
+        return monotonic_ns() // 1000
+
+    def ticks_us_diff(new: int, start: int) -> int:
+        return new - start
+
+except ImportError:
+    # Ports without long integers don't have `monotonic_ns`; fall back to
+    # millisecond resolution.
+    def ticks_us() -> int:
+        return ticks_ms()
+
+    def ticks_us_diff(new: int, start: int) -> int:
+        return ticks_diff(new, start) * 1000
+
+
+_BINS = const(16)
+
+
+class Histogram:
+    '''
+    Fixed-size histogram of durations in us.
+
+    Bin 0 counts durations of 0us, bin n counts durations in [2^(n-1), 2^n),
+    and the last bin everything longer. Percentiles are therefore upper bounds,
+    exact within a factor of two.
+    '''
+
+    def __init__(self):
+        self.bins = array('L', (0 for _ in range(_BINS)))
+        self.reset()
+
+    def reset(self) -> None:
+        for i in range(_BINS):
+            self.bins[i] = 0
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = 0
+
+    def add(self, value: int) -> None:
+        if value < 0:
+            value = 0
+
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+        idx = 0
+        while value and idx < _BINS - 1:
+            value >>= 1
+            idx += 1
+        self.bins[idx] += 1
+
+    @property
+    def avg(self) -> int:
+        return self.total // self.count if self.count else 0
+
+    def percentile(self, p: int) -> int:
+        threshold = (self.count * p + 99) // 100
+        seen = 0
+        for idx in range(_BINS):
+            seen += self.bins[idx]
+            if seen >= threshold:
+                break
+        if idx == _BINS - 1:
+            return self.max
+        return min((1 << idx) - 1, self.max)
+
+    def __repr__(self) -> str:
+        return (
+            f'n={self.count} min={self.min} avg={self.avg} '
+            f'max={self.max} p99={self.percentile(99)}'
+        )
+
+
+def timed(func, histogram: Histogram):
+    '''Wrap `func` so that the duration of each call is added to `histogram`.'''
+
+    def _timed(*args, **kwargs):
+        start = ticks_us()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            histogram.add(ticks_us_diff(ticks_us(), start))
+
+    return _timed
+
+
+class Profiler:
+    '''
+    Cumulative call counts and elapsed time in us per (class name, hook) of
+    modules and extensions. Instances of the same class are aggregated.
+
+    Hooks are profiled by wrapping the bound methods on the instance, the
+    classes themselves are left untouched.
+    '''
+
+    def __init__(self):
+        self.stats = {}
+        self._wrapped = []
+
+    def wrap(self, obj, hook: str) -> None:
+        func = getattr(obj, hook)
+        stats = self.stats.get((obj.__class__.__name__, hook))
+        if stats is None:
+            stats = self.stats[(obj.__class__.__name__, hook)] = [0, 0]
+
+        def _profiled(*args, **kwargs):
+            start = ticks_us()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                stats[0] += 1
+                stats[1] += ticks_us_diff(ticks_us(), start)
+
+        setattr(obj, hook, _profiled)
+        self._wrapped.append((obj, hook))
+
+    def unwrap(self) -> None:
+        for obj, hook in self._wrapped:
+            try:
+                delattr(obj, hook)
+            except AttributeError:
+                pass
+        self._wrapped.clear()
+
+    def reset(self) -> None:
+        for stats in self.stats.values():
+            stats[0] = 0
+            stats[1] = 0
+
+    def snapshot(self) -> dict:
+        '''Return a copy of the stats as `{(name, hook): (calls, us)}`.'''
+        return {key: (stats[0], stats[1]) for key, stats in self.stats.items()}
+
+    def report(self) -> str:
+        '''
+        Return one line per profiled hook that has been called, most expensive
+        first: `name.hook n=calls t=total avg=average`, times in us.
+        '''
+        lines = []
+        for (name, hook), (calls, total) in sorted(
+            self.snapshot().items(), key=lambda item: -item[1][1]
+        ):
+            if calls:
+                lines.append(f'{name}.{hook} n={calls} t={total} avg={total // calls}')
+        return '\n'.join(lines)
+
+
+class _Origin:
+    def __init__(self, stamp: int):
+        self.stamp = stamp
+        self.path = ''
+
+
+class LatencyTracer:
+    '''
+    Latency in us from a key event entering the keyboard, or being received by
+    the split transport, until a HID report that reflects it is sent.
+
+    Latencies are recorded per module path, the modules that buffered and
+    resumed the event on its way, e.g. `direct` for events that went straight
+    through, or `HoldTap` for events delayed by a holdtap decision.
+    Events buffered by modules are tracked by their int_coord. Keys emitted by
+    modules without int_coord are attributed to the event being processed at
+    the time, or, from timeouts, to the most recent event.
+    '''
+
+    _RECEIVED_MAX = const(16)
+
+    def __init__(self):
+        self.latency = {}
+        self.current = None
+        self._last = None
+        self._by_coord = {}
+        self._pending = []
+        self._received = []
+
+    def received(self, kevent) -> None:
+        '''Stamp an event that is handed over to the keyboard later on.'''
+        if len(self._received) >= self._RECEIVED_MAX:
+            self._received.pop(0)
+        self._received.append((kevent, ticks_us()))
+
+    def begin(self, kevent, int_coord: int) -> None:
+        stamp = None
+        for idx, (event, received) in enumerate(self._received):
+            if event is kevent:
+                stamp = received
+                del self._received[idx]
+                break
+        if stamp is None:
+            stamp = ticks_us()
+
+        origin = _Origin(stamp)
+        self.current = self._last = self._by_coord[int_coord] = origin
+
+    def resume(self, module, int_coord) -> _Origin:
+        '''Return the origin of a key event resumed by `module`.'''
+        origin = None
+        if int_coord is not None:
+            origin = self._by_coord.get(int_coord)
+        if origin is None:
+            origin = self.current or self._last
+        if origin is not None:
+            name = module.__class__.__name__
+            if not origin.path:
+                origin.path = name
+            elif not origin.path.endswith(name):
+                origin.path = origin.path + '>' + name
+        return origin
+
+    def processed(self, hid_pending: bool) -> None:
+        if hid_pending and self.current and self.current not in self._pending:
+            self._pending.append(self.current)
+
+    def sent(self) -> None:
+        if not self._pending:
+            return
+        now = ticks_us()
+        for origin in self._pending:
+            path = origin.path or 'direct'
+            histogram = self.latency.get(path)
+            if histogram is None:
+                histogram = self.latency[path] = Histogram()
+            histogram.add(ticks_us_diff(now, origin.stamp))
+        self._pending.clear()
+
+    def reset(self) -> None:
+        self.latency.clear()
+
+
+def _callback_name(func) -> str:
+    # Bound methods are named after the class of their instance, which is all
+    # CircuitPython can tell, so that subclasses are told apart on the host as
+    # well.
+    name = getattr(func, '__name__', None)
+    owner = getattr(func, '__self__', None)
+    if owner is not None and name is not None:
+        return owner.__class__.__name__ + '.' + name
+    return getattr(func, '__qualname__', None) or name or type(func).__name__
+
+
+class SchedulerStats:
+    '''
+    Statistics of the scheduler: the number of scheduled tasks and its high
+    water mark, how late tasks run after they're due in ms, and calls, total
+    and maximum duration in us per callback.
+
+    Wraps the task queue of `kmk.scheduler` to keep track of the tasks in it.
+    Callbacks are identified by name, bound methods by their class and method
+    name, e.g. `HoldTap.on_timeout`, so that instances of the same callback
+    aggregate. Lambdas can't be told apart on CircuitPython; timers and
+    periodic tasks should be given bound methods.
+    '''
+
+    def __init__(self, queue):
+        self.queue = queue
+        self._queued = set()
+        self.lateness = Histogram()
+        self.callbacks = {}
+        self.reset()
+
+    def reset(self) -> None:
+        self.max_depth = len(self._queued)
+        self.lateness.reset()
+        self.callbacks.clear()
+
+    @property
+    def depth(self) -> int:
+        return len(self._queued)
+
+    def _queue(self, v) -> None:
+        self._queued.add(v)
+        if len(self._queued) > self.max_depth:
+            self.max_depth = len(self._queued)
+
+    def peek(self):
+        return self.queue.peek()
+
+    def push_sorted(self, v, key=None) -> None:
+        if key is None:
+            self.queue.push_sorted(v)
+        else:
+            self.queue.push_sorted(v, key)
+        self._queue(v)
+
+    def push_head(self, v) -> None:
+        self.queue.push_head(v)
+        self._queue(v)
+
+    def pop_head(self):
+        v = self.queue.pop_head()
+        self._queued.discard(v)
+        return v
+
+    def remove(self, v) -> None:
+        self.queue.remove(v)
+        self._queued.discard(v)
+
+    def begin(self, due: int) -> int:
+        '''Record the lateness of a task due at `due` ticks, and start timing.'''
+        self.lateness.add(ticks_diff(ticks_ms(), due))
+        return ticks_us()
+
+    def end(self, func, start: int) -> None:
+        duration = ticks_us_diff(ticks_us(), start)
+        name = _callback_name(func)
+        stats = self.callbacks.get(name)
+        if stats is None:
+            stats = self.callbacks[name] = [0, 0, 0]
+        stats[0] += 1
+        stats[1] += duration
+        if duration > stats[2]:
+            stats[2] = duration
+
+    def report(self) -> str:
+        '''
+        Return the queue depth and the lateness histogram, followed by one
+        line per callback, most expensive first:
+        `name n=calls t=total avg=average max=maximum`, times in us.
+        '''
+        lines = [
+            f'tasks: depth={self.depth} max={self.max_depth}',
+            f'lateness [ms]: {self.lateness}',
+        ]
+        for name, (calls, total, longest) in sorted(
+            self.callbacks.items(), key=lambda item: -item[1][1]
+        ):
+            lines.append(
+                f'{name} n={calls} t={total} avg={total // calls} max={longest}'
+            )
+        return '\n'.join(lines)
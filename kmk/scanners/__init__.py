@@ -21,6 +21,11 @@ class Scanner:
     # for split keyboards, the offset value will be assigned in Split module
     offset = 0
 
+    # Time in ms the keyboard may idle between two scans. Scanners that queue
+    # events in the background set this to `None` and implement
+    # `has_pending_events` instead.
+    wake_interval = 1
+
     @property
     def coord_mapping(self):
         return tuple(range(self.offset, self.offset + self.key_count))
@@ -36,3 +41,10 @@ class Scanner:
         The key report is a byte array with contents [row, col, True if pressed else False]
         '''
         raise NotImplementedError
+
+    def has_pending_events(self):
+        '''
+        Return True if events are waiting to be picked up by `scan_for_changes`.
+        Only checked while the keyboard is idle.
+        '''
+        return False
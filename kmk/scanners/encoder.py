@@ -5,6 +5,8 @@ from kmk.scanners import Scanner
 
 
 class RotaryioEncoder(Scanner):
+    wake_interval = None
+
     def __init__(self, pin_a, pin_b, divisor=4):
         self.encoder = rotaryio.IncrementalEncoder(pin_a, pin_b, divisor)
         self.position = 0
@@ -15,6 +17,9 @@ class RotaryioEncoder(Scanner):
     def key_count(self):
         return 2
 
+    def has_pending_events(self):
+        return bool(self._queue) or self.encoder.position != self.position
+
     def scan_for_changes(self):
         position = self.encoder.position
 
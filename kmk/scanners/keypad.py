@@ -11,6 +11,8 @@ class KeypadScanner(Scanner):
     :param kp: An instance of the keypad class.
     '''
 
+    wake_interval = None
+
     @property
     def key_count(self):
         return self.keypad.key_count
@@ -26,6 +28,9 @@ class KeypadScanner(Scanner):
             return keypad.Event(ev.key_number + self.offset, ev.pressed)
         return ev
 
+    def has_pending_events(self):
+        return bool(self.keypad.events)
+
 
 class MatrixScanner(KeypadScanner):
     '''
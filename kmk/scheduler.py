@@ -6,7 +6,7 @@ module; it does however implement a pairing-heap for `TaskQueue` in native code.
 '''
 
 try:
-    from typing import Callable
+    from typing import Callable, Optional
 except ImportError:
     pass
 
@@ -15,11 +15,22 @@ from supervisor import ticks_ms
 from _asyncio import Task, TaskQueue
 
 from kmk.kmktime import ticks_add, ticks_diff
+from kmk.utils import Debug
+
+debug = Debug(__name__)
 
 _task_queue = TaskQueue()
+_stats = None
+_stats_dump = None
 
 
 class PeriodicTaskMeta:
+    '''
+    A task that runs every `period` ms at a fixed rate, for services that poll
+    peripherals or advance animations. Between ticks, it costs nothing.
+    The period may be changed at any time and applies from the next tick on.
+    '''
+
     def __init__(self, func: Callable[[None], None], period: int) -> None:
         self._task = Task(self.call)
         self._coro = func
@@ -27,6 +38,11 @@ class PeriodicTaskMeta:
 
     def call(self) -> None:
         after_ms = ticks_add(self._task.ph_key, self.period)
+        # Ticks missed while the keyboard was busy are skipped, not caught up
+        # on in a burst.
+        now = ticks_ms()
+        if ticks_diff(after_ms, now) <= 0:
+            after_ms = ticks_add(now, self.period)
         _task_queue.push_sorted(self._task, after_ms)
         self._coro()
 
@@ -34,13 +50,53 @@ class PeriodicTaskMeta:
         _task_queue.push_sorted(self._task)
 
 
+class Timer:
+    '''
+    A one-shot timeout that can be re-armed any number of times. The task is
+    allocated once; arming and cancelling the timer doesn't allocate, which
+    keeps timeouts that are set on every key event from churning the heap.
+
+    `func` is called with `args` on expiry. Pass a bound method and its
+    arguments rather than a lambda, so that scheduler statistics can tell
+    timers apart by name.
+    '''
+
+    def __init__(self, func: Callable[..., None], *args) -> None:
+        self._task = Task(self.call)
+        self._func = func
+        self._args = args
+        self.armed = False
+
+    def call(self) -> None:
+        self.armed = False
+        self._func(*self._args)
+
+    def rearm(self, after_ms: int) -> None:
+        '''(Re)start the timer to expire after `after_ms` ms.'''
+        if self.armed:
+            _task_queue.remove(self._task)
+        self.armed = True
+        if after_ms > 0:
+            _task_queue.push_sorted(self._task, ticks_add(ticks_ms(), after_ms))
+        else:
+            _task_queue.push_head(self._task)
+
+    def cancel(self) -> None:
+        if self.armed:
+            self.armed = False
+            _task_queue.remove(self._task)
+
+
 def create_task(
-    func: [Callable[[None], None], Task, PeriodicTaskMeta],
+    func: [Callable[[None], None], Task, PeriodicTaskMeta, Timer],
     *,
     after_ms: int = 0,
     period_ms: int = 0,
-) -> [Task, PeriodicTaskMeta]:
-    if isinstance(func, Task):
+) -> [Task, PeriodicTaskMeta, Timer]:
+    if isinstance(func, Timer):
+        func.rearm(after_ms)
+        return func
+    elif isinstance(func, Task):
         t = r = func
     elif isinstance(func, PeriodicTaskMeta):
         r = func
@@ -66,10 +122,107 @@ def get_due_task() -> [Callable, None]:
         if not t or ticks_diff(t.ph_key, now) > 0:
             break
         _task_queue.pop_head()
-        yield t.coro
+        if _stats is None:
+            yield t.coro
+        else:
+            start = _stats.begin(t.ph_key)
+            yield t.coro
+            _stats.end(_callback(t.coro), start)
+
+
+def get_due_ms() -> Optional[int]:
+    '''
+    Return the time in ms until the next task is due, or `None` if no task is
+    scheduled.
+    '''
+    t = _task_queue.peek()
+    if not t:
+        return None
+    return ticks_diff(t.ph_key, ticks_ms())
+
+
+def set_task_queue(queue) -> None:
+    '''
+    Replace the task queue, e.g. by a `kmk.timer_wheel.TimerWheel`. Tasks that
+    are scheduled already are moved over.
+    '''
+    global _task_queue
+
+    tasks = []
+    t = _task_queue.peek()
+    while t:
+        _task_queue.pop_head()
+        tasks.append(t)
+        t = _task_queue.peek()
+
+    # Drained first: the new queue may wrap the old one.
+    _task_queue = queue
+    for t in tasks:
+        queue.push_sorted(t, t.ph_key)
 
 
-def cancel_task(t: [Task, PeriodicTaskMeta]) -> None:
-    if isinstance(t, PeriodicTaskMeta):
+def cancel_task(t: [Task, PeriodicTaskMeta, Timer]) -> None:
+    if isinstance(t, Timer):
+        t.cancel()
+        return
+    elif isinstance(t, PeriodicTaskMeta):
         t = t._task
     _task_queue.remove(t)
+
+
+def _callback(func: Callable[[None], None]) -> Callable[[None], None]:
+    # Attribute timers and periodic tasks to the function they call.
+    owner = getattr(func, '__self__', None)
+    if isinstance(owner, Timer):
+        return owner._func
+    if isinstance(owner, PeriodicTaskMeta):
+        return owner._coro
+    return func
+
+
+def enable_stats(enabled: bool = True, dump_period_ms: int = 0) -> None:
+    '''
+    Record the task queue depth, the lateness of tasks, and the cost of every
+    callback in a `kmk.profiler.SchedulerStats`, available from `get_stats()`.
+    With `dump_period_ms`, the stats are periodically written to the debug
+    output.
+
+    The stats wrap the task queue; disabled, only a check per due task
+    remains.
+    '''
+    global _stats, _stats_dump
+
+    if _stats_dump is not None:
+        cancel_task(_stats_dump)
+        _stats_dump = None
+
+    if _stats is not None:
+        stats = _stats
+        _stats = None
+        set_task_queue(stats.queue)
+
+    if not enabled:
+        return
+
+    from kmk.profiler import SchedulerStats
+
+    stats = SchedulerStats(_task_queue)
+    set_task_queue(stats)
+    _stats = stats
+
+    if dump_period_ms:
+        _stats_dump = create_task(
+            dump_stats, after_ms=dump_period_ms, period_ms=dump_period_ms
+        )
+
+
+def get_stats():
+    '''Return the `kmk.profiler.SchedulerStats`, or `None` if disabled.'''
+    return _stats
+
+
+def dump_stats() -> None:
+    if not (_stats and debug.enabled):
+        return
+    for line in _stats.report().split('\n'):
+        debug(line)
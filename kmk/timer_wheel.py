@@ -0,0 +1,101 @@
+'''
+A hashed timing wheel, as alternative task queue for `kmk.scheduler`.
+
+Tasks are hashed into millisecond buckets by the tick they're due. Scheduling
+and cancelling a task costs the same regardless of how many tasks are
+scheduled, which suits many short timeouts that are mostly cancelled before
+they expire, like those of combos. Tasks due more than one revolution ahead
+share buckets with earlier ones.
+
+Finding the next task once the first one is due scans the buckets ahead of it,
+up to one revolution. If no task is due within that revolution, which happens
+with long timeouts, or if tasks are run more than one revolution late, it scans
+all buckets and all tasks in them instead: the cost is proportional to the
+wheel size plus the number of scheduled tasks.
+
+Select it at boot, before the keyboard is started:
+```python
+from kmk.scheduler import set_task_queue
+from kmk.timer_wheel import TimerWheel
+
+set_task_queue(TimerWheel())
+```
+'''
+
+from micropython import const
+from supervisor import ticks_ms
+
+from kmk.kmktime import ticks_add, ticks_diff
+
+_SIZE = const(64)
+
+
+class TimerWheel:
+    '''
+    Drop-in replacement for the `TaskQueue` of `_asyncio`. `size` is the
+    number of buckets and must be a power of two; tasks due further out than
+    `size` ms share buckets with earlier ones.
+    '''
+
+    def __init__(self, size: int = _SIZE) -> None:
+        self._mask = size - 1
+        self._buckets = [[] for _ in range(size)]
+        self._head = None
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def peek(self):
+        return self._head
+
+    def push_sorted(self, v, key=None) -> None:
+        if key is None:
+            key = ticks_ms()
+        v.data = None
+        v.ph_key = key
+        self._buckets[key & self._mask].append(v)
+        self._count += 1
+        if self._head is None or ticks_diff(key, self._head.ph_key) < 0:
+            self._head = v
+
+    def push_head(self, v) -> None:
+        self.push_sorted(v, ticks_ms())
+
+    def pop_head(self):
+        v = self._head
+        self._buckets[v.ph_key & self._mask].remove(v)
+        self._count -= 1
+        self._head = self._find_head(v.ph_key)
+        return v
+
+    def remove(self, v) -> None:
+        try:
+            self._buckets[v.ph_key & self._mask].remove(v)
+        except ValueError:
+            # Not scheduled.
+            return
+        self._count -= 1
+        if v is self._head:
+            self._head = self._find_head(v.ph_key)
+
+    def _find_head(self, start: int):
+        # No task is due before `start`. Tasks with equal keys are kept in
+        # the order they were scheduled in, like the pairing heap does.
+        if not self._count:
+            return None
+
+        mask = self._mask
+        for offset in range(mask + 1):
+            key = ticks_add(start, offset)
+            for t in self._buckets[key & mask]:
+                if t.ph_key == key:
+                    return t
+
+        # Only tasks more than one revolution ahead are left.
+        head = None
+        for bucket in self._buckets:
+            for t in bucket:
+                if head is None or ticks_diff(t.ph_key, head.ph_key) < 0:
+                    head = t
+        return head
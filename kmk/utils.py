@@ -5,6 +5,7 @@ except ImportError:
 
 from supervisor import ticks_ms
 
+from array import array
 from usb_cdc import console
 
 
@@ -12,6 +13,91 @@ def clamp(x: int, bottom: int = 0, top: int = 100) -> int:
     return min(max(bottom, x), top)
 
 
+class RingBuffer:
+    '''
+    Fixed capacity double ended queue.
+
+    Items are stored in a preallocated list, or in an array of the given
+    typecode if items are integers, e.g. packed key events. Nothing is
+    allocated on push or pop, and pushing to a full buffer drops the new item
+    and increments `overflow` instead of growing the buffer.
+    '''
+
+    def __init__(self, size: int, typecode: Optional[str] = None):
+        # References held by a list are released on pop, so that they can be
+        # garbage collected.
+        self._objects = typecode is None
+        if self._objects:
+            self._buffer = [None] * size
+        else:
+            self._buffer = array(typecode, (0 for _ in range(size)))
+        self._size = size
+        self._head = 0
+        self._len = 0
+        self.overflow = 0
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __bool__(self) -> bool:
+        return self._len > 0
+
+    def __getitem__(self, idx: int):
+        if idx < 0:
+            idx += self._len
+        if not 0 <= idx < self._len:
+            raise IndexError('RingBuffer index out of range')
+        return self._buffer[(self._head + idx) % self._size]
+
+    def __iter__(self):
+        for idx in range(self._len):
+            yield self._buffer[(self._head + idx) % self._size]
+
+    def append(self, item) -> bool:
+        if self._len >= self._size:
+            self.overflow += 1
+            return False
+        self._buffer[(self._head + self._len) % self._size] = item
+        self._len += 1
+        return True
+
+    def appendleft(self, item) -> bool:
+        if self._len >= self._size:
+            self.overflow += 1
+            return False
+        self._head = (self._head - 1) % self._size
+        self._buffer[self._head] = item
+        self._len += 1
+        return True
+
+    def pop(self):
+        if not self._len:
+            raise IndexError('pop from empty RingBuffer')
+        self._len -= 1
+        idx = (self._head + self._len) % self._size
+        item = self._buffer[idx]
+        if self._objects:
+            self._buffer[idx] = None
+        return item
+
+    def popleft(self):
+        if not self._len:
+            raise IndexError('pop from empty RingBuffer')
+        item = self._buffer[self._head]
+        if self._objects:
+            self._buffer[self._head] = None
+        self._head = (self._head + 1) % self._size
+        self._len -= 1
+        return item
+
+    def clear(self) -> None:
+        if self._objects:
+            while self._len:
+                self.pop()
+        self._head = 0
+        self._len = 0
+
+
 _debug_enabled = None
 
 
@@ -1,4 +1,3 @@
-import time
 from unittest.mock import Mock, patch
 
 from kmk import scheduler
@@ -7,6 +6,7 @@ from kmk.keys import KC, ModifierKey
 from kmk.kmk_keyboard import KMKKeyboard
 from kmk.scanners import DiodeOrientation
 from kmk.scanners.digitalio import MatrixScanner
+from tests.mocks import clock
 
 
 class DigitalInOut(Mock):
@@ -25,6 +25,7 @@ def code2name(code):
 
 class KeyboardTest:
     loop_delay_ms = 2
+    max_settle_cycles = 10_000
 
     def __init__(
         self,
@@ -71,8 +72,8 @@ class KeyboardTest:
         self.keyboard._main_loop()
         for e in key_events:
             if isinstance(e, int):
-                starttime_ms = time.time_ns() // 1_000_000
-                while time.time_ns() // 1_000_000 - starttime_ms < e:
+                until = clock.now + e
+                while clock.now < until:
                     self.do_main_loop()
             else:
                 key_pos = e[0]
@@ -80,13 +81,24 @@ class KeyboardTest:
                 self.pins[key_pos].value = is_pressed
                 self.do_main_loop()
 
-        # wait up to 10s for delayed actions to resolve, if there are any
-        timeout = time.time_ns() + 10 * 1_000_000_000
-        while timeout > time.time_ns():
-            self.do_main_loop()
-            if not scheduler._task_queue.peek() and not self.keyboard._resume_buffer:
+        # wait up to 10s for delayed actions to resolve, if there are any,
+        # skipping ahead to the next deadline. Resumed events and tasks that
+        # are due right away don't advance the clock, so the number of cycles
+        # is capped as well.
+        timeout = clock.now + 10_000
+        cycles = 0
+        while timeout > clock.now and cycles < self.max_settle_cycles:
+            cycles += 1
+            self.keyboard._main_loop()
+            if self.keyboard._resume_buffer:
+                continue
+            due = scheduler.get_due_ms()
+            if due is None:
                 break
-        assert timeout > time.time_ns(), 'infinite loop detected'
+            clock.advance(max(due, 0))
+        assert (
+            timeout > clock.now and cycles < self.max_settle_cycles
+        ), 'infinite loop detected'
 
         matching = True
         for i in range(max(len(hid_reports), len(assert_reports))):
@@ -133,4 +145,4 @@ class KeyboardTest:
 
     def do_main_loop(self):
         self.keyboard._main_loop()
-        time.sleep(self.loop_delay_ms / 1000)
+        clock.advance(self.loop_delay_ms)
@@ -1,5 +1,5 @@
+import os
 import sys
-import time
 from unittest.mock import Mock
 
 
@@ -9,8 +9,35 @@ class KeyEvent:
         self.pressed = pressed
 
 
+class VirtualClock:
+    '''
+    Simulated time for the host.
+
+    `supervisor.ticks_ms` is backed by the virtual clock, and with it the
+    scheduler, `kmk.kmktime` and everything else that reads the time. Time only
+    passes when it's advanced explicitly, which makes timing dependent tests
+    deterministic and lets them skip straight to the next deadline.
+    '''
+
+    def __init__(self, now=0):
+        self.now = now
+
+    def ticks_ms(self):
+        return self.now % (1 << 29)
+
+    def advance(self, ms):
+        self.now += ms
+
+    def sleep(self, seconds):
+        '''Drop-in replacement for `time.sleep`.'''
+        self.advance(round(seconds * 1000))
+
+
+clock = VirtualClock()
+
+
 def ticks_ms():
-    return (time.time_ns() // 1_000_000) % (1 << 29)
+    return clock.ticks_ms()
 
 
 def init_circuit_python_modules_mocks():
@@ -18,6 +45,7 @@ def init_circuit_python_modules_mocks():
     sys.modules['digitalio'] = Mock()
     sys.modules['neopixel'] = Mock()
     sys.modules['pulseio'] = Mock()
+    sys.modules['pwmio'] = Mock()
     sys.modules['busio'] = Mock()
     sys.modules['microcontroller'] = Mock()
     sys.modules['board'] = Mock()
@@ -37,6 +65,19 @@ def init_circuit_python_modules_mocks():
     sys.modules['supervisor'].ticks_ms = ticks_ms
     sys.modules['usb_cdc'] = Mock()
 
-    from . import task
+    # `KC.MACRO_SLEEP_MS` blocks within a sequence: pass virtual time instead.
+    from kmk.handlers import stock
+
+    stock.sleep = clock.sleep
+
+    # See `tests/task_heapq.py` for the choice of task queues.
+    queue = os.environ.get('KMK_TASK_QUEUE')
+    if queue:
+        from . import task_heapq
+
+        task_heapq.select(queue)
+        sys.modules['_asyncio'] = task_heapq
+    else:
+        from . import task
 
-    sys.modules['_asyncio'] = task
+        sys.modules['_asyncio'] = task
@@ -0,0 +1,134 @@
+'''
+Host stand-in for the `TaskQueue` of `_asyncio`, on `heapq`.
+
+`tests/task.py` is a port of the pairing heap of CircuitPython, in Python,
+comparing wrapping tick counts throughout. This queue keeps the same interface
+but orders tasks by unwrapped virtual time from `tests.mocks.clock`, as plain
+integer tuples, and cancels tasks by lazy deletion. It's intended for
+simulations and benchmarks, where the scheduler shouldn't dominate run time.
+
+Select a queue with the `KMK_TASK_QUEUE` environment variable:
+- unset or `pairing`: the reference pairing heap of `tests/task.py`,
+- `heapq`: this queue,
+- `check`: both, asserting after every operation that they agree.
+'''
+import heapq
+
+from kmk.kmktime import ticks_diff
+from tests.mocks import clock
+from tests.task import Task  # noqa: F401
+from tests.task import TaskQueue as PairingTaskQueue
+
+
+class HeapTaskQueue:
+    def __init__(self):
+        self._heap = []
+        self._entries = {}
+        self._seq = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _clean(self):
+        heap = self._heap
+        while heap and heap[0][2] is None:
+            heapq.heappop(heap)
+
+    def peek(self):
+        self._clean()
+        return self._heap[0][2] if self._heap else None
+
+    def push_sorted(self, v, key=None):
+        if key is None:
+            key = clock.ticks_ms()
+        self.remove(v)
+        v.data = None
+        v.ph_key = key
+        # Unwrap the tick count relative to the current virtual time. Ties are
+        # resolved in insertion order, like the pairing heap does.
+        entry = [clock.now + ticks_diff(key, clock.ticks_ms()), self._seq, v]
+        self._seq += 1
+        self._entries[v] = entry
+        heapq.heappush(self._heap, entry)
+
+    def push_head(self, v):
+        self.push_sorted(v, clock.ticks_ms())
+
+    def pop_head(self):
+        self._clean()
+        v = heapq.heappop(self._heap)[2]
+        del self._entries[v]
+        return v
+
+    def remove(self, v):
+        entry = self._entries.pop(v, None)
+        if entry is None:
+            return
+        entry[2] = None
+        # Compact once most of the heap is cancelled entries.
+        if len(self._heap) > 2 * len(self._entries) + 16:
+            self._heap = [e for e in self._heap if e[2] is not None]
+            heapq.heapify(self._heap)
+
+
+class CheckedTaskQueue:
+    '''
+    Run the heap and the reference pairing heap side by side, and fail on the
+    first operation they disagree on.
+    '''
+
+    def __init__(self):
+        self._heap = HeapTaskQueue()
+        self._reference = PairingTaskQueue()
+        self._queued = set()
+
+    def _check(self):
+        v = self._heap.peek()
+        ref = self._reference.peek()
+        assert v is ref, f'task queues disagree: heapq {v!r} != pairing {ref!r}'
+        return v
+
+    def peek(self):
+        return self._check()
+
+    def push_sorted(self, v, key=None):
+        if key is None:
+            key = clock.ticks_ms()
+        assert v not in self._queued, f'{v!r} is already scheduled'
+        self._queued.add(v)
+        self._heap.push_sorted(v, key)
+        self._reference.push_sorted(v, key)
+        self._check()
+
+    def push_head(self, v):
+        self.push_sorted(v, clock.ticks_ms())
+
+    def pop_head(self):
+        self._check()
+        v = self._heap.pop_head()
+        self._reference.pop_head()
+        self._queued.discard(v)
+        self._check()
+        return v
+
+    def remove(self, v):
+        self._heap.remove(v)
+        if v in self._queued:
+            # The pairing heap doesn't support removing tasks that aren't
+            # scheduled.
+            self._reference.remove(v)
+            self._queued.discard(v)
+        self._check()
+
+
+TaskQueue = PairingTaskQueue
+
+
+def select(name):
+    '''Select the `TaskQueue` that's exported, by name.'''
+    global TaskQueue
+    TaskQueue = {
+        'pairing': PairingTaskQueue,
+        'heapq': HeapTaskQueue,
+        'check': CheckedTaskQueue,
+    }[name]
@@ -1,7 +1,7 @@
 import unittest
 
 from kmk.keys import KC
-from kmk.modules.combos import Chord, Combo, Combos, Sequence
+from kmk.modules.combos import Chord, Combo, Combos, Sequence, _ComboState
 from kmk.modules.layers import Layers
 from tests.keyboard_test import KeyboardTest
 
@@ -541,5 +541,114 @@ class TestCombo(unittest.TestCase):
         )
 
 
+class TestComboIndex(unittest.TestCase):
+    def test_candidates(self):
+        combo = Chord((KC.A, KC.B), KC.X)
+        others = [Chord((KC.C, KC[f'F{n}']), KC.Z) for n in range(1, 25)]
+        combos = Combos([combo, Chord((KC.C, KC.D), KC.Y)] + others)
+        keyboard = KeyboardTest(
+            [combos], [[KC.A, KC.B, KC.C, KC.D, KC.E]], debug_enabled=False
+        )
+        t_within = Combo.timeout // 2
+        t_after = 2 * Combo.timeout
+
+        # Only combos that contain the pressed key take part in matching.
+        keyboard.pins[0].value = True
+        keyboard.do_main_loop()
+        self.assertEqual(combos.count_matching(), 1)
+        self.assertEqual(combos._pending, [combo])
+        for other in others:
+            self.assertEqual(other._state, _ComboState.RESET)
+            self.assertFalse(other._timer.armed)
+        keyboard.pins[0].value = False
+        keyboard.do_main_loop()
+        keyboard.do_main_loop()
+
+        # The other combos are idle until their timeout expires.
+        keyboard.test(
+            'no match: idle after unrelated key',
+            [(4, True), t_within, (2, True), (3, True), (2, False), (3, False)],
+            [{KC.E}, {KC.E, KC.C}, {KC.E, KC.C, KC.D}, {KC.E, KC.D}, {KC.E}],
+        )
+        keyboard.test(
+            'match: after unrelated key, after timeout',
+            [t_after, (2, True), (3, True), (2, False), (3, False), (4, False)],
+            [{KC.E, KC.Y}, {KC.E}, {}],
+        )
+
+
+class TestCoordChords(unittest.TestCase):
+    def setUp(self):
+        self.combos = Combos(
+            [
+                Chord((0, 1), KC.X, match_coord=True),
+                Chord((0, 1, 2), KC.Y, match_coord=True),
+                Chord((2, 3), KC.Z, match_coord=True),
+            ]
+        )
+        self.keyboard = KeyboardTest(
+            [self.combos], [[KC.A, KC.B, KC.C, KC.D]], debug_enabled=False
+        )
+        self.t_within = Combo.timeout // 2
+        self.t_after = 2 * Combo.timeout
+
+    def test_bitmasks(self):
+        # Coordinates get bits in order of first use.
+        first, longest, _ = self.combos.combos
+        self.assertEqual(first._mask, 0b11)
+        self.assertEqual(longest._mask, 0b111)
+        self.keyboard.pins[1].value = True
+        self.keyboard.do_main_loop()
+        self.assertEqual(longest._remaining, 0b101)
+        self.assertEqual(longest.matched(), 1)
+        self.keyboard.pins[1].value = False
+        self.keyboard.do_main_loop()
+
+    def test_chord(self):
+        keyboard = self.keyboard
+        t_within = self.t_within
+        t_after = self.t_after
+
+        keyboard.test(
+            'no match: coordinate 0 missing',
+            [t_after, (1, True), (1, False), t_after],
+            [{KC.B}, {}],
+        )
+
+        keyboard.test(
+            'match: longest chord',
+            [(1, True), t_within, (2, True), (0, True), (0, False)],
+            [{KC.Y}, {}],
+        )
+        keyboard.test(
+            'match: repeat longest chord',
+            [(0, True), (0, False), (1, False), (2, False), t_after],
+            [{KC.Y}, {}],
+        )
+
+        keyboard.test(
+            'match: shorter chord, after timeout',
+            [(0, True), (1, True), t_after, (0, False), (1, False), t_after],
+            [{KC.X}, {}],
+        )
+
+
+class TestKeyBufferOverflow(unittest.TestCase):
+    def test_sequence(self):
+        # A sequence longer than fits into the key buffer, as presses and
+        # releases, is abandoned instead of dropping key events.
+        KC.clear()
+        combos = Combos([Sequence((KC.A,) * 20, KC.X, timeout=100)])
+        keyboard = KeyboardTest([combos], [[KC.A, KC.B]], debug_enabled=False)
+
+        keyboard.test(
+            'no match: key buffer overflow',
+            [(0, True), (0, False)] * 20 + [200],
+            [{KC.A}, {}] * 20,
+        )
+        self.assertFalse(combos._key_buffer)
+        self.assertEqual(combos.count_matching(), 0)
+
+
 if __name__ == '__main__':
     unittest.main()
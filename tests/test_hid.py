@@ -0,0 +1,266 @@
+import unittest
+from unittest.mock import Mock, patch
+
+from kmk.hid import BLEHID, AbstractHID, HIDReportTypes, HIDUsage, HIDUsagePage
+from kmk.keys import AX, KC, ConsumerKey
+from tests.mocks import clock
+
+
+class TestReportScheduler(unittest.TestCase):
+    def setUp(self):
+        self.hid = AbstractHID(poll_interval_ms=8)
+        self.reports = []
+        self.hid.hid_send = lambda report: self.reports.append(bytes(report))
+
+    def send(self, *keys, axes=()):
+        self.hid.create_report(keys, axes)
+        self.hid.send()
+
+    def keys(self):
+        return [
+            {code for code in report[3:] if code}
+            for report in self.reports
+            if report[0] == 1
+        ]
+
+    def test_coalesce(self):
+        self.send(KC.A)
+        self.send(KC.A, KC.B)
+        self.send(KC.A, KC.B, KC.C)
+        self.assertEqual(self.keys(), [{KC.A.code}])
+        self.assertEqual(self.hid.due_ms(), 8)
+
+        clock.advance(8)
+        self.assertTrue(self.hid.poll())
+        self.assertFalse(self.hid.dirty)
+        self.assertEqual(self.keys(), [{KC.A.code}, {KC.A.code, KC.B.code, KC.C.code}])
+
+    def test_no_lost_tap(self):
+        self.send(KC.A)
+        self.send(KC.A, KC.B)
+        self.send(KC.A)
+        self.send()
+        self.send(KC.LSFT)
+        self.send()
+        for _ in range(4):
+            clock.advance(8)
+            self.hid.poll()
+        self.assertFalse(self.hid.dirty)
+        # Releasing A and B and pressing LSFT is coalesced, tapping LSFT isn't.
+        self.assertEqual(
+            self.keys(), [{KC.A.code}, {KC.A.code, KC.B.code}, set(), set()]
+        )
+        self.assertEqual([report[1] for report in self.reports], [0, 0, 2, 0])
+
+    def test_consumer(self):
+        volu = ConsumerKey(0xE9)
+        self.send(KC.A)
+        self.send(volu)
+        self.send()
+        clock.advance(8)
+        self.hid.poll()
+        clock.advance(8)
+        self.hid.poll()
+        self.assertFalse(self.hid.dirty)
+        self.assertEqual(
+            self.reports[1:],
+            [b'\x03\xe9\x00', b'\x01' + bytes(7), b'\x03\x00\x00'],
+        )
+
+    def test_mouse_motion(self):
+        AX.X.delta = 0
+        for _ in range(4):
+            AX.X.move(self, 50)
+            self.send(axes=(AX.X,))
+        # Motion is merged up to the maximum of a report, the rest stays with
+        # the axis.
+        self.assertEqual(AX.X.delta, 23)
+        for _ in range(2):
+            clock.advance(8)
+            self.send(axes=(AX.X,))
+        motion = [report[2] for report in self.reports if report[0] == 2]
+        self.assertEqual(motion, [50, 127, 23])
+        self.assertEqual(AX.X.delta, 0)
+
+        # Nothing to report.
+        self.send()
+        clock.advance(8)
+        self.assertFalse(self.hid.poll())
+
+    def test_mouse_fractions(self):
+        AX.X.delta = 0
+        self.hid.poll_interval_ms = 0
+        for _ in range(4):
+            AX.X.move(self, 0.375)
+            self.send(axes=(AX.X,))
+        motion = [report[2] for report in self.reports if report[0] == 2]
+        self.assertEqual(motion, [1])
+        self.assertEqual(AX.X.delta, 0.5)
+        AX.X.delta = 0
+
+    def test_flush(self):
+        self.send(KC.A)
+        self.send()
+        self.send(KC.A)
+        self.send(KC.B)
+        self.hid.flush()
+        self.assertFalse(self.hid.dirty)
+        self.assertEqual(self.keys(), [{KC.A.code}, set(), {KC.A.code}, {KC.B.code}])
+
+    # Minimal keyboard interface for `Axis.move`.
+    axes = set()
+    hid_pending = False
+
+
+class TestIncrementalReport(unittest.TestCase):
+    def setUp(self):
+        self.hid = AbstractHID()
+        self.rebuilt = AbstractHID()
+
+    def check(self, keys_pressed):
+        self.rebuilt.create_report(keys_pressed, ())
+        self.assertEqual(self.hid.report_mods[0], self.rebuilt.report_mods[0])
+        self.assertEqual(
+            {code for code in self.hid.report_non_mods if code},
+            {code for code in self.rebuilt.report_non_mods if code},
+        )
+        self.assertEqual(self.hid._cc_report, self.rebuilt._cc_report)
+
+    def test_matches_rebuild(self):
+        volu = ConsumerKey(0xE9)
+        shifted_a = KC.LSFT(KC.A)
+        keys_pressed = set()
+        for key, is_pressed in (
+            (KC.A, True),
+            (shifted_a, True),
+            (KC.LSFT, True),
+            (volu, True),
+            (KC.A, False),
+            (shifted_a, False),
+            (KC.MEH, True),
+            (KC.LSFT, False),
+            (volu, False),
+            (KC.MEH, False),
+        ):
+            if is_pressed:
+                keys_pressed.add(key)
+            else:
+                keys_pressed.discard(key)
+            self.hid.report_key(key, is_pressed)
+            self.check(keys_pressed)
+
+    def test_shared_code(self):
+        shifted_a = KC.LSFT(KC.A)
+        self.hid.report_key(KC.A, True)
+        self.hid.report_key(shifted_a, True)
+        self.hid.report_key(shifted_a, False)
+        self.assertTrue(self.hid.has_key(KC.A))
+        self.assertFalse(self.hid.has_key(KC.LSFT))
+        self.hid.report_key(KC.A, False)
+        self.assertFalse(self.hid.has_key(KC.A))
+
+    def test_has_key(self):
+        volu = ConsumerKey(0xE9)
+        self.hid.report_key(volu, True)
+        self.hid.report_key(KC.LCTL, True)
+        self.hid.report_key(KC.NO, True)
+        self.assertTrue(self.hid.has_key(volu))
+        self.assertTrue(self.hid.has_key(KC.LCTL))
+        self.assertFalse(self.hid.has_key(KC.LSFT))
+        self.assertFalse(self.hid.has_key(KC.NO))
+
+    def test_6kro_overflow(self):
+        # The abstract keyboard report has 5 key slots.
+        for key in [KC[c] for c in 'ABCDEFG']:
+            self.hid.report_key(key, True)
+        self.assertEqual(self.hid.overflow, 2)
+        self.assertTrue(self.hid.has_key(KC.E))
+        self.assertFalse(self.hid.has_key(KC.F))
+
+        # Overflowing keys take the freed slots in order, or are dropped if
+        # they're released before that.
+        self.hid.report_key(KC.G, False)
+        self.hid.report_key(KC.B, False)
+        self.assertTrue(self.hid.has_key(KC.F))
+        self.hid.report_key(KC.C, False)
+        self.assertEqual(
+            {code for code in self.hid.report_non_mods if code},
+            {KC[c].code for c in 'ADEF'},
+        )
+
+
+class BLEDevice:
+    def __init__(self, usage_page, usage, size):
+        self.usage_page = usage_page
+        self.usage = usage
+        self._characteristic = Mock(value=bytes(size))
+        self.reports = []
+
+    def send_report(self, report):
+        self.reports.append(bytes(report))
+
+
+class TestBLEHID(unittest.TestCase):
+    def setUp(self):
+        self.keyboard = BLEDevice(HIDUsagePage.KEYBOARD, HIDUsage.KEYBOARD, 8)
+        self.consumer = BLEDevice(HIDUsagePage.CONSUMER, HIDUsage.CONSUMER, 2)
+        self.service = Mock(devices=[self.keyboard, self.consumer, object()])
+        self.radio = Mock(connected=False, advertising=False, connections=())
+
+        for name, value in (
+            ('BLERadio', Mock(return_value=self.radio)),
+            ('HIDService', Mock(return_value=self.service)),
+            ('ProvideServicesAdvertisement', Mock()),
+        ):
+            patcher = patch(f'kmk.hid.{name}', value, create=True)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.hid = BLEHID(ble_name='test')
+
+    def connect(self, interval=7.5):
+        self.radio.connected = True
+        self.radio.connections = (Mock(connection_interval=interval),)
+
+    def test_device_cache(self):
+        self.connect()
+        self.hid.report_key(KC.A, True)
+        self.hid.report_key(ConsumerKey(0xE9), True)
+        self.hid.send()
+        report = self.hid._reports[HIDReportTypes.KEYBOARD]
+        self.assertEqual(self.hid.poll_interval(), 7)
+
+        # The device map isn't rebuilt while connected, not even while
+        # advertising for another host.
+        self.service.devices = []
+        self.hid.start_advertising()
+        self.hid.report_key(KC.A, False)
+        self.hid.send().flush()
+
+        self.assertEqual(self.keyboard.reports, [b'\x00\x00\x04' + bytes(5), bytes(8)])
+        self.assertEqual(self.consumer.reports, [b'\xe9\x00'])
+        self.assertIs(self.hid._reports[HIDReportTypes.KEYBOARD], report)
+        self.assertEqual(self.hid.poll_interval(), 7)
+
+        # Reconnecting does.
+        self.radio.connected = False
+        self.assertEqual(self.hid.devices, {})
+        self.connect(15)
+        self.assertEqual(self.hid.devices, {})
+        self.assertEqual(self.hid.poll_interval(), 15)
+
+    def test_poll_interval(self):
+        self.assertEqual(self.hid.poll_interval(), 0)
+        self.connect(30)
+        self.assertEqual(self.hid.poll_interval(), 30)
+
+        # Renegotiated by the host while connected.
+        self.radio.connections[0].connection_interval = 11.25
+        self.assertEqual(self.hid.poll_interval(), 11)
+
+        self.hid.poll_interval_ms = 2
+        self.assertEqual(self.hid.poll_interval(), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import io
+import unittest
+
+from benchmarks.hid_log import RecordingHID, diff, read_log
+from kmk.hid import HIDReportTypes
+from tests.mocks import clock
+
+KEYBOARD = HIDReportTypes.KEYBOARD
+
+
+class TestHIDLog(unittest.TestCase):
+    def record(self, reports):
+        stream = io.BytesIO()
+        hid = RecordingHID(stream)
+        for delay, report in reports:
+            clock.advance(delay)
+            hid.hid_send(bytes((KEYBOARD,)) + report)
+        stream.seek(0)
+        return list(read_log(stream))
+
+    def test_round_trip(self):
+        a = bytes((0, 0, 4, 0, 0, 0, 0, 0))
+        records = self.record([(0, a), (8, bytes(8))])
+        self.assertEqual(records, [(0, KEYBOARD, a), (8, KEYBOARD, bytes(8))])
+
+    def test_bad_header(self):
+        with self.assertRaises(ValueError):
+            list(read_log(io.BytesIO(b'KMKHIX\x01')))
+        with self.assertRaises(ValueError):
+            list(read_log(io.BytesIO(b'KMKHID\x02')))
+
+    def test_diff(self):
+        a = bytes((0, 0, 4, 0, 0, 0, 0, 0))
+        b = bytes((0, 0, 5, 0, 0, 0, 0, 0))
+        old = self.record([(0, a), (8, bytes(8))])
+
+        self.assertEqual(diff(old, self.record([(0, a), (8, bytes(8))])), [])
+
+        self.assertEqual(
+            diff(old, self.record([(0, a), (10, bytes(8))])),
+            [
+                'duration: 8 -> 10',
+                'delay_avg: 8.0 -> 10.0',
+                'delay_max: 8 -> 10',
+                'max timing shift: +2ms at report 1',
+            ],
+        )
+
+        self.assertEqual(
+            diff(old, self.record([(0, b), (8, bytes(8))])),
+            ['report 0 differs: 0ms 1:0000040000000000 -> 0ms 1:0000050000000000'],
+        )
+
+        self.assertEqual(
+            diff(old, self.record([(0, a)])),
+            [
+                'reports: 2 -> 1',
+                'types: {1: 2} -> {1: 1}',
+                'duration: 8 -> 0',
+                'delay_avg: 8.0 -> 0',
+                'delay_max: 8 -> 0',
+                'report 1 missing',
+            ],
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
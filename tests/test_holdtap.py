@@ -363,3 +363,18 @@ class TestHoldTap(unittest.TestCase):
             [(2, True), (2, False), (2, True), t_after, (2, False)],
             [{KC.A}, {}, {KC.B}, {}],
         )
+
+    def test_key_buffer_overflow(self):
+        # More interrupting key events than fit into the key buffer resolve the
+        # hold-tap as a hold instead of dropping them.
+        keyboard = KeyboardTest(
+            [HoldTap()],
+            [[KC.HT(KC.A, KC.LCTL, prefer_hold=False, tap_time=5000), KC.B]],
+            debug_enabled=False,
+        )
+
+        keyboard.test(
+            'HT key buffer overflow',
+            [(0, True)] + [(1, True), (1, False)] * 20 + [(0, False)],
+            [{KC.LCTL}] + [{KC.LCTL, KC.B}, {KC.LCTL}] * 20 + [{}],
+        )
@@ -0,0 +1,69 @@
+import unittest
+
+from kmk import scheduler
+from kmk.extensions.led import LED, AnimationModes
+from kmk.keys import KC
+from tests.keyboard_test import KeyboardTest
+from tests.mocks import clock
+
+
+class TestLED(unittest.TestCase):
+    def setUp(self):
+        KC.clear()
+        self.led = LED(led_pin=object(), brightness=40)
+        self.keyboard = KeyboardTest(
+            [], [[KC.LED_TOG(), KC.LED_M_B, KC.LED_M_P, KC.A]], extensions=[self.led]
+        )
+        self.pwm = self.led._leds[0]
+
+    def tearDown(self):
+        self.led.deinit(None)
+        KC.clear()
+
+    def tap(self, pin):
+        for pressed in (True, False):
+            self.keyboard.pins[pin].value = pressed
+            self.keyboard.do_main_loop()
+
+    def test_static_is_idle(self):
+        self.keyboard.do_main_loop()
+        self.assertIsNone(self.led._task)
+        self.assertEqual(self.led.animation_mode, AnimationModes.STATIC_STANDBY)
+        self.assertIsNone(scheduler.get_due_ms())
+
+    def test_breathing(self):
+        self.tap(1)
+        self.assertIsNotNone(self.led._task)
+        duty = []
+        for _ in range(20):
+            clock.advance(1000 // self.led.refresh_rate)
+            self.keyboard.do_main_loop()
+            duty.append(self.pwm.duty_cycle)
+        self.assertGreater(len(set(duty)), 1)
+
+        # Toggling the LED off stops the animation, and on resumes it.
+        self.tap(0)
+        self.assertIsNone(self.led._task)
+        self.assertIsNone(scheduler.get_due_ms())
+        self.tap(0)
+        self.assertIsNotNone(self.led._task)
+
+        # Static brightness is applied once.
+        self.tap(2)
+        self.assertIsNone(self.led._task)
+        self.assertEqual(self.pwm.duty_cycle, int(self.led._brightness / 100 * 65535))
+        self.assertIsNone(scheduler.get_due_ms())
+
+    def test_refresh_rate_zero(self):
+        self.led.refresh_rate = 0
+        self.tap(1)
+        duty = []
+        for _ in range(20):
+            clock.advance(1)
+            self.keyboard.do_main_loop()
+            duty.append(self.pwm.duty_cycle)
+        self.assertGreater(len(set(duty)), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,41 @@
 import unittest
+from keypad import Event as KeyEvent
+from unittest.mock import patch
 
+from kmk import scheduler
+from kmk.extensions import Extension
+from kmk.handlers.sequences import send_string, simple_key_sequence
+from kmk.hid import HIDModes
 from kmk.keys import KC
+from kmk.kmk_keyboard import KMKKeyboard
+from kmk.modules import Module
+from kmk.modules.holdtap import HoldTap
+from kmk.modules.layers import Layers
+from kmk.scanners import Scanner
 from tests.keyboard_test import KeyboardTest
+from tests.mocks import clock
+
+
+class TimedScanner(Scanner):
+    '''Reports `(time, key_number, pressed)` events once they are due.'''
+
+    wake_interval = None
+
+    def __init__(self, events, key_count=2):
+        self.events = list(events)
+        self._key_count = key_count
+
+    @property
+    def key_count(self):
+        return self._key_count
+
+    def has_pending_events(self):
+        return bool(self.events) and self.events[0][0] <= clock.now
+
+    def scan_for_changes(self):
+        if self.has_pending_events():
+            _, key_number, pressed = self.events.pop(0)
+            return KeyEvent(key_number, pressed)
 
 
 class TestKmkKeyboard(unittest.TestCase):
@@ -10,6 +44,511 @@ class TestKmkKeyboard(unittest.TestCase):
 
         keyboard.test('Simple key press', [(0, True), (0, False)], [{KC.N1}, {}])
 
+    @patch('kmk.hid.AbstractHID.hid_send')
+    def test_max_events_per_cycle(self, hid_send):
+        keyboard = KeyboardTest([], [[KC.N1, KC.N2, KC.N3, KC.N4]])
+        keyboard.keyboard.max_events_per_cycle = 2
+
+        hid_reports = []
+        hid_send.side_effect = lambda report: hid_reports.append(
+            {code for code in report[3:] if code}
+        )
+
+        for pin in keyboard.pins[:3]:
+            pin.value = True
+        keyboard.keyboard._main_loop()
+        self.assertEqual(hid_reports, [{KC.N1.code}, {KC.N1.code, KC.N2.code}])
+
+        keyboard.keyboard._main_loop()
+        self.assertEqual(len(hid_reports), 3)
+        self.assertEqual(hid_reports[-1], {KC.N1.code, KC.N2.code, KC.N3.code})
+
+        for pin in keyboard.pins[:3]:
+            pin.value = False
+        keyboard.keyboard._main_loop()
+        keyboard.keyboard._main_loop()
+        self.assertEqual(len(hid_reports), 6)
+        self.assertEqual(hid_reports[-1], set())
+
+    @patch('kmk.hid.AbstractHID.hid_send')
+    def test_swap_keys_pressed(self, hid_send):
+        keyboard = KeyboardTest([], [[KC.N1, KC.N2]])
+        kbd = keyboard.keyboard
+
+        hid_reports = []
+        hid_send.side_effect = lambda report: hid_reports.append(
+            {code for code in report[3:] if code}
+        )
+
+        keyboard.pins[0].value = True
+        kbd._main_loop()
+        self.assertEqual(hid_reports, [{KC.N1.code}])
+
+        # Swapping keys for as many others rebuilds the report once it's been
+        # invalidated.
+        for old, new in ((KC.N1, KC.N2), (KC.N2, KC.N1)):
+            kbd.keys_pressed.discard(old)
+            kbd.keys_pressed.add(new)
+            kbd.invalidate_report()
+            kbd._send_hid()
+            self.assertEqual(hid_reports[-1], {new.code})
+
+        keyboard.pins[0].value = False
+        kbd._main_loop()
+        self.assertEqual(hid_reports[-1], set())
+        self.assertEqual(kbd.keys_pressed, set())
+
+    @patch('kmk.hid.AbstractHID.hid_send')
+    def test_report_not_invalidated(self, hid_send):
+        keyboard = KeyboardTest([], [[KC.N1, KC.N2]])
+        kbd = keyboard.keyboard
+
+        hid_reports = []
+        hid_send.side_effect = lambda report: hid_reports.append(
+            {code for code in report[3:] if code}
+        )
+
+        with patch('kmk.kmk_keyboard.debug') as debug:
+            debug.enabled = True
+            keyboard.pins[0].value = True
+            kbd._main_loop()
+            self.assertEqual(kbd._keys_reported, {KC.N1})
+
+            # Swapped without `invalidate_report`: reported and repaired in
+            # debug mode.
+            kbd.keys_pressed.discard(KC.N1)
+            kbd.keys_pressed.add(KC.N2)
+            kbd._send_hid()
+            self.assertEqual(hid_reports[-1], {KC.N2.code})
+            debug.assert_any_call(
+                'keys_pressed modified without invalidate_report(): ',
+                {KC.N1, KC.N2},
+            )
+
+            kbd.keys_pressed.discard(KC.N2)
+            kbd.keys_pressed.add(KC.N1)
+            kbd.invalidate_report()
+            keyboard.pins[0].value = False
+            kbd._main_loop()
+            self.assertEqual(hid_reports[-1], set())
+            self.assertEqual(kbd.keys_pressed, set())
+
+    def test_macro_sleep(self):
+        keyboard = KeyboardTest(
+            [],
+            [[simple_key_sequence((KC.A, KC.MACRO_SLEEP_MS(1000), KC.B))]],
+        )
+        reports = []
+
+        with patch('kmk.hid.AbstractHID.hid_send') as hid_send:
+            hid_send.side_effect = lambda report: reports.append(
+                (clock.now, {code for code in report[3:] if code})
+            )
+            keyboard.pins[0].value = True
+            keyboard.keyboard._main_loop()
+            keyboard.pins[0].value = False
+            keyboard.keyboard._main_loop()
+
+        start = reports[0][0]
+        self.assertEqual(
+            [(t - start, keys) for t, keys in reports],
+            [(0, {KC.A.code}), (0, set()), (1000, {KC.B.code}), (1000, set())],
+        )
+
+    def test_resume_buffer_overflow(self):
+        class Burst(Module):
+            def during_bootup(self, keyboard):
+                return
+
+            def process_key(self, keyboard, key, is_pressed, int_coord):
+                if key is not KC.N1:
+                    return key
+                if is_pressed:
+                    for _ in range(40):
+                        keyboard.resume_process_key(self, KC.N2, True)
+                        keyboard.resume_process_key(self, KC.N2, False)
+
+        keyboard = KeyboardTest([Burst()], [[KC.N1]])
+
+        # More events than fit into the resume buffer: buffered events are
+        # resumed first to make room.
+        keyboard.test('', [(0, True), (0, False)], [{KC.N2}, {}] * 40)
+
+    def test_working_buffer_overflow(self):
+        class Burst(Module):
+            def during_bootup(self, keyboard):
+                return
+
+            def process_key(self, keyboard, key, is_pressed, int_coord):
+                if key is not KC.N1:
+                    return key
+                if is_pressed:
+                    for _ in range(30):
+                        keyboard.resume_process_key(self, KC.N3, True)
+                        keyboard.resume_process_key(self, KC.N3, False)
+
+        class Echo(Burst):
+            def process_key(self, keyboard, key, is_pressed, int_coord):
+                if key is not KC.N3:
+                    return key
+                if is_pressed:
+                    for _ in range(5):
+                        keyboard.resume_process_key(self, KC.N2, True)
+                        keyboard.resume_process_key(self, KC.N2, False)
+
+        keyboard = KeyboardTest([Burst(), Echo()], [[KC.N1]])
+
+        # Events resumed while resuming don't fit into the working buffer:
+        # they're resumed right away.
+        keyboard.test('', [(0, True), (0, False)], [{KC.N2}, {}] * 150)
+
+    @patch('kmk.hid.AbstractHID.hid_send')
+    def test_max_events_per_cycle_hooks(self, hid_send):
+        # Like the non-target half of a split keyboard.
+        class Silent(Module):
+            def during_bootup(self, keyboard):
+                return
+
+            def before_hid_send(self, keyboard):
+                keyboard.hid_pending = False
+
+        keyboard = KeyboardTest([Silent()], [[KC.N1, KC.N2, KC.N3, KC.N4]])
+        keyboard.keyboard.max_events_per_cycle = 4
+        hid_send.reset_mock()
+
+        for pin in keyboard.pins[:3]:
+            pin.value = True
+        keyboard.keyboard._main_loop()
+        for pin in keyboard.pins[:3]:
+            pin.value = False
+        keyboard.keyboard._main_loop()
+
+        self.assertEqual(keyboard.keyboard.keys_pressed, set())
+        hid_send.assert_not_called()
+
+    def test_hooks(self):
+        class Scanning(Module):
+            def during_bootup(self, keyboard):
+                return
+
+            def before_matrix_scan(self, keyboard):
+                return
+
+        class Sending(Extension):
+            def during_bootup(self, keyboard):
+                return
+
+            def after_hid_send(self, keyboard):
+                return
+
+        scanning = Scanning()
+        sending = Sending()
+        keyboard = KeyboardTest(
+            [Layers(), scanning], [[KC.N1]], extensions=[sending]
+        ).keyboard
+
+        self.assertEqual(keyboard._hooks['before_matrix_scan'], ([scanning], []))
+        self.assertEqual(keyboard._hooks['after_hid_send'], ([], [sending]))
+        self.assertEqual(keyboard._hooks['before_hid_send'], ([], []))
+
+    def test_settle_loop(self):
+        class Spinning(Module):
+            def during_bootup(self, keyboard):
+                return
+
+            def after_hid_send(self, keyboard):
+                scheduler.create_task(self.spin)
+
+            def spin(self):
+                return
+
+        keyboard = KeyboardTest([Spinning()], [[KC.N1]])
+        keyboard.max_settle_cycles = 100
+
+        with self.assertRaises(AssertionError):
+            keyboard.test('', [(0, True), (0, False)], [{KC.N1}, {}])
+
+    def test_find_key_in_map(self):
+        keyboard = KMKKeyboard()
+        keyboard.coord_mapping = (3, 1, 7, 1)
+        keyboard.keymap = [[KC.A, KC.B, KC.C, KC.D]]
+        keyboard._init_coord_mapping()
+
+        self.assertEqual(keyboard._find_key_in_map(3), KC.A)
+        self.assertEqual(keyboard._find_key_in_map(1), KC.B)
+        self.assertEqual(keyboard._find_key_in_map(7), KC.C)
+        self.assertIsNone(keyboard._find_key_in_map(0))
+        self.assertIsNone(keyboard._find_key_in_map(8))
+
+    def test_effective_keymap(self):
+        keyboard = KMKKeyboard()
+        keyboard.active_layers = [0]
+        keyboard.coord_mapping = (0, 1, 2)
+        keyboard.keymap = [
+            [KC.A, KC.B, KC.C],
+            [KC.D, KC.TRNS, None],
+            [KC.TRNS, KC.E],
+        ]
+        keyboard._init_coord_mapping()
+
+        self.assertEqual(keyboard._find_key_in_map(1), KC.B)
+
+        keyboard.active_layers.insert(0, 1)
+        self.assertEqual(keyboard._find_key_in_map(0), KC.D)
+        self.assertEqual(keyboard._find_key_in_map(1), KC.B)
+        self.assertEqual(keyboard._find_key_in_map(2), KC.C)
+
+        keyboard.active_layers.insert(0, 2)
+        self.assertEqual(keyboard._find_key_in_map(0), KC.D)
+        self.assertEqual(keyboard._find_key_in_map(1), KC.E)
+        self.assertEqual(keyboard._find_key_in_map(2), KC.C)
+
+        keyboard.active_layers.remove(2)
+        keyboard.active_layers.remove(1)
+        self.assertEqual(keyboard._find_key_in_map(1), KC.B)
+
+        keyboard.keymap[0][1] = KC.F
+        self.assertEqual(keyboard._find_key_in_map(1), KC.B)
+        keyboard.invalidate_keymap()
+        self.assertEqual(keyboard._find_key_in_map(1), KC.F)
+
+    def test_idle(self):
+        start = clock.now
+        events = tuple(
+            (start + t, key_number, pressed)
+            for t, key_number, pressed in (
+                (7, 0, True),
+                (23, 0, False),
+                (24, 1, True),
+                (90, 1, False),
+            )
+        )
+
+        keyboard = KMKKeyboard()
+        keyboard.keymap = [[KC.A, KC.B]]
+        keyboard.matrix = TimedScanner(events)
+        keyboard.modules = []
+        keyboard.extensions = []
+        keyboard.keys_pressed = set()
+        keyboard.max_idle_ms = 1000
+
+        reports = []
+        tasks = []
+
+        with patch('kmk.kmk_keyboard.sleep', clock.sleep):
+            scheduler._task_queue = scheduler.TaskQueue()
+            keyboard._init(hid_type=HIDModes.NOOP)
+            keyboard._hid_helper.hid_send = lambda report: reports.append(
+                (clock.now - start, {code for code in report[3:] if code})
+            )
+            scheduler.create_task(lambda: tasks.append(clock.now - start), after_ms=50)
+
+            cycles = 0
+            while clock.now - start < 200:
+                keyboard._main_loop()
+                cycles += 1
+
+        self.assertEqual(tasks, [50])
+        self.assertEqual(
+            reports,
+            [(7, {4}), (23, set()), (24, {5}), (90, set())],
+        )
+        # One cycle per event and task, plus the final timeout.
+        self.assertLessEqual(cycles, 7)
+
+    def test_phase_timing(self):
+        keyboard = KeyboardTest([], [[KC.N1, KC.N2, KC.N3, KC.N4]])
+        kbd = keyboard.keyboard
+
+        kbd.enable_phase_timing()
+        keyboard.test('', [(0, True), (0, False)], [{KC.N1}, {}])
+
+        timing = kbd.phase_timing
+        self.assertGreater(timing['main_loop'].count, 0)
+        self.assertEqual(timing['main_loop'].count, timing['scan_matrix'].count)
+        self.assertEqual(timing['send_hid'].count, 2)
+        self.assertEqual(timing['idle'].count, 0)
+
+        kbd.enable_phase_timing(False)
+        self.assertIsNone(kbd.phase_timing)
+        self.assertNotIn('_main_loop', kbd.__dict__)
+
+    def test_profiler(self):
+        class Scanning(Module):
+            def during_bootup(self, keyboard):
+                return
+
+            def before_matrix_scan(self, keyboard):
+                raise RuntimeError()
+
+        scanning = Scanning()
+        keyboard = KeyboardTest([Layers(), scanning], [[KC.N1]])
+        kbd = keyboard.keyboard
+
+        kbd.enable_profiler()
+        keyboard.test('', [(0, True), (0, False)], [{KC.N1}, {}])
+
+        stats = kbd.profiler.snapshot()
+        self.assertEqual(stats[('Layers', 'process_key')][0], 2)
+        self.assertGreater(stats[('Scanning', 'before_matrix_scan')][0], 2)
+        self.assertIn('Layers.process_key n=2 ', kbd.profiler.report())
+
+        kbd.profiler.reset()
+        self.assertEqual(kbd.profiler.snapshot()[('Layers', 'process_key')], (0, 0))
+        self.assertEqual(kbd.profiler.report(), '')
+
+        kbd.enable_profiler(False)
+        self.assertIsNone(kbd.profiler)
+        self.assertNotIn('before_matrix_scan', scanning.__dict__)
+
+    def test_latency_tracer(self):
+        KC.clear()
+        holdtap = HoldTap()
+        holdtap.tap_time = 300
+        keyboard = KeyboardTest([holdtap], [[KC.HT(KC.A, KC.LCTL), KC.B]])
+        kbd = keyboard.keyboard
+        kbd.enable_latency_tracer()
+
+        with patch('kmk.profiler.ticks_us', lambda: clock.now * 1000):
+            keyboard.test(
+                '',
+                [(1, True), (1, False), (0, True), 400, (0, False)],
+                [{KC.B}, {}, {KC.LCTL}, {}],
+            )
+
+        latency = kbd.tracer.latency
+        self.assertEqual(set(latency), {'direct', 'HoldTap'})
+        self.assertEqual(latency['direct'].count, 2)
+        self.assertEqual(latency['direct'].max, 0)
+        # The hold is resumed once the holdtap timeout has passed, and the
+        # release one main loop cycle later.
+        self.assertEqual(latency['HoldTap'].count, 2)
+        self.assertEqual(latency['HoldTap'].max, 302_000)
+        self.assertEqual(latency['HoldTap'].min, 2_000)
+
+        kbd.enable_latency_tracer(False)
+        self.assertIsNone(kbd.tracer)
+
+
+def transitions(reports):
+    '''Return the `(code, pressed)` changes of keys between reports.'''
+    changes = []
+    prev = set()
+    for _, _, keys in reports:
+        changes.extend((code, False) for code in sorted(prev - keys))
+        changes.extend((code, True) for code in sorted(keys - prev))
+        prev = keys
+    return changes
+
+
+class TestPollInterval(unittest.TestCase):
+    '''
+    Reports held back by an 8ms HID poll interval, with the main loop idling
+    until the next report is due.
+    '''
+
+    def setUp(self):
+        KC.clear()
+
+    def run_keyboard(self, modules, keymap, events, duration=500):
+        start = clock.now
+        events = tuple(
+            (start + t, key_number, pressed) for t, key_number, pressed in events
+        )
+
+        keyboard = KMKKeyboard()
+        keyboard.keymap = keymap
+        keyboard.matrix = TimedScanner(events, len(keymap[0]))
+        keyboard.modules = modules
+        keyboard.extensions = []
+        keyboard.keys_pressed = set()
+        keyboard.max_idle_ms = 1000
+
+        reports = []
+
+        with patch('kmk.kmk_keyboard.sleep', clock.sleep):
+            scheduler._task_queue = scheduler.TaskQueue()
+            keyboard._init(hid_type=HIDModes.NOOP)
+            keyboard._hid_helper.poll_interval_ms = 8
+            keyboard._hid_helper.hid_send = lambda report: reports.append(
+                (clock.now - start, report[1], {code for code in report[3:] if code})
+            )
+            while clock.now - start < duration:
+                keyboard._main_loop()
+
+        keyboard.keys_pressed.clear()
+        self.assertFalse(keyboard._hid_helper.dirty)
+        return reports
+
+    def test_tap(self):
+        reports = self.run_keyboard(
+            [],
+            [[KC.A, KC.B]],
+            (
+                (7, 0, True),
+                (9, 0, False),
+                (10, 0, True),
+                (12, 0, False),
+                (40, 1, True),
+                (41, 1, False),
+            ),
+        )
+        # The second tap reverts the staged release, both are queued and sent
+        # one per interval.
+        self.assertEqual(
+            reports,
+            [
+                (7, 0, {KC.A.code}),
+                (15, 0, set()),
+                (23, 0, {KC.A.code}),
+                (31, 0, set()),
+                (40, 0, {KC.B.code}),
+                (48, 0, set()),
+            ],
+        )
+
+    def test_holdtap(self):
+        holdtap = HoldTap()
+        holdtap.tap_time = 100
+        reports = self.run_keyboard(
+            [holdtap],
+            [[KC.HT(KC.A, KC.LCTL), KC.B]],
+            (
+                (7, 0, True),
+                (20, 1, True),
+                (22, 1, False),
+                (30, 0, False),
+                (200, 0, True),
+                (203, 0, False),
+            ),
+        )
+        # The hold is resolved by the press of B, and its release reverts the
+        # staged press. The release of B and LCTL is coalesced.
+        self.assertEqual(
+            reports,
+            [
+                (20, KC.LCTL.code, set()),
+                (28, KC.LCTL.code, {KC.B.code}),
+                (36, 0, set()),
+                (203, 0, {KC.A.code}),
+                (211, 0, set()),
+            ],
+        )
+
+    def test_macro_burst(self):
+        message = 'abcdefghijklmnopqrstuvwxyz'
+        reports = self.run_keyboard(
+            [],
+            [[send_string(message)]],
+            ((7, 0, True), (9, 0, False)),
+        )
+        # More reports than fit into the queue: the overflow is flushed.
+        self.assertGreater(len([t for t, _, _ in reports if t == 7]), 1)
+        self.assertEqual(
+            transitions(reports),
+            [(KC[char].code, pressed) for char in message for pressed in (True, False)],
+        )
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -1,6 +1,6 @@
 import unittest
 
-from kmk.keys import KC, Key, ModifierKey, make_key
+from kmk.keys import KC, Key, KeyType, ModifierKey, make_key
 from tests.keyboard_test import KeyboardTest
 
 
@@ -104,6 +104,20 @@ class TestKmkKeys(unittest.TestCase):
         assert isinstance(KC.RALT(KC.Q), Key)
         assert not isinstance(KC.RALT(KC.Q), ModifierKey)
 
+    def test_report_type(self):
+        assert KC.Q.report_type == KeyType.SIMPLE
+        assert KC.Q.modifier_mask == 0
+        assert KC.RALT(KC.Q).report_type == KeyType.SIMPLE
+        assert KC.RALT(KC.Q).modifier_mask == KC.RALT.code
+        assert KC.LSFT.report_type == KeyType.MODIFIER
+        assert KC.LSFT.modifier_mask == KC.LSFT.code
+        assert KC.RALT(KC.LSFT).modifier_mask == KC.RALT.code | KC.LSFT.code
+        assert KC.NO.report_type == KeyType.INTERNAL
+        assert make_key(type=KeyType.CONSUMER).report_type == KeyType.INTERNAL
+        assert make_key(code=0xE9, type=KeyType.CONSUMER).report_type == (
+            KeyType.CONSUMER
+        )
+
 
 class TestKeys_dot(unittest.TestCase):
     def setUp(self):
@@ -0,0 +1,66 @@
+import unittest
+
+from kmk.profiler import Histogram, Profiler, timed
+
+
+class TestHistogram(unittest.TestCase):
+    def test_empty(self):
+        h = Histogram()
+        self.assertEqual(h.count, 0)
+        self.assertEqual(h.avg, 0)
+        self.assertEqual(h.percentile(99), 0)
+
+    def test_statistics(self):
+        h = Histogram()
+        for value in range(1, 101):
+            h.add(value)
+        self.assertEqual(h.count, 100)
+        self.assertEqual(h.min, 1)
+        self.assertEqual(h.max, 100)
+        self.assertEqual(h.avg, 50)
+        # 64..100 share a bin, so p99 is the observed maximum.
+        self.assertEqual(h.percentile(99), 100)
+        # 32..63 share a bin, upper bound 63.
+        self.assertEqual(h.percentile(50), 63)
+
+        h.reset()
+        self.assertEqual(h.count, 0)
+        self.assertEqual(sum(h.bins), 0)
+
+    def test_outliers(self):
+        h = Histogram()
+        for _ in range(99):
+            h.add(3)
+        h.add(1_000_000)
+        self.assertEqual(h.percentile(99), 3)
+        self.assertEqual(h.percentile(100), 1_000_000)
+        self.assertEqual(h.max, 1_000_000)
+
+    def test_timed(self):
+        h = Histogram()
+        func = timed(lambda x: x + 1, h)
+        self.assertEqual(func(1), 2)
+        self.assertEqual(h.count, 1)
+
+
+class TestProfiler(unittest.TestCase):
+    def test_wrap(self):
+        class Module:
+            def hook(self, x):
+                return x
+
+        module = Module()
+        profiler = Profiler()
+        profiler.wrap(module, 'hook')
+        self.assertEqual(module.hook(1), 1)
+        self.assertEqual(module.hook(2), 2)
+        self.assertEqual(profiler.snapshot()[('Module', 'hook')][0], 2)
+        self.assertTrue(profiler.report().startswith('Module.hook n=2 '))
+
+        profiler.unwrap()
+        module.hook(3)
+        self.assertEqual(profiler.snapshot()[('Module', 'hook')][0], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,19 @@
-import time
+import gc
+
+import random
+import tracemalloc
 import unittest
 
 from kmk import scheduler
+from kmk.keys import KC
+from kmk.modules.combos import Chord, Combos
+from kmk.modules.holdtap import HoldTap
+from kmk.modules.oneshot import OneShot
+from kmk.modules.rapidfire import RapidFire
+from kmk.timer_wheel import TimerWheel
+from tests.keyboard_test import KeyboardTest
+from tests.mocks import clock
+from tests.task_heapq import CheckedTaskQueue, HeapTaskQueue
 
 
 class TestScheduler(unittest.TestCase):
@@ -9,10 +21,13 @@ class TestScheduler(unittest.TestCase):
         self._t_count += 1
 
     def _task_loop(self, duration):
-        until = time.time_ns() + 1_000_000 * duration
-        while time.time_ns() < until:
+        until = clock.now + duration
+        while True:
             for t in scheduler.get_due_task():
                 t()
+            if clock.now >= until:
+                break
+            clock.advance(1)
 
     def setUp(self):
         self._t_count = 0
@@ -69,6 +84,20 @@ class TestScheduler(unittest.TestCase):
             self._task_loop(1)
             self.assertEqual(self._t_count, i)
 
+    def test_period_ms_skips_missed_ticks(self):
+        t = scheduler.create_task(self._task, period_ms=2)
+        self._task_loop(0)
+        self.assertEqual(self._t_count, 1)
+
+        # Busy for several periods: runs once, then keeps to the period.
+        clock.advance(7)
+        self._task_loop(0)
+        self.assertEqual(self._t_count, 2)
+        self.assertEqual(scheduler.get_due_ms(), 2)
+        self._task_loop(2)
+        self.assertEqual(self._t_count, 3)
+        scheduler.cancel_task(t)
+
     def test_restart_PeriodicTaskMeta(self):
         t = scheduler.create_task(self._task, period_ms=1)
         scheduler.cancel_task(t)
@@ -86,6 +115,366 @@ class TestScheduler(unittest.TestCase):
         t = scheduler.create_task(self._task)
         self.assertIsInstance(t, scheduler.Task)
 
+    def test_timer_rearm(self):
+        timer = scheduler.Timer(self._task)
+        task = timer._task
+        self.assertIs(scheduler.create_task(timer, after_ms=2), timer)
+        self.assertTrue(timer.armed)
+        self._task_loop(1)
+        timer.rearm(2)
+        self._task_loop(1)
+        self.assertEqual(self._t_count, 0)
+        self._task_loop(1)
+        self.assertEqual(self._t_count, 1)
+        self.assertFalse(timer.armed)
+
+        timer.rearm(0)
+        self._task_loop(0)
+        self.assertEqual(self._t_count, 2)
+        self.assertIs(timer._task, task)
+        self.assertIsNone(scheduler.get_due_ms())
+
+    def test_timer_cancel(self):
+        timer = scheduler.Timer(self._task)
+        timer.rearm(1)
+        scheduler.cancel_task(timer)
+        self.assertFalse(timer.armed)
+        # Cancelling an idle timer is a no-op.
+        timer.cancel()
+        self._task_loop(2)
+        self.assertEqual(self._t_count, 0)
+        self.assertIsNone(scheduler.get_due_ms())
+
+
+class TestTimerWheelScheduler(TestScheduler):
+    def setUp(self):
+        self._t_count = 0
+        scheduler._task_queue = TimerWheel(8)
+
+    def test_order(self):
+        order = []
+        for after_ms in (5, 20, 1, 9, 20, 3):
+            scheduler.create_task(
+                lambda after_ms=after_ms: order.append(after_ms), after_ms=after_ms
+            )
+        t = scheduler.create_task(lambda: order.append(None), after_ms=2)
+        scheduler.cancel_task(t)
+        self.assertEqual(scheduler.get_due_ms(), 1)
+        self._task_loop(20)
+        self.assertEqual(order, [1, 3, 5, 9, 20, 20])
+        self.assertEqual(len(scheduler._task_queue), 0)
+
+    def test_long_timeouts(self):
+        # Tasks due a revolution or more ahead share buckets with earlier ones.
+        order = []
+        for name, after_ms in (('a', 100), ('b', 5), ('c', 100), ('d', 30)):
+            scheduler.create_task(
+                lambda name=name: order.append(name), after_ms=after_ms
+            )
+        t = scheduler.create_task(lambda: order.append(None), after_ms=50)
+        scheduler.cancel_task(t)
+        self.assertEqual(len(scheduler._task_queue), 4)
+        self.assertEqual(scheduler.get_due_ms(), 5)
+
+        self._task_loop(29)
+        self.assertEqual(order, ['b'])
+        self.assertEqual(scheduler.get_due_ms(), 1)
+        self._task_loop(71)
+        self.assertEqual(order, ['b', 'd', 'a', 'c'])
+        self.assertEqual(len(scheduler._task_queue), 0)
+
+    def test_late(self):
+        order = []
+
+        def schedule(*after):
+            for after_ms in after:
+                scheduler.create_task(
+                    lambda at=clock.now + after_ms: order.append(at), after_ms=after_ms
+                )
+
+        start = clock.now
+        schedule(3, 1)
+        clock.advance(20)
+        schedule(5, 2)
+
+        # More than one revolution late: the buckets are scanned as a whole.
+        clock.advance(30)
+        self._task_loop(0)
+        self.assertEqual([at - start for at in order], [1, 3, 22, 25])
+
+    def test_wraparound(self):
+        clock.advance((1 << 29) - clock.ticks_ms() - 3)
+        scheduler.create_task(self._task, after_ms=10)
+        scheduler.create_task(self._task, after_ms=2)
+        self.assertEqual(scheduler.get_due_ms(), 2)
+        self._task_loop(5)
+        self.assertEqual(self._t_count, 1)
+        self._task_loop(5)
+        self.assertEqual(self._t_count, 2)
+
+    def test_set_task_queue(self):
+        scheduler._task_queue = scheduler.TaskQueue()
+        scheduler.create_task(self._task, after_ms=3)
+        scheduler.create_task(self._task, after_ms=1)
+        scheduler.set_task_queue(TimerWheel())
+        self.assertIsInstance(scheduler._task_queue, TimerWheel)
+        self.assertEqual(scheduler.get_due_ms(), 1)
+        self._task_loop(3)
+        self.assertEqual(self._t_count, 2)
+
+
+class TestHeapTaskQueueScheduler(TestScheduler):
+    def setUp(self):
+        self._t_count = 0
+        scheduler._task_queue = HeapTaskQueue()
+
+
+class TestCheckedTaskQueueScheduler(TestScheduler):
+    def setUp(self):
+        self._t_count = 0
+        scheduler._task_queue = CheckedTaskQueue()
+
+    def test_cross_check(self):
+        # Random scheduling and cancelling across the tick wraparound; the
+        # queue asserts that heapq and the pairing heap agree throughout.
+        rng = random.Random(0)
+        clock.advance((1 << 29) - clock.ticks_ms() - 500)
+        timers = [scheduler.Timer(self._task) for _ in range(50)]
+        for _ in range(2000):
+            timer = rng.choice(timers)
+            if rng.random() < 0.3:
+                timer.cancel()
+            else:
+                timer.rearm(rng.randint(0, 100))
+            clock.advance(rng.randint(0, 3))
+            for t in scheduler.get_due_task():
+                t()
+        self.assertGreater(self._t_count, 0)
+        self.assertGreater(len(scheduler._task_queue._heap), 0)
+
+    def test_double_push(self):
+        t = scheduler.create_task(self._task, after_ms=1)
+        with self.assertRaises(AssertionError):
+            scheduler.create_task(t, after_ms=2)
+
+
+class TestSchedulerStats(unittest.TestCase):
+    def _task(self):
+        clock.advance(1)
+
+    def setUp(self):
+        scheduler._task_queue = scheduler.TaskQueue()
+
+    def tearDown(self):
+        scheduler.enable_stats(False)
+
+    def run_due(self):
+        for t in scheduler.get_due_task():
+            t()
+
+    def test_stats(self):
+        pending = scheduler.create_task(self._task, after_ms=100)
+        scheduler.enable_stats()
+        stats = scheduler.get_stats()
+        self.assertEqual(stats.depth, 1)
+
+        timer = scheduler.Timer(self._task)
+        timer.rearm(2)
+        periodic = scheduler.create_task(self._task, period_ms=5)
+        self.assertEqual(stats.max_depth, 3)
+
+        clock.advance(3)
+        self.run_due()
+        timer.cancel()
+        self.assertEqual(stats.depth, 2)
+        self.assertEqual(stats.max_depth, 3)
+
+        # Timers and periodic tasks count towards the function they call.
+        name = 'TestSchedulerStats._task'
+        self.assertEqual(stats.callbacks[name][0], 2)
+        # The periodic task was due right away, the timer after 2 ms and
+        # waited on the periodic task, which took 1 ms.
+        self.assertEqual(stats.lateness.count, 2)
+        self.assertEqual((stats.lateness.min, stats.lateness.max), (2, 3))
+        self.assertIn(f'{name} n=2 ', stats.report())
+
+        stats.reset()
+        self.assertEqual(stats.callbacks, {})
+        self.assertEqual(stats.max_depth, 2)
+
+        scheduler.cancel_task(periodic)
+        scheduler.enable_stats(False)
+        self.assertIsNone(scheduler.get_stats())
+        self.assertIsInstance(scheduler._task_queue, scheduler.TaskQueue)
+        self.assertIs(scheduler._task_queue.peek(), pending)
+
+    def test_callable_object(self):
+        class Callback:
+            calls = 0
+
+            def __call__(self):
+                self.calls += 1
+
+        callback = Callback()
+        scheduler.enable_stats()
+        scheduler.create_task(callback)
+        scheduler.create_task(self._task)
+        self.run_due()
+        self.assertEqual(callback.calls, 1)
+        callbacks = scheduler.get_stats().callbacks
+        self.assertEqual(callbacks['Callback'][0], 1)
+        self.assertEqual(callbacks['TestSchedulerStats._task'][0], 1)
+
+    def test_module_timer_names(self):
+        KC.clear()
+        combos = Combos([Chord((KC.A, KC.B), KC.X)])
+        keyboard = KeyboardTest(
+            [HoldTap(), OneShot(), combos],
+            [[KC.A, KC.B, KC.HT(KC.C, KC.LCTL), KC.OS(KC.LSFT)]],
+        )
+        scheduler.enable_stats()
+        # Hold every key past its timeouts.
+        for pin in range(4):
+            for pressed in (True, False):
+                keyboard.pins[pin].value = pressed
+                keyboard.do_main_loop()
+                clock.advance(1000)
+                keyboard.do_main_loop()
+
+        callbacks = scheduler.get_stats().callbacks
+        for name in (
+            'Combos.on_timer',
+            'Combos.on_idle_timeout',
+            'HoldTap.on_timeout',
+            'OneShot.on_timeout',
+        ):
+            self.assertIn(name, callbacks)
+        self.assertFalse([name for name in callbacks if 'lambda' in name])
+        KC.clear()
+
+
+class TestTimerAllocations(unittest.TestCase):
+    '''
+    Steady state key presses must not allocate tasks, callbacks, or key states
+    for their timeouts. Allocations are traced in the scheduler and the module
+    under test only: lists and dicts elsewhere resize on the host.
+    '''
+
+    def tearDown(self):
+        # Resolve pending keys, and don't leave module keys bound to these
+        # modules for other tests.
+        for idx in range(len(self.keyboard.pins)):
+            self.press((idx, False))
+        self.settle()
+        KC.clear()
+
+    def settle(self):
+        # Bounded: rapid fire keys repeat for as long as they're held.
+        for _ in range(100):
+            self.keyboard.keyboard._main_loop()
+            due = scheduler.get_due_ms()
+            if due is None:
+                break
+            clock.advance(max(due, 1))
+
+    def press(self, *events):
+        for idx, is_pressed in events:
+            self.keyboard.pins[idx].value = is_pressed
+            for _ in range(2):
+                self.keyboard.do_main_loop()
+
+    def assertNoAllocations(self, cycle, pending, *files):
+        # Warm up: key states and timers are allocated on first use.
+        for _ in range(3):
+            cycle()
+            self.settle()
+
+        gc.disable()
+        tracemalloc.start()
+        try:
+            before = tracemalloc.take_snapshot()
+            pending()
+            after = tracemalloc.take_snapshot()
+        finally:
+            tracemalloc.stop()
+            gc.enable()
+
+        traced = [tracemalloc.Filter(True, '*/kmk/scheduler.py')]
+        traced.extend(tracemalloc.Filter(True, '*/kmk/' + f) for f in files)
+        stats = after.filter_traces(traced).compare_to(
+            before.filter_traces(traced), 'lineno'
+        )
+        self.assertEqual([str(s) for s in stats if s.count_diff], [])
+
+    def test_holdtap(self):
+        KC.clear()
+        self.keyboard = KeyboardTest([HoldTap()], [[KC.HT(KC.A, KC.LCTL), KC.B]])
+
+        def cycle():
+            self.press((0, True), (0, False))
+            self.settle()
+            self.press((0, True))
+            self.settle()
+            self.press((0, False))
+
+        self.assertNoAllocations(
+            cycle, lambda: self.press((0, True)), 'modules/holdtap.py'
+        )
+
+    def test_oneshot(self):
+        KC.clear()
+        self.keyboard = KeyboardTest([OneShot()], [[KC.OS(KC.LSFT), KC.A]])
+
+        def cycle():
+            self.press((0, True), (0, False), (1, True), (1, False))
+            self.settle()
+            self.press((0, True), (0, False))
+            self.settle()
+
+        self.assertNoAllocations(
+            cycle,
+            lambda: self.press((0, True), (0, False)),
+            'modules/holdtap.py',
+            'modules/oneshot.py',
+        )
+
+    def test_combos(self):
+        KC.clear()
+        combos = Combos(
+            [
+                Chord((KC.A, KC.B), KC.X, timeout=50),
+                Chord((KC.A, KC.C), KC.Y, timeout=50),
+            ]
+        )
+        self.keyboard = KeyboardTest([combos], [[KC.A, KC.B, KC.C, KC.D]])
+
+        def cycle():
+            self.press((0, True), (1, True), (0, False), (1, False))
+            self.settle()
+            self.press((0, True))
+            self.settle()
+            self.press((0, False), (3, True), (3, False))
+
+        # Match lists resize on the host; only trace the scheduler.
+        self.assertNoAllocations(cycle, lambda: self.press((0, True)))
+
+    def test_rapidfire(self):
+        KC.clear()
+        self.keyboard = KeyboardTest(
+            [RapidFire()], [[KC.RF(KC.A, interval=20, timeout=50), KC.B]]
+        )
+
+        def repeat():
+            self.press((0, True))
+            for _ in range(60):
+                self.keyboard.do_main_loop()
+
+        def cycle():
+            repeat()
+            self.press((0, False))
+
+        self.assertNoAllocations(cycle, repeat, 'modules/rapidfire.py')
+
 
 if __name__ == '__main__':
     unittest.main()
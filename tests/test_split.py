@@ -0,0 +1,46 @@
+import unittest
+from unittest.mock import Mock
+
+from kmk.modules.split import Split, SplitType
+
+
+class UART:
+    def __init__(self):
+        self.data = bytearray()
+
+    @property
+    def in_waiting(self):
+        return len(self.data)
+
+    def read(self, n):
+        data = bytes(self.data[:n])
+        del self.data[:n]
+        return data
+
+
+class TestSplitReceive(unittest.TestCase):
+    def test_uart_buffer_full(self):
+        split = Split(split_type=SplitType.UART)
+        split._uart = UART()
+        events = [
+            (key_number, pressed) for key_number in range(20) for pressed in (1, 0)
+        ]
+        for event in events:
+            update = bytes(event)
+            split._uart.data += split.uart_header + update + split._checksum(update)
+
+        # More events than fit into the receive buffer are left to the UART
+        # until there's room, none are dropped.
+        keyboard = Mock(tracer=None)
+        received = []
+        for _ in range(2 * len(events)):
+            keyboard.secondary_matrix_update = None
+            split._receive_uart(keyboard)
+            update = keyboard.secondary_matrix_update
+            if update is not None:
+                received.append((update.key_number, update.pressed))
+        self.assertEqual(received, events)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import unittest
+
+from kmk.utils import RingBuffer
+
+
+class TestRingBuffer(unittest.TestCase):
+    def test_fifo(self):
+        rb = RingBuffer(4)
+        self.assertFalse(rb)
+        for i in range(3):
+            self.assertTrue(rb.append(i))
+        self.assertEqual(len(rb), 3)
+        self.assertEqual(list(rb), [0, 1, 2])
+        self.assertEqual(rb.popleft(), 0)
+        self.assertEqual(rb.pop(), 2)
+        self.assertEqual(rb[-1], 1)
+        self.assertEqual(rb.popleft(), 1)
+        self.assertFalse(rb)
+        with self.assertRaises(IndexError):
+            rb.popleft()
+
+    def test_wraparound(self):
+        rb = RingBuffer(3, 'H')
+        for i in range(10):
+            rb.append(i)
+            self.assertEqual(rb.popleft(), i)
+        rb.append(1)
+        rb.append(2)
+        rb.appendleft(0)
+        self.assertEqual(list(rb), [0, 1, 2])
+        self.assertEqual([rb[i] for i in range(3)], [0, 1, 2])
+        with self.assertRaises(IndexError):
+            rb[3]
+
+    def test_overflow(self):
+        rb = RingBuffer(2)
+        rb.append('a')
+        rb.append('b')
+        self.assertFalse(rb.append('c'))
+        self.assertFalse(rb.appendleft('d'))
+        self.assertEqual(rb.overflow, 2)
+        self.assertEqual(list(rb), ['a', 'b'])
+
+    def test_clear(self):
+        rb = RingBuffer(2)
+        rb.append(object())
+        rb.append(object())
+        rb.clear()
+        self.assertFalse(rb)
+        self.assertEqual(rb._buffer, [None, None])
+        rb.append(1)
+        self.assertEqual(list(rb), [1])
+
+
+if __name__ == '__main__':
+    unittest.main()